@@ -1,5 +1,6 @@
 #include <assert.h>
 #include <stdbool.h>
+#include <stdint.h>
 #include <stdio.h>
 #include <string.h>
 
@@ -9,7 +10,9 @@
 
 int G[] = {$G};
 
-char *K[] = {$K};
+/* all keys in one blob, key i is KD[KP[i]:KP[i + 1]] */
+static const char KD[] = $KD;
+static const uint${KPB}_t KP[] = {$KP};
 
 
 /* return index of key in K if key is found, -1 otherwise */
@@ -17,13 +20,16 @@ int get_index(const char *key)
 {
     unsigned char c;
     int f1 = 0, f2 = 0, i;
+    size_t n;
 
     for (i = 0; (c = key[i]) && i < NS; i++) {
         f1 += "$S1"[i] * c;
         f2 += "$S2"[i] * c;
     }
+    n = strlen(key);
     i = (G[f1 % NG] + G[f2 % NG]) % NG;
-    if (i < NK && strcmp(key, K[i]) == 0)
+    if (i < NK && n == (size_t) (KP[i + 1] - KP[i]) &&
+            memcmp(key, KD + KP[i], n) == 0)
         return i;
 
     return -1;
@@ -32,13 +38,17 @@ int get_index(const char *key)
 int main()
 {
     int i;
+    char key[64];
     char *junk[] = {"Überflieger", "abc", "König Charles", "1234"};
 
     for (i = 0; i < 4; i++)
         assert(get_index(junk[i]) == -1);
 
-    for (i = 0; i < NK; i++)
-        assert(get_index(K[i]) == i);
+    for (i = 0; i < NK; i++) {
+        memcpy(key, KD + KP[i], KP[i + 1] - KP[i]);
+        key[KP[i + 1] - KP[i]] = '\0';
+        assert(get_index(key) == i);
+    }
 
     printf("OK\n");
     return 0;
@@ -5,3 +5,7 @@
 #define S2  "$S2"
 
 int G[] = {$G};
+
+/* all callsigns in one blob, callsign i is KD[KP[i]:KP[i + 1]] */
+static const char KD[] = $KD;
+static const uint${KPB}_t KP[] = {$KP};
@@ -14,13 +14,16 @@ static int get_index(const char *key)
 {
     int f1 = 0, f2 = 0, i;
     unsigned char c;
+    size_t n;
 
     for (i = 0; (c = key[i]) && i < NS; i++) {
         f1 += S1[i] * c;
         f2 += S2[i] * c;
     }
+    n = strlen(key);
     i = (G[f1 % NG] + G[f2 % NG]) % NG;
-    if (i < NK && strcmp(key, station_list[i].callsign) == 0)
+    if (i < NK && n == (size_t) (KP[i + 1] - KP[i]) &&
+            memcmp(key, KD + KP[i], n) == 0)
         return i;
 
     return -1;
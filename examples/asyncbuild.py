@@ -0,0 +1,55 @@
+"""
+Rebuilds a table of keys with generate_hash_async(), while the event loop
+keeps serving a "request" every millisecond.  The largest delay of the
+requests is printed, along with the time the rebuild took, for calling
+generate_hash() directly (which blocks the event loop), the default
+(thread pool) executor, and a process pool.
+"""
+import sys
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append('..')
+from perfect_hash import (Config, IntSaltHash, generate_hash,
+                          generate_hash_async)
+
+
+NK = 2000
+
+
+async def serve(stop):
+    max_delay = 0.0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.001)
+        max_delay = max(max_delay, time.perf_counter() - t0 - 0.001)
+    return max_delay
+
+
+async def rebuild(name, keys, executor=None):
+    stop = asyncio.Event()
+    server = asyncio.ensure_future(serve(stop))
+    await asyncio.sleep(0.01)
+    t0 = time.perf_counter()
+    if name == 'blocking':
+        f1, f2, G = generate_hash(keys, IntSaltHash, config=Config(seed=1))
+    else:
+        f1, f2, G = await generate_hash_async(
+            keys, IntSaltHash, config=Config(seed=1), executor=executor)
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    max_delay = await server
+    print('%-14s NG = %d in %.2f sec, max. request delay: %7.1f ms' %
+          (name + ':', len(G), elapsed, 1000 * max_delay))
+
+
+async def main():
+    keys = ['key%d' % i for i in range(NK)]
+    await rebuild('blocking', keys)
+    await rebuild('threads', keys)
+    with ProcessPoolExecutor(1) as executor:
+        await rebuild('processes', keys, executor)
+
+
+asyncio.run(main())
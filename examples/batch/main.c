@@ -0,0 +1,80 @@
+#include <assert.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#include "keys.h"    /* get_index() and get_index_batch() */
+
+#define NK  (sizeof(KP) / sizeof(KP[0]) - 1)    /* number of keys */
+
+
+/* lookups per second of the n queries, one at a time or in batches */
+static double bench(const char **key, const size_t *len, size_t n,
+                    int *out, int batch)
+{
+    const int repeat = 5;
+    clock_t t0 = clock();
+    size_t i;
+    int r;
+
+    for (r = 0; r < repeat; r++) {
+        if (batch)
+            get_index_batch(key, len, n, out);
+        else
+            for (i = 0; i < n; i++)
+                out[i] = get_index(key[i], len[i]);
+    }
+    return repeat * n / ((double) (clock() - t0) / CLOCKS_PER_SEC);
+}
+
+int main()
+{
+    /* query all keys in random order, and as many non-member keys */
+    const size_t NQ = 2 * NK;
+    const char **key = malloc(NQ * sizeof(char *)), *t;
+    size_t *len = malloc(NQ * sizeof(size_t)), i, j, n;
+    int *expected = malloc(NQ * sizeof(int)), *out = malloc(NQ * sizeof(int));
+    char *buf = malloc(2 * sizeof(KD)), *p = buf;
+    int e;
+
+    for (i = 0; i < NK; i++) {
+        n = KP[i + 1] - KP[i];
+        for (j = 0; j < 2; j++) {
+            key[2 * i + j] = p;
+            len[2 * i + j] = n;
+            memcpy(p, KD + KP[i], n);
+            if (j)
+                p[n / 2] = '+';    /* not a key */
+            p += n;
+        }
+        expected[2 * i] = i;
+        expected[2 * i + 1] = -1;
+    }
+    srand(1);
+    for (i = NQ - 1; i > 0; i--) {
+        j = rand() % (i + 1);
+        t = key[i], key[i] = key[j], key[j] = t;
+        n = len[i], len[i] = len[j], len[j] = n;
+        e = expected[i], expected[i] = expected[j], expected[j] = e;
+    }
+
+    printf("%zu keys, G: %zu KB, keys: %zu KB\n", NK, sizeof(G) / 1024,
+           (sizeof(KD) + sizeof(KP)) / 1024);
+    printf("get_index:       %6.2f M lookups/s\n",
+           1e-6 * bench(key, len, NQ, out, 0));
+    for (i = 0; i < NQ; i++)
+        assert(out[i] == expected[i]);
+    printf("get_index_batch: %6.2f M lookups/s\n",
+           1e-6 * bench(key, len, NQ, out, 1));
+    for (i = 0; i < NQ; i++)
+        assert(out[i] == expected[i]);
+
+    free(key);
+    free(len);
+    free(expected);
+    free(out);
+    free(buf);
+    printf("OK\n");
+    return 0;
+}
@@ -0,0 +1,14 @@
+# python mk_rnd_keys.py 100000 | sort | uniq >keys.dat
+
+import sys
+from random import choices, randint, seed
+from string import ascii_letters, digits
+
+def key():
+    return ''.join(choices(ascii_letters + digits, k=randint(6, 20)))
+
+N = int(sys.argv[1])
+
+seed(N)  # the same keys for each run
+for n in range(N):
+    print(key())
@@ -0,0 +1,102 @@
+#include <assert.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#define NK  $NK       /* number of keys */
+#define NG  $NG       /* size of G, 16 integers (64 bytes) for each block */
+#define NB  $NB       /* number of blocks */
+#define NS  $NS       /* length of salt arrays */
+
+static const uint64_t S1[] = {$S1};
+static const uint32_t S2[] = {$S2};
+
+/* each block (one cache line) contains its seed and 15 vertex values */
+static const int32_t G[] __attribute__((aligned(64))) = {$G};
+
+static const char *K[] = {$K};
+
+
+/* return index of key in K if key is found, -1 otherwise */
+int get_index(const char *key)
+{
+    const unsigned char *k = (const unsigned char *) key;
+    const int32_t *g;
+    uint64_t f1 = 0;
+    uint32_t z = 0, u;
+    int i, v1, v2;
+
+    for (i = 0; k[i]; i++) {
+        if (i == NS)
+            return -1;
+        f1 += S1[i] * k[i];
+        z += S2[i] * k[i];        /* modulo 2**32 */
+    }
+    g = G + 16 * (f1 % NB);       /* all accesses to G are within g[0:16] */
+    u = (z ^ g[0]) * 0x9e3779b1u;
+    v1 = (u >> 16) % 15;
+    v2 = (v1 + 1 + (u & 0xffff) % 14) % 15;
+    i = (g[1 + v1] + g[1 + v2]) % NK;
+    if (strcmp(key, K[i]) == 0)
+        return i;
+
+    return -1;
+}
+
+/* number of distinct cache lines of G touched when looking up key
+   (computed from the addresses, this is not a measured miss rate) */
+int lines_accessed(const char *key)
+{
+    const unsigned char *k = (const unsigned char *) key;
+    uint64_t f1 = 0;
+    uint32_t z = 0, u;
+    uintptr_t l0, l1, l2;
+    int i, v1, v2;
+
+    for (i = 0; k[i]; i++) {
+        f1 += S1[i] * k[i];
+        z += S2[i] * k[i];
+    }
+    i = 16 * (f1 % NB);
+    u = (z ^ G[i]) * 0x9e3779b1u;
+    v1 = (u >> 16) % 15;
+    v2 = (v1 + 1 + (u & 0xffff) % 14) % 15;
+    l0 = (uintptr_t) &G[i] / 64;
+    l1 = (uintptr_t) &G[i + 1 + v1] / 64;
+    l2 = (uintptr_t) &G[i + 1 + v2] / 64;
+    return 1 + (l1 != l0) + (l2 != l0 && l2 != l1);
+}
+
+int main()
+{
+    char *key;
+    int i, n, lines = 0, N = 10000000;
+    long sum = 0;
+    clock_t t0;
+
+    key = (char *) malloc(64);
+    for (i = 0; i < NK; i++) {
+        strcpy(key, K[i]);
+        key[2] = '+';
+        assert(get_index(key) == -1 || strcmp(key, K[get_index(key)]) == 0);
+    }
+
+    for (i = 0; i < NK; i++) {
+        assert(get_index(K[i]) == i);
+        lines += lines_accessed(K[i]);
+    }
+
+    t0 = clock();
+    for (n = 0; n < N; n++)
+        sum += get_index(K[(n * 2654435761u) % NK]);
+    printf("NK = %d, size of G: %ld KiB\n", NK, (long) sizeof(G) / 1024);
+    printf("distinct cache lines of G touched per lookup: %.3f\n",
+           (double) lines / NK);
+    printf("time per lookup: %.1f ns  (%ld)\n",
+           1e9 * (clock() - t0) / CLOCKS_PER_SEC / N, sum % 10);
+
+    printf("OK\n");
+    return 0;
+}
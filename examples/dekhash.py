@@ -9,9 +9,9 @@ class DEKHash(object):
     """
     Random hash function generator.
     """
-    def __init__(self, N):
+    def __init__(self, N, rng=random):
         self.N = N
-        self.salt = random.getrandbits(31)
+        self.salt = rng.getrandbits(31)
 
     def DEKhash(self, x, key):
         for c in key:
@@ -33,10 +33,10 @@ def perfect_hash(key):
             G[DEKhash($S2, key)]) % $NG
 """
 
-keys = "Monday Tuesday Wednesday Thursday Friday Saturday Sunday".split()
+if __name__ == '__main__':
+    keys = "Monday Tuesday Wednesday Thursday Friday Saturday Sunday".split()
 
-perfect_hash.verbose = True
-perfect_hash.trials = 100
-code = perfect_hash.generate_code(keys, DEKHash, pow2=0)
-print(code)
-perfect_hash.run_code(code)
+    config = perfect_hash.Config(trials=100, verbose=True, seed=42)
+    code = perfect_hash.generate_code(keys, DEKHash, pow2=0, config=config)
+    print(code)
+    perfect_hash.run_code(code)
@@ -0,0 +1,30 @@
+"""
+Compares lookups in the extension module built without --stats (see
+'make bench') with a dict.
+"""
+from timeit import timeit
+
+from fast_stations import lookup, lookup_many, table
+
+
+D = {}
+for line in open('../PyCExt/stations.dat'):
+    call, loc = (x.strip() for x in line.split(','))
+    D[call] = loc
+
+calls = list(D)
+buf = '\n'.join(calls).encode()
+assert lookup_many(buf) == list(D.values())
+
+N = 1_000_000
+g = dict(D=D, lookup=lookup, table=table, call="DL5BAC")
+for stmt in "D[call]", "table[call]", "lookup(call)", "call in table":
+    t = min(timeit(stmt, number=N, globals=g) for i in range(3))
+    print("%-14s %6.1f ns" % (stmt, 1e9 * t / N))
+
+g.update(calls=calls, buf=buf, lookup_many=lookup_many)
+for stmt in "[D[k] for k in calls]", "lookup_many(calls)", "lookup_many(buf)":
+    t = min(timeit(stmt, number=100, globals=g) for i in range(3))
+    print("%-22s %6.1f ns per key" % (stmt, 1e9 * t / 100 / len(calls)))
+
+print("OK")
@@ -0,0 +1,43 @@
+from time import perf_counter
+
+from stations import lookup, lookup_many, contains, table, stats
+
+
+D = {}
+for line in open('../PyCExt/stations.dat'):
+    call, loc = (x.strip() for x in line.split(','))
+    D[call] = loc
+
+for call, loc in D.items():
+    assert lookup(call) == table[call] == loc
+    assert lookup(call.encode()) == lookup(memoryview(call.encode())) == loc
+    assert call in table and contains(call)
+assert len(table) == len(D)
+
+calls = list(D)
+assert lookup_many(calls) == list(D.values())
+# a buffer of newline separated keys is looked up without copying keys
+buf = '\n'.join(calls + ['W5UN']).encode()
+assert lookup_many(buf) == list(D.values()) + [None]
+assert lookup_many(b'N1BUG,' + calls[0].encode(), '?', b',') == [
+    '?', D[calls[0]]]
+
+for call in "W5UN", "N1BUG", "W4ZD", "KH3HZO", "ZB2IQ", "HB9CV":
+    assert call not in table and not contains(call)
+    assert lookup(call, None) is None
+    try:
+        table[call]
+    except KeyError:
+        pass
+    else:
+        raise AssertionError(call)
+
+# the module is built using --stats
+stats(reset=True)
+for call in "W5UN", "DL5BAC", "KH3HZO", "N1BUGXXXXXXXXXXXX":
+    lookup(call, None)
+assert stats() == dict(lookups=4, too_long=1, mismatch=2, hits=1)
+stats(reset=True)
+assert stats()['lookups'] == 0
+
+print("OK")
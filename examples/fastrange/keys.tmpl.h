@@ -0,0 +1,8 @@
+#define NK  $NK       /* number of keys */
+#define NG  $NG       /* number of vertices */
+#define NS  $NS       /* length of array S1 and S2 */
+
+unsigned int S1[] = {$S1};
+unsigned int S2[] = {$S2};
+int G[] = {$G};
+char *K[] = {$K};
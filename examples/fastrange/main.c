@@ -0,0 +1,55 @@
+#include <assert.h>
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <string.h>
+#include <stdlib.h>
+
+#include "keys.code.h"
+
+
+/* map the salted sum x to range(NG) without division */
+static inline uint32_t fastrange(uint32_t x)
+{
+    return (uint32_t) (((uint64_t) (x * 0x9e3779b1u) * NG) >> 32);
+}
+
+/* return index of key in K if key is found, -1 otherwise */
+int get_index(const char *key)
+{
+    uint32_t f1 = 0, f2 = 0;
+    int i;
+    unsigned char c;
+
+    for (i = 0; (c = key[i]) && i < NS; i++) {
+        f1 += S1[i] * c;
+        f2 += S2[i] * c;
+    }
+    i = G[fastrange(f1)] + G[fastrange(f2)];
+    if (i >= NG)
+        i -= NG;
+    if (i < NK && strcmp(key, K[i]) == 0)
+        return i;
+
+    return -1;
+}
+
+int main()
+{
+    char *key;
+    int i;
+
+    key = (char *) malloc(64);
+    for (i = 0; i < NK; i++) {
+        strcpy(key, K[i]);
+        key[2] = '+';
+        assert(get_index(key) == -1);
+    }
+
+    for (i = 0; i < NK; i++)
+        assert(get_index(K[i]) == i);
+
+    printf("OK\n");
+
+    return 0;
+}
@@ -0,0 +1,76 @@
+#include <assert.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define NK  $NK       /* number of keys */
+#define NG  $NG       /* number of vertices */
+#define NS  $NS       /* length of salt strings */
+#define FB  $FB       /* number of bits in fingerprint */
+
+int G[] = {$G};
+
+/* the keys themselves are not stored, only their fingerprints */
+uint16_t FP[] = {$FP};
+
+
+static uint32_t fingerprint(const char *key)
+{
+    uint32_t h = $FS;
+
+    while (*key) {
+        h ^= (unsigned char) *key++;
+        h *= 16777619;
+    }
+    return h >> (32 - FB);
+}
+
+/* return index of key if key is (probably) found, -1 otherwise */
+int get_index(const char *key)
+{
+    unsigned char c;
+    int f1 = 0, f2 = 0, i;
+
+    for (i = 0; (c = key[i]); i++) {
+        if (i == NS)
+            return -1;
+        f1 += "$S1"[i] * c;
+        f2 += "$S2"[i] * c;
+    }
+    i = (G[f1 % NG] + G[f2 % NG]) % NG;
+    if (i < NK && FP[i] == fingerprint(key))
+        return i;
+
+    return -1;
+}
+
+int main(int argc, char *argv[])
+{
+    char key[64];
+    FILE *fi;
+    int i, n = 0, fp = 0;
+
+    /* all keys are found */
+    fi = fopen(argv[1], "r");
+    for (i = 0; fscanf(fi, "%63s", key) == 1; i++)
+        assert(get_index(key) == i);
+    fclose(fi);
+    assert(i == NK);
+
+    /* measure the false positive rate for random non-member keys */
+    srand(42);
+    for (n = 0; n < 1000000; n++) {
+        for (i = 0; i < 10; i++)
+            key[i] = 'a' + rand() % 26;  /* lowercase, never a member */
+        key[1 + rand() % 9] = '\0';
+        if (get_index(key) >= 0)
+            fp++;
+    }
+    printf("false positive rate: %g (expected at most %g)\n",
+           (double) fp / n, 1.0 / (1 << FB));
+    assert(fp < 3 * n / (1 << FB));
+
+    printf("OK\n");
+    return 0;
+}
@@ -0,0 +1,40 @@
+"""
+Compares the quality of the builtin hash function generators and of those
+in the examples (XORHash, DEKHash and PythonHash) using hash_quality(),
+for two samples of keys: random strings, and short decimal numbers.
+When a filename is given as argument, the results are written to it
+as JSON.
+"""
+import sys
+import json
+
+sys.path.append('..')
+from perfect_hash import (Config, StrSaltHash, IntSaltHash, StrSaltFastHash,
+                          anum_chars, hash_quality, quality_report)
+from xorhash import XORHash
+from dekhash import DEKHash
+from pythonhash import PythonHash
+
+
+config = Config(seed=1)
+rnd = config.random
+samples = {
+    'random': sorted(set(''.join(rnd.choices(anum_chars,
+                                             k=rnd.randint(6, 20)))
+                         for i in range(1000))),
+    'numbers': [str(i) for i in range(1000)],
+}
+
+results = []
+for name, keys in samples.items():
+    for Hash in (StrSaltHash, IntSaltHash, StrSaltFastHash, XORHash,
+                 DEKHash, PythonHash):
+        quality = hash_quality(keys, Hash, ratios=(2.1, 2.5, 3.0),
+                               samples=20, config=config.spawn())
+        quality['keys'] = name
+        results.append(quality)
+        print('%s keys, %s' % (name, quality_report(quality)))
+
+if len(sys.argv) > 1:
+    with open(sys.argv[1], 'w') as fo:
+        json.dump(results, fo, indent=2)
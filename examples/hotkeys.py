@@ -0,0 +1,62 @@
+"""
+Simulates the cache hit rate of lookups in a table of keys, whose access
+frequencies follow a Zipf distribution, for the usual table layout and
+for the layout chosen by generate_hot_hash() (as with --freqcol).
+Each lookup accesses two integers of G (16 per 64-byte cache line) and
+one key record in K (4 per cache line), in an LRU cache of CACHE_LINES
+lines.
+"""
+import sys
+import random
+from collections import OrderedDict
+
+sys.path.append('..')
+from perfect_hash import (Config, IntSaltHash, generate_hash,
+                          generate_hot_hash, order_by_frequency)
+
+
+NK = 2000
+LOOKUPS = 100000
+CACHE_LINES = 64
+
+
+def hit_rate(f1, f2, G, keys, workload):
+    NG_lines = len(G) // 16 + 1
+    cache = OrderedDict()
+    hits = total = 0
+    index = {key: h for h, key in enumerate(keys)}
+    for key in workload:
+        h = index[key]
+        for line in f1(key) // 16, f2(key) // 16, NG_lines + h // 4:
+            total += 1
+            if line in cache:
+                hits += 1
+                cache.move_to_end(line)
+            else:
+                cache[line] = None
+                if len(cache) > CACHE_LINES:
+                    cache.popitem(last=False)
+    return hits / total
+
+
+rnd = random.Random(1)
+keys = ['key%06d' % rnd.randrange(10 ** 6) for i in range(2 * NK)]
+keys = list(OrderedDict.fromkeys(keys))[:NK]
+freqs = [1.0 / (rank + 1) for rank in range(NK)]  # Zipf with s = 1
+rnd.shuffle(freqs)
+workload = rnd.choices(keys, freqs, k=LOOKUPS)
+
+plain = generate_hash(keys, IntSaltHash, config=Config(trials=5, seed=2))
+rate_plain = hit_rate(*plain, keys, workload)
+
+order = order_by_frequency(keys, freqs)
+hot_keys = [keys[i] for i in order]
+hot = generate_hot_hash(hot_keys, [freqs[i] for i in order], IntSaltHash,
+                        config=Config(trials=5, seed=2))
+rate_hot = hit_rate(*hot, hot_keys, workload)
+
+print('%d keys, %d lookups, LRU cache of %d lines' % (NK, LOOKUPS,
+                                                      CACHE_LINES))
+print('hit rate, usual layout:     %.3f' % rate_plain)
+print('hit rate, frequency layout: %.3f' % rate_hot)
+assert rate_hot > rate_plain
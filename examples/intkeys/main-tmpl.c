@@ -0,0 +1,45 @@
+#include <assert.h>
+#include <stdint.h>
+#include <stdio.h>
+
+#define NK  $NK       /* number of keys */
+#define NG  $NG       /* number of vertices */
+
+static const uint64_t S1[] = {$S1};
+static const uint64_t S2[] = {$S2};
+static const int G[] = {$G};
+
+static const uint64_t K[] = {$K};
+
+
+static uint32_t hash_f(uint64_t key, const uint64_t *s)
+{
+    return (s[0] * (key & 0xffffffff) + s[1] * (key >> 32) + s[2]) >> 32;
+}
+
+/* return index of key in K if key is found, -1 otherwise */
+int get_index(uint64_t key)
+{
+    int i = (G[hash_f(key, S1) % NG] + G[hash_f(key, S2) % NG]) % NG;
+
+    if (i < NK && K[i] == key)
+        return i;
+
+    return -1;
+}
+
+int main()
+{
+    int i, j;
+
+    for (i = 0; i < NK; i++)
+        assert(get_index(K[i]) == i);
+
+    for (i = 0; i < NK; i++) {
+        j = get_index(K[i] + 1);
+        assert(j == -1 || K[j] == K[i] + 1);
+    }
+
+    printf("OK\n");
+    return 0;
+}
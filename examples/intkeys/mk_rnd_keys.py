@@ -0,0 +1,12 @@
+import sys
+from random import getrandbits, randint
+
+N = int(sys.argv[1])
+
+result = set()
+while len(result) < N:
+    # mix of small IDs and large (up to 63 bit) numbers
+    result.add(randint(0, 100000) if len(result) % 2 else getrandbits(63))
+
+for k in result:
+    print(k)
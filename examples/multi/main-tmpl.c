@@ -0,0 +1,59 @@
+#include <assert.h>
+#include <stdio.h>
+#include <string.h>
+
+#define NK  $NK       /* number of keys (of all tables) */
+#define NG  $NG       /* number of vertices */
+#define NS  $NS       /* length of salt arrays */
+#define NT  $NT       /* number of tables */
+
+static const int S1[] = {$S1};
+static const int S2[] = {$S2};
+static const int G[] = {$G};
+
+static const char *K[] = {$K};
+
+static const char *TN[] = {$TN};   /* names of tables */
+static const int TO[] = {$TO};     /* keys of table t are K[TO[t]:TO[t+1]] */
+
+
+/* return index of key in table t if key is found, -1 otherwise */
+int get_index(int t, const char *key)
+{
+    /* the key is tagged by the byte t + 1, which precedes the key */
+    int f1 = S1[0] * (t + 1), f2 = S2[0] * (t + 1), i;
+    unsigned char c;
+
+    for (i = 0; (c = key[i]); i++) {
+        if (i + 1 == NS)
+            return -1;
+        f1 += S1[i + 1] * c;
+        f2 += S2[i + 1] * c;
+    }
+    i = (G[f1 % NG] + G[f2 % NG]) % NG;
+    if (TO[t] <= i && i < TO[t + 1] && strcmp(key, K[i]) == 0)
+        return i - TO[t];
+
+    return -1;
+}
+
+int main()
+{
+    int t, i;
+
+    for (t = 0; t < NT; t++) {
+        printf("%s:", TN[t]);
+        for (i = TO[t]; i < TO[t + 1]; i++) {
+            printf(" %s", K[i]);
+            assert(get_index(t, K[i]) == i - TO[t]);
+        }
+        printf("\n");
+    }
+    assert(get_index(0, "QUIT") == -1);    /* not an HTTP method */
+    assert(get_index(3, "QUIT") == 6);
+    assert(get_index(1, "HELLO") == -1);
+    assert(get_index(2, "") == -1);
+
+    printf("OK\n");
+    return 0;
+}
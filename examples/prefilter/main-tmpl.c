@@ -0,0 +1,148 @@
+#include <assert.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#define NK  $NK       /* number of keys */
+#define NG  $NG       /* number of vertices */
+#define NS  $NS       /* length of salt arrays */
+#define BM  $BM       /* number of bits in Bloom filter */
+#define BK  $BK       /* number of hash functions of Bloom filter */
+#define BS  $BS       /* seed of Bloom filter hash */
+
+static const int S1[] = {$S1};
+static const int S2[] = {$S2};
+static const int G[] = {$G};
+static const char *K[] = {$K};
+
+static const unsigned char LB[] = {$LB};    /* key lengths */
+static const unsigned char B0[] = {$B0};    /* first bytes of keys */
+static const unsigned char B1[] = {$B1};    /* last bytes of keys */
+static const unsigned char BF[] = {$BF};    /* Bloom filter */
+
+#define IN_BITMAP(b, i)  ((b)[(i) >> 3] >> ((i) & 7) & 1)
+
+
+/* return 0 when key (of length n) is certainly not in K */
+static int maybe_key(const unsigned char *key, size_t n)
+{
+    if (n >> 3 >= sizeof(LB) || !IN_BITMAP(LB, n))
+        return 0;
+    if (n && !(IN_BITMAP(B0, key[0]) && IN_BITMAP(B1, key[n - 1])))
+        return 0;
+#if BM
+    uint32_t h = BS, d;
+    size_t i;
+
+    for (i = 0; i < n; i++)
+        h = (h ^ key[i]) * 16777619u;
+    d = (h >> 16) | 1;
+    for (i = 0; i < BK; i++) {
+        if (!IN_BITMAP(BF, (h + i * d) % BM))
+            return 0;
+    }
+#endif
+    return 1;
+}
+
+/* return index of key in K if key is found, -1 otherwise */
+static int lookup(const char *key, size_t n)
+{
+    int f1 = 0, f2 = 0, i;
+
+    if (n > NS)
+        return -1;
+    for (i = 0; i < n; i++) {
+        f1 += S1[i] * (unsigned char) key[i];
+        f2 += S2[i] * (unsigned char) key[i];
+    }
+    i = (G[f1 % NG] + G[f2 % NG]) % NG;
+    if (i < NK && strcmp(key, K[i]) == 0)
+        return i;
+
+    return -1;
+}
+
+int get_index(const char *key)
+{
+    size_t n = strlen(key);
+
+    if (!maybe_key((const unsigned char *) key, n))
+        return -1;
+    return lookup(key, n);
+}
+
+int get_index_nofilter(const char *key)
+{
+    return lookup(key, strlen(key));
+}
+
+/* random identifier, which is a key with probability 1/20 */
+void random_probe(char *probe)
+{
+    static const char chars[] =
+        "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_";
+    int i, n;
+
+    if (rand() % 20 == 0) {
+        strcpy(probe, K[rand() % NK]);
+        return;
+    }
+    n = 1 + rand() % 12;
+    for (i = 0; i < n; i++)
+        probe[i] = chars[rand() % (i ? 63 : 53)];
+    probe[n] = '\0';
+}
+
+int main()
+{
+    char key[64], *probes;
+    int i, n, N = 100000, R = 100, rejected = 0, misses = 0;
+    long sum = 0;
+    clock_t t0;
+    double t_filter, t_plain;
+
+    for (i = 0; i < NK; i++) {
+        assert(maybe_key((const unsigned char *) K[i], strlen(K[i])));
+        assert(get_index(K[i]) == i);
+        strcpy(key, K[i]);
+        key[1] = '+';
+        assert(get_index(key) == -1);
+    }
+
+    probes = (char *) malloc(16 * N);
+    for (n = 0; n < N; n++) {
+        random_probe(probes + 16 * n);
+        assert(get_index(probes + 16 * n) ==
+               get_index_nofilter(probes + 16 * n));
+        if (get_index(probes + 16 * n) < 0) {
+            misses++;
+            rejected += !maybe_key((const unsigned char *) probes + 16 * n,
+                                   strlen(probes + 16 * n));
+        }
+    }
+
+    t0 = clock();
+    for (i = 0; i < R; i++)
+        for (n = 0; n < N; n++)
+            sum += get_index(probes + 16 * n);
+    t_filter = 1e9 * (clock() - t0) / CLOCKS_PER_SEC / N / R;
+
+    t0 = clock();
+    for (i = 0; i < R; i++)
+        for (n = 0; n < N; n++)
+            sum += get_index_nofilter(probes + 16 * n);
+    t_plain = 1e9 * (clock() - t0) / CLOCKS_PER_SEC / N / R;
+
+    printf("NK = %d, size of filters: %ld bytes\n", NK,
+           (long) (sizeof(LB) + sizeof(B0) + sizeof(B1) + sizeof(BF)));
+    printf("misses: %.1f%%, rejected by filters: %.1f%%\n",
+           100.0 * misses / N, 100.0 * rejected / misses);
+    printf("time per lookup: %.1f ns with filters, %.1f ns without  (%ld)\n",
+           t_filter, t_plain, sum % 10);
+
+    printf("OK\n");
+    return 0;
+}
@@ -0,0 +1,13 @@
+# python mk_rnd_keys.py 1000 | sort | uniq >keys.dat
+
+import sys
+from random import choices, randint
+from string import ascii_lowercase
+
+def key():
+    return ''.join(choices(ascii_lowercase, k=randint(3, 9)))
+
+N = int(sys.argv[1])
+
+for n in range(N):
+    print(key())
@@ -5,16 +5,16 @@ import sys
 import random
 
 sys.path.append('..')
-from perfect_hash import generate_code, run_code, anum_chars
+from perfect_hash import Config, generate_code, run_code, anum_chars
 
 
 class PythonHash(object):
     """
     Random hash function generator.
     """
-    def __init__(self, N):
+    def __init__(self, N, rng=random):
         self.N = N
-        self.salt = ''.join(random.choices(anum_chars, k=10))
+        self.salt = ''.join(rng.choices(anum_chars, k=10))
 
     def __call__(self, key):
         return hash(self.salt + key) % self.N
@@ -26,14 +26,15 @@ def perfect_hash(key):
 """
 
 
-keys = "Monday Tuesday Wednesday Thursday Friday Saturday Sunday".split()
+if __name__ == '__main__':
+    keys = "Monday Tuesday Wednesday Thursday Friday Saturday Sunday".split()
 
-code = generate_code(keys, PythonHash)
-print(code)
-try:
-    run_code(code)
-except AssertionError:
-    print("""\
+    code = generate_code(keys, PythonHash, config=Config(seed=42))
+    print(code)
+    try:
+        run_code(code)
+    except AssertionError:
+        print("""\
 Set PYTHONHASHSEED when running this program, e.g.:
 $ export PYTHONHASHSEED=0
 """)
@@ -0,0 +1,51 @@
+#include <assert.h>
+#include <stdio.h>
+#include <string.h>
+
+#include "routes.h"
+
+/* request lines, and the index of their route in keys.dat (or -1) */
+static const struct {
+    const char *line;
+    int route;
+} REQUESTS[] = {
+    {"GET / HTTP/1.1", 0},
+    {"POST /login HTTP/1.1", 2},
+    {"GET /login HTTP/1.1", 1},
+    {"GET /items/search HTTP/1.1", 6},
+    {"DELETE /items HTTP/1.1", 7},
+    {"HEAD / HTTP/1.1", 9},
+    {"PUT /items HTTP/1.1", -1},
+    {"GET /items/ HTTP/1.1", -1},
+    {"GET /logout HTTP/1.1", -1},
+    {"GET/ login HTTP/1.1", -1},
+};
+
+
+/* Return the route of a request line, whose method and path are looked up
+   as slices of the line, without joining or copying them. */
+static int route(const char *line)
+{
+    const char *key[2];
+    size_t len[2];
+    const char *sp;
+
+    key[0] = line;
+    sp = strchr(line, ' ');
+    len[0] = sp - line;
+    key[1] = sp + 1;
+    len[1] = strchr(key[1], ' ') - key[1];
+    return get_index(key, len);
+}
+
+int main()
+{
+    size_t i;
+
+    for (i = 0; i < sizeof(REQUESTS) / sizeof(REQUESTS[0]); i++) {
+        printf("%-28s -> %d\n", REQUESTS[i].line, route(REQUESTS[i].line));
+        assert(route(REQUESTS[i].line) == REQUESTS[i].route);
+    }
+    printf("OK\n");
+    return 0;
+}
@@ -0,0 +1,35 @@
+"""
+Benchmark the Python keyword scanner generated by --scanner (keywords.py)
+on the text file given as argument, and check its result against
+tokenizing the text first, and looking up each token in a dict.
+"""
+import re
+import sys
+import time
+
+from keywords import K, scan
+
+
+with open(sys.argv[1], 'rb') as fi:
+    buf = memoryview(fi.read())
+
+t0 = time.perf_counter()
+counts = [0] * len(K)
+for start, end, h in scan(buf):
+    if h >= 0:
+        counts[h] += 1
+t = time.perf_counter() - t0
+print('Python scanner:       %6.1f MB/s' % (len(buf) / t / 1e6))
+
+t0 = time.perf_counter()
+index = {k.encode(): h for h, k in enumerate(K)}
+expected = [0] * len(K)
+for token in re.findall(b'[A-Za-z0-9_]+', buf):
+    h = index.get(token, -1)
+    if h >= 0:
+        expected[h] += 1
+t = time.perf_counter() - t0
+print('tokens and dict:      %6.1f MB/s' % (len(buf) / t / 1e6))
+
+assert counts == expected
+print('OK')
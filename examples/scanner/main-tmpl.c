@@ -0,0 +1,162 @@
+#include <assert.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#define NK  $NK       /* number of keys */
+#define NG  $NG       /* number of vertices */
+#define NS  $NS       /* length of salt arrays */
+
+static const int S1[] = {$S1};
+static const int S2[] = {$S2};
+static const int G[] = {$G};
+
+static const char KD[] = $KD;
+static const uint${KPB}_t KP[] = {$KP};
+
+/* 1 for the bytes of identifiers, 0 otherwise */
+static const unsigned char CC[256] = {$CC};
+
+
+/* Find the next identifier in buf, starting at *pos.  Its start and end
+   are stored, *pos is advanced to its end, and its index in the keys is
+   returned, or -1 when it is not a key.  At the end of the buffer, -2 is
+   returned.  The identifier is hashed while its end is searched. */
+static int scan(const unsigned char *buf, size_t len, size_t *pos,
+                size_t *start, size_t *end)
+{
+    size_t i = *pos, s, n;
+    long f1 = 0, f2 = 0;
+    int h;
+
+    while (i < len && !CC[buf[i]])
+        i++;
+    if (i == len) {
+        *pos = i;
+        return -2;
+    }
+    for (s = i; i < len && CC[buf[i]]; i++) {
+        if (i - s < NS) {
+            f1 += S1[i - s] * buf[i];
+            f2 += S2[i - s] * buf[i];
+        }
+    }
+    *start = s;
+    *end = *pos = i;
+
+    n = i - s;
+    if (n > NS)
+        return -1;
+    h = (G[f1 % NG] + G[f2 % NG]) % NG;
+    if (h < NK && n == (size_t) (KP[h + 1] - KP[h]) &&
+            memcmp(buf + s, KD + KP[h], n) == 0)
+        return h;
+    return -1;
+}
+
+/* the usual way: copy each identifier into a string, and look it up */
+static int get_index(const char *key)
+{
+    long f1 = 0, f2 = 0;
+    size_t i, n = strlen(key);
+    int h;
+
+    if (n > NS)
+        return -1;
+    for (i = 0; i < n; i++) {
+        f1 += S1[i] * (unsigned char) key[i];
+        f2 += S2[i] * (unsigned char) key[i];
+    }
+    h = (G[f1 % NG] + G[f2 % NG]) % NG;
+    if (h < NK && n == (size_t) (KP[h + 1] - KP[h]) &&
+            memcmp(key, KD + KP[h], n) == 0)
+        return h;
+    return -1;
+}
+
+static void tokenize(const unsigned char *buf, size_t len, size_t *counts)
+{
+    size_t i = 0, s;
+    char *token;
+    int h;
+
+    while (i < len) {
+        if (!CC[buf[i]]) {
+            i++;
+            continue;
+        }
+        for (s = i; i < len && CC[buf[i]]; i++)
+            ;
+        token = strndup((const char *) buf + s, i - s);
+        if ((h = get_index(token)) >= 0)
+            counts[h]++;
+        free(token);
+    }
+}
+
+static void scan_all(const unsigned char *buf, size_t len, size_t *counts)
+{
+    size_t pos = 0, start, end;
+    int h;
+
+    while ((h = scan(buf, len, &pos, &start, &end)) != -2) {
+        if (h >= 0)
+            counts[h]++;
+    }
+}
+
+static double bench(void (*f)(const unsigned char *, size_t, size_t *),
+                    const unsigned char *buf, size_t len, size_t *counts)
+{
+    const int repeat = 20;
+    clock_t t0 = clock();
+    int r;
+
+    for (r = 0; r < repeat; r++) {
+        memset(counts, 0, NK * sizeof(size_t));
+        f(buf, len, counts);
+    }
+    return repeat * len / (1e6 * (clock() - t0) / CLOCKS_PER_SEC);
+}
+
+int main(int argc, char *argv[])
+{
+    size_t counts[NK], expected[NK], len, total = 0;
+    unsigned char *buf;
+    FILE *fi;
+    int h;
+
+    if (argc != 2) {
+        fprintf(stderr, "usage: %s FILE\n", argv[0]);
+        return 2;
+    }
+    if ((fi = fopen(argv[1], "rb")) == NULL) {
+        perror(argv[1]);
+        return 1;
+    }
+    fseek(fi, 0, SEEK_END);
+    len = ftell(fi);
+    rewind(fi);
+    buf = malloc(len);
+    if (fread(buf, 1, len, fi) != len) {
+        perror(argv[1]);
+        return 1;
+    }
+    fclose(fi);
+
+    printf("tokens and get_index: %6.1f MB/s\n",
+           bench(tokenize, buf, len, expected));
+    printf("C scanner:            %6.1f MB/s\n",
+           bench(scan_all, buf, len, counts));
+
+    for (h = 0; h < NK; h++) {
+        assert(counts[h] == expected[h]);
+        total += counts[h];
+    }
+    printf("%zu keywords in %zu bytes\n", total, len);
+    free(buf);
+    printf("OK\n");
+    return 0;
+}
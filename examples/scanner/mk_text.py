@@ -0,0 +1,31 @@
+"""
+Write (about) the given number of bytes of C-like source code, in which
+about a third of the identifiers are keywords, to stdout.
+"""
+import sys
+import random
+
+
+keywords = [line.strip() for line in open('keys.dat')
+            if line.strip() and not line.startswith('#')]
+names = ['i', 'n', 'x', 'buf', 'len', 'node', 'next', 'count', 'result',
+         'value', 'ptr', 'size_t', 'uint32_t', 'hash_table', 'get_index',
+         'ifdef', 'doubles', 'while_', 'Int', 'returned']
+punct = ['(', ')', ';', '{', '}', '=', '+', '->', '*', ',', '0', '42',
+         '0x1f', '"str"', '==', '\n    ']
+
+random.seed(0)
+size = int(sys.argv[1])
+out = []
+while size > 0:
+    r = random.random()
+    if r < 0.3:
+        token = random.choice(keywords)
+    elif r < 0.6:
+        token = random.choice(names)
+    else:
+        token = random.choice(punct)
+    out.append(token)
+    out.append(' ')
+    size -= len(token) + 1
+sys.stdout.write(''.join(out))
@@ -0,0 +1,69 @@
+#include <assert.h>
+#include <stdio.h>
+#include <string.h>
+#include <stdlib.h>
+
+#define NK   $NK       /* number of keys */
+#define NG   $NG       /* number of vertices (in all shards) */
+#define NS   $NS       /* length of salt of each shard */
+#define NSH  $NSH      /* number of shards */
+
+int S0[] = {$S0};      /* salt of first level hash function */
+int S1[] = {$S1};      /* NS salt integers for each shard */
+int S2[] = {$S2};
+int GO[] = {$GO};      /* offset of each shard in G */
+int G[] = {$G};
+
+char *K[] = {$K};
+
+
+static int hash_f(const unsigned char *key, const int *salt, int n)
+{
+    int f = 0, i;
+
+    for (i = 0; key[i]; i++)
+        f += salt[i] * key[i];
+
+    return f % n;
+}
+
+/* return index of key in K if key is found, -1 otherwise */
+int get_index(const char *key)
+{
+    const unsigned char *k = (const unsigned char *) key;
+    int s, o, n, i;
+
+    if (strlen(key) > NS)
+        return -1;
+
+    s = hash_f(k, S0, NSH);          /* select the shard */
+    o = GO[s];
+    n = GO[s + 1] - o;
+    i = (G[o + hash_f(k, S1 + s * NS, n)] +
+         G[o + hash_f(k, S2 + s * NS, n)]) % NK;
+
+    if (strcmp(key, K[i]) == 0)
+        return i;
+
+    return -1;
+}
+
+int main()
+{
+    char *key;
+    int i;
+
+    key = (char *) malloc(64);
+    for (i = 0; i < NK; i++) {
+        strcpy(key, K[i]);
+        key[2] = '+';
+        assert(get_index(key) == -1);
+    }
+
+    for (i = 0; i < NK; i++)
+        assert(get_index(K[i]) == i);
+
+    printf("OK\n");
+
+    return 0;
+}
@@ -5,11 +5,11 @@ sys.path.append('..')
 from perfect_hash import generate_hash, anum_chars
 
 
-def mkRandHash(N):
+def mkRandHash(N, rng=random):
     """
     Return a random hash function which returns hash values in range(N)
     """
-    salt = "".join(random.choices(anum_chars, k=10))
+    salt = "".join(rng.choices(anum_chars, k=10))
     return lambda key: hash(salt + key) % N
 
 
@@ -0,0 +1,124 @@
+#include <assert.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#ifndef HEADER
+#define HEADER "headers.h"
+#endif
+#include HEADER
+
+#define NH  34        /* number of keys in keys.dat */
+
+/* the header section of an HTTP request, as received */
+static const char REQUEST[] =
+    "Host: example.com\r\n"
+    "User-Agent: Mozilla/5.0 (X11; Linux x86_64)\r\n"
+    "Accept: text/html,application/xhtml+xml\r\n"
+    "Accept-Language: en-US,en;q=0.5\r\n"
+    "Accept-Encoding: gzip, deflate, br\r\n"
+    "Referer: https://example.com/index.html\r\n"
+    "Connection: keep-alive\r\n"
+    "Cookie: session=0123456789abcdef\r\n"
+    "Upgrade-Insecure-Requests: 1\r\n"
+    "Sec-Fetch-Dest: document\r\n"
+    "Sec-Fetch-Mode: navigate\r\n"
+    "If-None-Match: \"5d8c72a5edda8\"\r\n"
+    "Cache-Control: max-age=0\r\n"
+    "\r\n";
+
+
+/* Count the known header names of the request in counts.  The names are
+   looked up in place, as slices of the buffer. */
+static void parse_slices(const char *buf, size_t *counts)
+{
+    const char *colon;
+    int h;
+
+    while (buf[0] != '\r') {
+        colon = strchr(buf, ':');
+        if ((h = get_index(buf, colon - buf)) >= 0)
+            counts[h]++;
+        buf = strchr(colon, '\n') + 1;
+    }
+}
+
+/* the same, but each name is first copied into a NUL terminated string,
+   as required by a get_index() which calls strlen() */
+static void parse_copies(const char *buf, size_t *counts)
+{
+    const char *colon;
+    char name[256];
+    size_t n;
+    int h;
+
+    while (buf[0] != '\r') {
+        colon = strchr(buf, ':');
+        n = colon - buf < 255 ? colon - buf : 255;
+        memcpy(name, buf, n);
+        name[n] = '\0';
+        if ((h = get_index(name, strlen(name))) >= 0)
+            counts[h]++;
+        buf = strchr(colon, '\n') + 1;
+    }
+}
+
+/* look up the n names (given as slices) of a parsed request only */
+static double bench_lookups(const char **names, const size_t *lens, size_t n)
+{
+    const int repeat = 2000000;
+    clock_t t0 = clock();
+    size_t i, found = 0;
+    int r;
+
+    for (r = 0; r < repeat; r++) {
+        for (i = 0; i < n; i++)
+            found += get_index(names[i], lens[i]) >= 0;
+    }
+    assert(found == 10 * (size_t) repeat);
+    return repeat * n / (1e6 * (clock() - t0) / CLOCKS_PER_SEC);
+}
+
+static double bench(void (*f)(const char *, size_t *), size_t *counts)
+{
+    const int repeat = 1000000;
+    clock_t t0 = clock();
+    int r;
+
+    memset(counts, 0, NH * sizeof(size_t));
+    for (r = 0; r < repeat; r++)
+        f(REQUEST, counts);
+    return repeat / (1e6 * (clock() - t0) / CLOCKS_PER_SEC);
+}
+
+int main()
+{
+    size_t counts[NH], expected[NH], lens[32], n = 0, total = 0;
+    const char *names[32], *p = REQUEST;
+    int h;
+
+    assert(get_index("Host", 4) >= 0);
+    assert(get_index("Hostname", 4) == get_index("Host", 4));
+    assert(get_index("Hostname", 8) == -1);
+    assert(get_index("Host", 3) == -1);
+    assert(get_index("", 0) == -1);
+
+    printf("copies:  %6.2f M requests/s\n", bench(parse_copies, expected));
+    printf("slices:  %6.2f M requests/s\n", bench(parse_slices, counts));
+
+    while (p[0] != '\r') {
+        names[n] = p;
+        lens[n++] = strchr(p, ':') - p;
+        p = strchr(p, '\n') + 1;
+    }
+    printf("lookups: %6.2f M lookups/s\n", bench_lookups(names, lens, n));
+
+    for (h = 0; h < NH; h++) {
+        assert(counts[h] == expected[h]);
+        total += counts[h];
+    }
+    assert(total == 10 * 1000000);
+    printf("OK\n");
+    return 0;
+}
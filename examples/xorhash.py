@@ -9,14 +9,16 @@ class XORHash(object):
     """
     Random hash function generator.
     """
-    def __init__(self, N):
+    def __init__(self, N, rng=random):
         self.N = N
         self.salt = bytearray()
+        self.rng = rng
 
     def __call__(self, key):
         key = key.encode()
         while len(self.salt) < len(key):  # add more salt as necessary
-            self.salt.append(random.choice(perfect_hash.anum_chars.encode()))
+            self.salt.append(
+                self.rng.choice(perfect_hash.anum_chars.encode()))
 
         return sum(self.salt[i] ^ c for i, c in enumerate(key)) % self.N
 
@@ -32,10 +34,10 @@ def perfect_hash(key):
             G[hash_f(key, b"$S2")]) % $NG
 """
 
-keys = "Monday Tuesday Wednesday Thursday Friday Saturday Sunday".split()
+if __name__ == '__main__':
+    keys = "Monday Tuesday Wednesday Thursday Friday Saturday Sunday".split()
 
-perfect_hash.verbose = True
-perfect_hash.trials = 100
-code = perfect_hash.generate_code(keys, XORHash, pow2=1)
-print(code)
-perfect_hash.run_code(code)
+    config = perfect_hash.Config(trials=100, verbose=True, seed=42)
+    code = perfect_hash.generate_code(keys, XORHash, pow2=1, config=config)
+    print(code)
+    perfect_hash.run_code(code)
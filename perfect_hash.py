@@ -46,12 +46,15 @@ If the procedure fails, G is cyclic, and we go back to step 2, replacing G
 with a new graph, and thereby discarding the vertex values from the failed
 attempt.
 """
+import os
 import sys
+import time
 import random
 import string
 import subprocess
 import shutil
 import tempfile
+from array import array
 from collections import defaultdict
 from io import StringIO
 from os.path import join
@@ -64,16 +67,70 @@ verbose = False
 trials = 50
 
 
+class Config(object):
+    """
+    The settings of generating a perfect hash, which are passed to
+    generate_hash(), generate_code() and friends.  Config objects with a
+    'seed' share nothing, such that several hashes may be generated
+    concurrently (e.g. in threads), and reproducibly:
+
+    trials   number of random graphs tried before NG is increased
+             (defaults to the module global 'trials')
+    verbose  print progress (defaults to the module global 'verbose')
+    seed     seed of the random.Random instance 'random', from which all
+             random numbers of the generation are drawn (without a seed,
+             'random' is the module random, such that random.seed() makes
+             the generation reproducible)
+    growth   factor by which NG is increased after 'trials' failures
+             (unless NG is a power of 2, in which case it is doubled)
+    """
+    def __init__(self, trials=None, verbose=None, seed=None, growth=1.05):
+        self.trials, self.verbose = _settings(trials, verbose)
+        self.seed = seed
+        self.random = random if seed is None else random.Random(seed)
+        self.growth = growth
+
+    def spawn(self):
+        """
+        Return a new Config with the same settings, whose seed is drawn
+        from this one, e.g. for a job running in a worker process.
+        """
+        return Config(self.trials, self.verbose, self.random.getrandbits(64),
+                      self.growth)
+
+    def grow(self, N):
+        """
+        Return the size following N, after 'trials' failures.
+        """
+        return max(N + 1, int(self.growth * N))
+
+    def new_hash(self, Hash, N):
+        """
+        Return the random hash function Hash(N, rng=self.random).  Hash
+        function generators take the random.Random instance (or module)
+        'rng' as keyword argument, to draw their salt from.
+        """
+        return Hash(N, rng=self.random)
+
+
+def _settings(trials_, verbose_):
+    # the arguments of Config(), defaulting to the module globals (which
+    # the parameter names of Config.__init__() hide)
+    return (trials if trials_ is None else trials_,
+            verbose if verbose_ is None else verbose_)
+
+
 class Graph(object):
     """
     Implements a graph with 'N' vertices.  First, you connect the graph with
     edges, which have a desired value associated.  Then the vertex values
     are assigned, which will fail if the graph is cyclic.  The vertex values
     are assigned such that the two values corresponding to an edge add up to
-    the desired edge value (mod N).
+    the desired edge value (mod M), where M defaults to N.
     """
-    def __init__(self, N):
+    def __init__(self, N, M=None):
         self.N = N                     # number of vertices
+        self.M = N if M is None else M # modulus of the vertex values
 
         # maps a vertex number to the list of tuples (vertex, edge value)
         # to which it is connected by edges.
@@ -135,7 +192,7 @@ class Graph(object):
                     # Set new vertex's value to the desired edge value,
                     # minus the value of the vertex we came here from.
                     self.vertex_values[neighbor] = (
-                        edge_value - self.vertex_values[vertex]) % self.N
+                        edge_value - self.vertex_values[vertex]) % self.M
 
         # check if all vertices have been assigned
         for vertex in range(self.N):
@@ -152,17 +209,23 @@ class StrSaltHash(object):
     Simple byte level hashing: each byte is multiplied to another byte from
     a random string of characters, summed up, and finally modulo NG is
     taken.
+    The salt is drawn from 'rng' (a random.Random instance, or the random
+    module).
     """
-    def __init__(self, N):
+    def __init__(self, N, rng=random):
         self.N = N
         self.salt = bytearray()
+        self.rng = rng
 
     def __call__(self, key):
+        return self.salted_sum(key) % self.N
+
+    def salted_sum(self, key):
         key = key.encode()
         while len(self.salt) < len(key):  # add more salt as necessary
-            self.salt.append(random.choice(anum_chars.encode()))
+            self.salt.append(self.rng.choice(anum_chars.encode()))
 
-        return sum(self.salt[i] * c for i, c in enumerate(key)) % self.N
+        return sum(self.salt[i] * c for i, c in enumerate(key))
 
     template = """
 def hash_f(key, salt):
@@ -176,22 +239,46 @@ def perfect_hash(key):
             G[hash_f(key, b"$S2")]) % $NG
 """
 
+    sharded_template = """
+S0 = b"$S0"
+S1 = b"$S1"
+S2 = b"$S2"
+GO = [$GO]
+
+def hash_f(key, salt, i, n):
+    return sum(salt[i + j] * c for j, c in enumerate(key)) % n
+
+def perfect_hash(key):
+    key = key.encode()
+    if len(key) > $NS:
+        return -1
+    s = hash_f(key, S0, 0, $NSH)
+    i, o, n = s * $NS, GO[s], GO[s + 1] - GO[s]
+    return (G[o + hash_f(key, S1, i, n)] +
+            G[o + hash_f(key, S2, i, n)]) % $NK
+"""
+
 class IntSaltHash(object):
     """
     Random hash function generator.
     Simple byte level hashing, each byte is multiplied in sequence to a table
     containing random numbers, summed tp, and finally modulo NG is taken.
+    The salt is drawn from 'rng', see StrSaltHash.
     """
-    def __init__(self, N):
+    def __init__(self, N, rng=random):
         self.N = N
         self.salt = []
+        self.rng = rng
 
     def __call__(self, key):
+        return self.salted_sum(key) % self.N
+
+    def salted_sum(self, key):
         key = key.encode()
         while len(self.salt) < len(key):  # add more salt as necessary
-            self.salt.append(random.randrange(1, self.N))
+            self.salt.append(self.rng.randrange(1, max(2, self.N)))
 
-        return sum(self.salt[i] * c for i, c in enumerate(key)) % self.N
+        return sum(self.salt[i] * c for i, c in enumerate(key))
 
     template = """
 S1 = [$S1]
@@ -208,14 +295,372 @@ def perfect_hash(key):
     return (G[hash_f(key, S1)] + G[hash_f(key, S2)]) % $NG
 """
 
-def builtin_template(Hash):
+    sharded_template = """
+S0 = [$S0]
+S1 = [$S1]
+S2 = [$S2]
+GO = [$GO]
+assert len(S0) == $NS and len(S1) == len(S2) == $NSH * $NS
+
+def hash_f(key, salt, i, n):
+    return sum(salt[i + j] * c for j, c in enumerate(key)) % n
+
+def perfect_hash(key):
+    key = key.encode()
+    if len(key) > $NS:
+        return -1
+    s = hash_f(key, S0, 0, $NSH)
+    i, o, n = s * $NS, GO[s], GO[s + 1] - GO[s]
+    return (G[o + hash_f(key, S1, i, n)] +
+            G[o + hash_f(key, S2, i, n)]) % $NK
+"""
+
+def key_fingerprint(key, seed, bits):
+    """
+    Return the 'bits' (8, 16 or 32) bit fingerprint of 'key', i.e. the
+    upper bits of the 32-bit FNV-1a hash (with offset basis 'seed') of the
+    UTF-8 encoded key.
+    """
+    h = seed
+    for c in key.encode():
+        h = ((h ^ c) * 16777619) & 0xffffffff
+    return h >> (32 - bits)
+
+
+fingerprint_template = """
+def fingerprint(key):
+    h = $FS
+    for c in key.encode():
+        h = ((h ^ c) * 16777619) & 0xffffffff
+    return h >> (32 - $FB)
+
+def lookup(key):
+    h = perfect_hash(key)
+    if h < 0 or h >= $NK or FP[h] != fingerprint(key):
+        return -1
+    return h
+"""
+
+
+class FastRange(object):
+    """
+    Mixin for StrSaltHash and IntSaltHash, which reduces the salted sum to
+    range(N) using multiply-high (Lemire's fastrange) instead of modulo N:
+    the sum is multiplied by an odd constant (modulo 2**32) to spread its
+    bits, and the upper 32 bits of the product with N are taken.
+    As the final modulo NG (for the sum of the two G values) can be replaced
+    by a conditional subtraction, lookups need no division at all.
+    """
+    sharded_template = None
+
+    def __call__(self, key):
+        x = (self.salted_sum(key) * 0x9e3779b1) & 0xffffffff
+        return (x * self.N) >> 32
+
+
+class StrSaltFastHash(FastRange, StrSaltHash):
+    """
+    StrSaltHash with fastrange reduction, see FastRange.
+    """
+    template = """
+def hash_f(key, salt):
+    x = sum(salt[i] * c for i, c in enumerate(key)) * 0x9e3779b1
+    return ((x & 0xffffffff) * $NG) >> 32
+
+def perfect_hash(key):
+    key = key.encode()
+    if len(key) > $NS:
+        return -1
+    h = G[hash_f(key, b"$S1")] + G[hash_f(key, b"$S2")]
+    return h - $NG if h >= $NG else h
+"""
+
+
+class IntSaltFastHash(FastRange, IntSaltHash):
+    """
+    IntSaltHash with fastrange reduction, see FastRange.
+    """
+    template = """
+S1 = [$S1]
+S2 = [$S2]
+assert len(S1) == len(S2) == $NS
+
+def hash_f(key, salt):
+    x = sum(salt[i] * c for i, c in enumerate(key)) * 0x9e3779b1
+    return ((x & 0xffffffff) * $NG) >> 32
+
+def perfect_hash(key):
+    key = key.encode()
+    if len(key) > $NS:
+        return -1
+    h = G[hash_f(key, S1)] + G[hash_f(key, S2)]
+    return h - $NG if h >= $NG else h
+"""
+
+
+class CompositeKey(object):
+    """
+    Mixin for StrSaltHash and IntSaltHash, for composite keys, i.e. tuples
+    of NF strings (the fields), which are hashed together without joining
+    them: byte i of field j is multiplied by salt[i * NF + j].  Thus, the
+    salt is NF times as long as the longest field.
+    """
+    key_type = tuple
+    sharded_template = None
+
+    def salted_sum(self, key):
+        F = len(key)
+        key = [field.encode() for field in key]
+        n = F * max(map(len, key), default=0)
+        if len(self.salt) < n:  # add more salt as necessary
+            super().salted_sum(n * '\0')
+        salt = self.salt
+        return sum(salt[i * F + j] * c
+                   for j, field in enumerate(key)
+                   for i, c in enumerate(field))
+
+
+composite_hash_f = """
+def hash_f(key, salt):
+    return sum(salt[i * $NF + j] * c
+               for j, field in enumerate(key)
+               for i, c in enumerate(field)) % $NG
+
+def perfect_hash(key):
+    if len(key) != $NF:
+        return -1
+    key = [field.encode() for field in key]
+    if max(map(len, key)) * $NF > $NS:
+        return -1
+"""
+
+
+class StrSaltCompositeHash(CompositeKey, StrSaltHash):
+    """
+    StrSaltHash for composite keys, see CompositeKey.
+    """
+    template = composite_hash_f + """\
+    return (G[hash_f(key, b"$S1")] +
+            G[hash_f(key, b"$S2")]) % $NG
+"""
+
+
+class IntSaltCompositeHash(CompositeKey, IntSaltHash):
+    """
+    IntSaltHash for composite keys, see CompositeKey.
+    """
+    template = """
+S1 = [$S1]
+S2 = [$S2]
+assert len(S1) == len(S2) == $NS
+""" + composite_hash_f + """\
+    return (G[hash_f(key, S1)] + G[hash_f(key, S2)]) % $NG
+"""
+
+
+unrolled_template = """
+# hash functions for each length of the keys, see unrolled_hash()
+$HU
+
+def _no_hash(key):
+    return -1
+
+def perfect_hash(key):
+    key = key.encode()
+    return _HASH.get(len(key), _no_hash)(key)
+"""
+
+
+class IntKeyHash(object):
+    """
+    Random hash function generator for integer keys (of up to 64 bits).
+    Multiply-shift hashing: the lower and upper 32 bits of the key are
+    multiplied by two random (odd, 63-bit) numbers and added to a third
+    random number, modulo 2**64.  The upper 32 bits of this sum are taken,
+    and finally modulo NG.  The salt is the list of the three numbers,
+    drawn from 'rng', see StrSaltHash.
+    """
+    key_type = int
+
+    def __init__(self, N, rng=random):
+        self.N = N
+        self.salt = [rng.getrandbits(63) | 1,
+                     rng.getrandbits(63) | 1,
+                     rng.getrandbits(63)]
+
+    def __call__(self, key):
+        a1, a2, b = self.salt
+        return (((a1 * (key & 0xffffffff) + a2 * (key >> 32 & 0xffffffff)
+                  + b) & 0xffffffffffffffff) >> 32) % self.N
+
+    def hash_many(self, keys):
+        """
+        Return the list of hash values of all 'keys', which is much faster
+        than calling the hash function for each key.
+        """
+        a1, a2, b = self.salt
+        N = self.N
+        return [(((a1 * (key & 0xffffffff) + a2 * (key >> 32 & 0xffffffff)
+                   + b) & 0xffffffffffffffff) >> 32) % N for key in keys]
+
+    template = """
+S1 = [$S1]
+S2 = [$S2]
+
+def hash_f(key, salt):
+    a1, a2, b = salt
+    return (((a1 * (key & 0xffffffff) + a2 * (key >> 32 & 0xffffffff)
+             + b) & 0xffffffffffffffff) >> 32) % $NG
+
+def perfect_hash(key):
+    if not -2 ** 63 <= key < 2 ** 64:
+        return -1
+    return (G[hash_f(key, S1)] + G[hash_f(key, S2)]) % $NG
+"""
+
+blocked_template = """
+S1 = [$S1]
+S2 = [$S2]
+assert len(S1) == len(S2) == $NS
+
+def hash_f(key, salt):
+    return sum(salt[i] * c for i, c in enumerate(key))
+
+def perfect_hash(key):
+    key = key.encode()
+    if len(key) > $NS:
+        return -1
+    o = 16 * (hash_f(key, S1) % $NB)  # offset of block in G
+    u = ((hash_f(key, S2) % 4294967296 ^ G[o]) * 0x9e3779b1) & 0xffffffff
+    v1 = (u >> 16) % 15
+    v2 = (v1 + 1 + (u & 0xffff) % 14) % 15
+    return (G[o + 1 + v1] + G[o + 1 + v2]) % $NK
+"""
+
+def prefilter_params(keys, budget, rng=random):
+    """
+    Return the template parameters of filters for rejecting most non-member
+    keys cheaply (before hashing), within a size budget of 'budget' bytes:
+
+    LB   bitmap of the lengths (in bytes) of the keys
+    B0   bitmap of the first bytes of the (non-empty) keys
+    B1   bitmap of the last bytes of the (non-empty) keys
+    BF   Bloom filter (bitmap of BM bits), using BK hash functions
+         (h + i * ((h >> 16) | 1)) % BM for i in range(BK), where h is the
+         32-bit FNV-1a hash with offset basis BS of the key
+
+    Bitmaps are arrays of bytes, where bit i is 'B[i >> 3] >> (i & 7) & 1'.
+    The bitmaps LB, B0 and B1 (of 64 bytes, plus one byte for each 8 key
+    lengths) are always generated, and ValueError is raised when they do
+    not fit into the budget.  The remaining budget (rounded down to a
+    power of 2, of at least 8 bytes) is used for BF.  Otherwise, BM and BK
+    are 0 (and BF is a single zero byte).
+    """
+    keys = [key.encode() for key in keys]
+    NS = max((len(key) for key in keys), default=0)
+    LB = bytearray(NS // 8 + 1)
+    B0 = bytearray(32)
+    B1 = bytearray(32)
+    for key in keys:
+        LB[len(key) >> 3] |= 1 << (len(key) & 7)
+        if key:
+            B0[key[0] >> 3] |= 1 << (key[0] & 7)
+            B1[key[-1] >> 3] |= 1 << (key[-1] & 7)
+
+    size = budget - len(LB) - len(B0) - len(B1)
+    if size < 0:
+        raise ValueError("prefilter budget has to be at least %d bytes "
+                         "(the size of the bitmaps)" % (budget - size))
+    if size < 8:
+        size = 0
+    nbytes = 1
+    while 2 * nbytes <= size:
+        nbytes *= 2
+    BS = rng.getrandbits(32)
+    if size:
+        BM = 8 * nbytes
+        BK = max(1, min(8, round(0.693 * BM / max(1, len(keys)))))
+        BF = bytearray(nbytes)
+        for key in keys:
+            h = BS
+            for c in key:
+                h = ((h ^ c) * 16777619) & 0xffffffff
+            d = (h >> 16) | 1
+            for i in range(BK):
+                b = (h + i * d) % BM
+                BF[b >> 3] |= 1 << (b & 7)
+    else:
+        BM = BK = 0
+        BF = bytearray(1)
+    return dict(LB = list(LB), B0 = list(B0), B1 = list(B1), BF = list(BF),
+                BM = BM, BK = BK, BS = BS)
+
+
+def prefilter_template(bloom):
+    return """
+LB = [$LB]
+B0 = [$B0]
+B1 = [$B1]
+""" + ("BF = [$BF]\n" if bloom else "") + """
+def in_bitmap(bitmap, i):
+    return bitmap[i >> 3] >> (i & 7) & 1
+
+def maybe_key(key):
+    # False when key is certainly not one of the keys
+    key = key.encode()
+    n = len(key)
+    if n >> 3 >= len(LB) or not in_bitmap(LB, n):
+        return False
+    if n and not (in_bitmap(B0, key[0]) and in_bitmap(B1, key[-1])):
+        return False
+""" + ("""    h = $BS
+    for c in key:
+        h = ((h ^ c) * 16777619) & 0xffffffff
+    d = (h >> 16) | 1
+    for i in range($BK):
+        if not in_bitmap(BF, (h + i * d) % $BM):
+            return False
+""" if bloom else "") + """    return True
+
+_perfect_hash = perfect_hash
+
+def perfect_hash(key):
+    # -1 for keys rejected by maybe_key()
+    if not maybe_key(key):
+        return -1
+    return _perfect_hash(key)
+"""
+
+
+def builtin_template(Hash, sharded=False, fingerprint=False, blocked=False,
+                     compact=False, sidecar=False, prefilter=False,
+                     bloom=False, multi=False, scanner=False, stats=False,
+                     unroll=False):
+    if multi:
+        return multi_template(Hash, stats)
+    if compact:
+        return compact_template(Hash, sharded, fingerprint, blocked, sidecar,
+                                prefilter, bloom, stats)
+    if blocked:
+        hash_template = blocked_template
+    elif sharded:
+        if Hash.sharded_template is None:
+            raise ValueError("%s does not support sharding" % Hash.__name__)
+        hash_template = Hash.sharded_template
+    elif unroll:
+        hash_template = unrolled_template
+    else:
+        hash_template = Hash.template
     return """\
 # =======================================================================
 # ================= Python code for perfect hash function ===============
 # =======================================================================
 
 G = [$G]
-""" + Hash.template + """
+""" + ("FP = [$FP]\n" if fingerprint else "") + hash_template + (
+    fingerprint_template if fingerprint else "") + (
+    prefilter_template(bloom) if prefilter else "") + (
+    stats_template(fingerprint, prefilter) if stats else "") + """
 # ============================ Sanity check =============================
 
 K = [$K]
@@ -223,6 +668,489 @@ assert len(K) == $NK
 
 for h, k in enumerate(K):
     assert perfect_hash(k) == h
+""" + ("    assert lookup(k) == h\n" if fingerprint else "") + (
+    "    assert maybe_key(k)\n" if prefilter else "") + (
+    "    assert get_index(k) == h\nstats(reset=True)\n" if stats else "") + (
+    scanner_template(Hash) if scanner else "")
+
+
+def stats_template(fingerprint=False, prefilter=False, compact=False):
+    """
+    Return the template of the instrumented lookup function get_index(key),
+    which returns the index of 'key' in K, or -1, and counts the outcomes
+    of all lookups, which are returned by stats().  Non-member keys are
+    rejected by the prefilter, the length check of perfect_hash(), or the
+    final check of the fingerprint (when 'fingerprint' is true) or the key.
+    As maybe_key() is checked first, the unfiltered _perfect_hash() is
+    called when 'prefilter' is true.
+    """
+    return """
+# ============================= Statistics ==============================
+
+STATS = ('lookups', 'prefiltered', 'too_long', 'mismatch', 'hits')
+_counts = [0] * len(STATS)
+
+def get_index(key):
+    c = _counts
+    c[0] += 1
+""" + ("""    if not maybe_key(key):
+        c[1] += 1
+        return -1
+""" if prefilter else "") + (
+    "    h = _perfect_hash(key)\n" if prefilter else
+    "    h = perfect_hash(key)\n") + """\
+    if h < 0:
+        c[2] += 1
+        return -1
+    if h >= $NK or """ + (
+    "FP[h] != fingerprint(key)" if fingerprint else
+    "get_key(h) != key" if compact else "K[h] != key") + """:
+        c[3] += 1
+        return -1
+    c[4] += 1
+    return h
+""" + stats_function
+
+
+stats_function = """
+def stats(reset=False):
+    # return the counts of the outcomes of lookups since the last reset
+    res = dict(zip(STATS, _counts))
+    if reset:
+        _counts[:] = [0] * len(STATS)
+    return res
+"""
+
+
+def char_class(spec):
+    """
+    Return the set of byte values in the character class 'spec', which
+    consists of ASCII characters and ranges of them, e.g. 'A-Za-z0-9_'.
+    A '-' which is first or last in 'spec' stands for itself.
+    """
+    chars = set()
+    i = 0
+    while i < len(spec):
+        if i + 2 < len(spec) and spec[i + 1] == '-':
+            lo, hi = ord(spec[i]), ord(spec[i + 2])
+            if lo > hi:
+                raise ValueError("invalid range in character class: %r" %
+                                 spec[i:i + 3])
+            chars.update(range(lo, hi + 1))
+            i += 3
+        else:
+            chars.add(ord(spec[i]))
+            i += 1
+    if not chars or max(chars) > 127:
+        raise ValueError("character class has to consist of ASCII "
+                         "characters: %r" % spec)
+    return chars
+
+
+def scanner_template(Hash):
+    """
+    Return the template of the keyword scanner scan(buf), which is appended
+    to the builtin template.  The identifiers (maximal runs of bytes in the
+    character class $CC) are found using a regular expression, and hashed
+    in place (a slice of a memoryview 'buf' is not a copy).
+    """
+    salt = 'b"$S%d"' if Hash is StrSaltHash else '[$S%d]'
+    return """
+# =============================== Scanner ===============================
+
+import operator
+import re
+
+CC = bytes([$CC])
+IDENT = re.compile(b'[' + b''.join(re.escape(bytes([c]))
+                                   for c in range(256) if CC[c]) + b']+')
+KE = [k.encode() for k in K]
+
+def scan(buf, finditer=IDENT.finditer, S1=%s, S2=%s, G=G, KE=KE,
+         mul=operator.mul):
+    # yield (start, end, h) for each identifier buf[start:end] of the
+    # bytes-like object buf, where h is its index in K, or -1
+    for m in finditer(buf):
+        start, end = m.span()
+        h = -1
+        if end - start <= $NS:
+            key = buf[start:end]
+            h = (G[sum(map(mul, S1, key)) %% $NG] +
+                 G[sum(map(mul, S2, key)) %% $NG]) %% $NG
+            if h >= $NK or key != KE[h]:
+                h = -1
+        yield start, end, h
+
+for h, k in enumerate(KE):
+    assert list(scan(k)) == [(0, len(k), h)]
+""" % (salt % 1, salt % 2)
+
+
+def multi_template(Hash, stats=False):
+    """
+    Return the template for a Python module of several tables sharing one
+    perfect hash (see group_tables()), whose function lookup(table, key)
+    returns the index of 'key' within 'table', or -1.  When 'stats' is true,
+    lookup() counts its outcomes, see stats_template().
+    """
+    return """\
+# =======================================================================
+# ================= Python code for perfect hash function ===============
+# =======================================================================
+
+G = [$G]
+""" + Hash.template + """
+# ================================ Tables ===============================
+
+K = [$K]
+assert len(K) == $NK
+
+TN = [$TN]
+TO = [$TO]
+assert len(TN) + 1 == len(TO) == $NT + 1
+TI = {name: t for t, name in enumerate(TN)}
+""" + ("""
+def lookup(table, key):
+    t = TI[table]
+    h = perfect_hash(chr(t + 1) + key)
+    if TO[t] <= h < TO[t + 1] and K[h] == key:
+        return h - TO[t]
+    return -1
+""" if not stats else """
+STATS = ('lookups', 'prefiltered', 'too_long', 'mismatch', 'hits')
+_counts = [0] * len(STATS)
+
+def lookup(table, key):
+    c = _counts
+    c[0] += 1
+    t = TI[table]
+    h = perfect_hash(chr(t + 1) + key)
+    if h < 0:
+        c[2] += 1
+        return -1
+    if TO[t] <= h < TO[t + 1] and K[h] == key:
+        c[4] += 1
+        return h - TO[t]
+    c[3] += 1
+    return -1
+""" + stats_function) + """
+# ============================ Sanity check =============================
+
+for t, name in enumerate(TN):
+    for i, k in enumerate(K[TO[t]:TO[t + 1]]):
+        assert lookup(name, k) == i
+""" + ("stats(reset=True)\n" if stats else "")
+
+
+def compact_template(Hash, sharded=False, fingerprint=False, blocked=False,
+                     sidecar=False, prefilter=False, bloom=False,
+                     stats=False):
+    """
+    Return the template for compact Python modules, which store G, the
+    fingerprints and the keys as binary data (in a bytes literal, or in the
+    sidecar file $BIN when 'sidecar' is true), instead of list literals.
+    Import time is therefore independent of the number of keys.  The keys
+    are stored as one joined (UTF-8 encoded) string KB with offsets KO.
+    The sanity check only runs when the module is executed as a script.
+    """
+    if blocked:
+        hash_template = blocked_template
+    elif sharded:
+        if Hash.sharded_template is None:
+            raise ValueError("%s does not support sharding" % Hash.__name__)
+        hash_template = Hash.sharded_template
+    else:
+        hash_template = Hash.template
+    return """\
+# =======================================================================
+# ================= Python code for perfect hash function ===============
+# =======================================================================
+
+import sys
+""" + ("""import mmap
+import os
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '$BIN'), 'rb') as _f:
+    _mm = mmap.mmap(_f.fileno(), 0, access=mmap.ACCESS_READ)
+""" if sidecar else "") + """
+def _array(typecode, buf, offset=0, nbytes=None):
+    # little-endian binary data, as read-only sequence of integers
+    m = memoryview(buf)[offset:None if nbytes is None else offset + nbytes]
+    if sys.byteorder == 'little':
+        return m.cast(typecode)
+    from array import array
+    a = array(typecode)
+    a.frombytes(m)
+    a.byteswap()
+    return a
+
+G = $G
+""" + ("FP = $FP\n" if fingerprint else "") + hash_template + (
+    fingerprint_template if fingerprint else "") + (
+    prefilter_template(bloom) if prefilter else "") + """
+KB = $KB
+KO = $KO
+assert len(KO) == $NK + 1
+
+def get_key(h):
+    return bytes(KB[KO[h]:KO[h + 1]]).decode()
+""" + (stats_template(fingerprint, prefilter, True) if stats else "") + """
+# ============================ Sanity check =============================
+
+if __name__ == '__main__':
+    for h in range($NK):
+        k = get_key(h)
+        assert perfect_hash(k) == h
+""" + ("        assert lookup(k) == h\n" if fingerprint else "") + (
+    "        assert maybe_key(k)\n" if prefilter else "") + (
+    "        assert get_index(k) == h\n    stats(reset=True)\n"
+    if stats else "")
+
+
+def c_template(Hash, prefilter=False, bloom=False, unroll=False):
+    """
+    Return the builtin C template, a header which defines the function
+    get_index(key, len), returning the index of the 'len' bytes at 'key'
+    (which need not be NUL terminated, e.g. a slice of a buffer) in the
+    keys, or -1.  The length is checked before hashing, and the keys are
+    stored as a blob with offsets (see key_blob_params()), which is compared
+    using memcmp().  When 'prefilter' is true, maybe_key(key, len) rejects
+    most non-member keys before hashing.  When 'unroll' is true, the
+    lookup is a switch statement on the length, see unrolled_hash().  For
+    composite keys (when 'Hash' is a CompositeKey), get_index(key, len)
+    takes the arrays of the NF fields and their lengths instead.  Except
+    for these two cases, the header also defines the batched lookup
+    get_index_batch(key, len, n, out), see batch_c_lookup().
+    """
+    if issubclass(Hash, StrSaltHash):
+        salt = 'static const unsigned char S%d[] = "$S%d";'
+    else:
+        salt = 'static const uint32_t S%d[] = {$S%d};'
+    if issubclass(Hash, FastRange):
+        reduce = """    f1 = ((f1 * 0x9e3779b1u & 0xffffffffu) * $NG) >> 32;
+    f2 = ((f2 * 0x9e3779b1u & 0xffffffffu) * $NG) >> 32;
+    h = (size_t) G[f1] + G[f2];
+    if (h >= $NG)
+        h -= $NG;
+"""
+        vertex = "((%s * 0x9e3779b1u & 0xffffffffu) * $NG) >> 32"
+    else:
+        reduce = """    h = ((size_t) G[f1 % $NG] + G[f2 % $NG]) % $NG;
+"""
+        vertex = "%s %% $NG"
+    return """\
+/* perfect hash function for $NK keys, generated by perfect-hash */
+#include <stddef.h>
+#include <stdint.h>
+#include <string.h>
+
+""" + salt % (1, 1) + "\n" + salt % (2, 2) + """
+static const uint${GB}_t G[] = {$G};
+
+""" + ("/* all fields in one blob, field j of key i is\n"
+       "   KD[KP[i * $NF + j]:KP[i * $NF + j + 1]] */"
+       if issubclass(Hash, CompositeKey) else
+       "/* all keys in one blob, key i is KD[KP[i]:KP[i + 1]] */") + """
+static const char KD[] = $KD;
+static const uint${KPB}_t KP[] = {$KP};
+""" + ("""
+static const unsigned char LB[] = {$LB};    /* key lengths */
+static const unsigned char B0[] = {$B0};    /* first bytes of keys */
+static const unsigned char B1[] = {$B1};    /* last bytes of keys */
+""" + ("""static const unsigned char BF[] = {$BF};    /* Bloom filter */
+""" if bloom else "") + """
+#define IN_BITMAP(b, i)  ((b)[(i) >> 3] >> ((i) & 7) & 1)
+
+/* return 0 when the key (of length len) is certainly not a key */
+static inline int maybe_key(const unsigned char *key, size_t len)
+{
+    if (len >> 3 >= sizeof(LB) || !IN_BITMAP(LB, len))
+        return 0;
+    if (len && !(IN_BITMAP(B0, key[0]) && IN_BITMAP(B1, key[len - 1])))
+        return 0;
+""" + ("""    {
+        uint32_t h = $BS, d;
+        size_t i;
+
+        for (i = 0; i < len; i++)
+            h = (h ^ key[i]) * 16777619u;
+        d = (h >> 16) | 1;
+        for (i = 0; i < $BK; i++) {
+            if (!IN_BITMAP(BF, ((uint64_t) h + (uint64_t) i * d) % $BM))
+                return 0;
+        }
+    }
+""" if bloom else "") + """    return 1;
+}
+""" if prefilter else "") + (
+    unrolled_c_lookup(reduce, prefilter) if unroll else
+    composite_c_lookup(reduce) if issubclass(Hash, CompositeKey) else """
+/* return the index of the key of len bytes at key, or -1 */
+static inline int get_index(const char *key, size_t len)
+{
+    const unsigned char *k = (const unsigned char *) key;
+    uint64_t f1 = 0, f2 = 0;
+    size_t i, h;
+
+    if (len > $NS)
+        return -1;
+""" + ("""    if (!maybe_key(k, len))
+        return -1;
+""" if prefilter else "") + """    for (i = 0; i < len; i++) {
+        f1 += (uint64_t) S1[i] * k[i];
+        f2 += (uint64_t) S2[i] * k[i];
+    }
+""" + reduce + """    if (h < $NK && len == (size_t) (KP[h + 1] - KP[h]) &&
+            memcmp(key, KD + KP[h], len) == 0)
+        return (int) h;
+    return -1;
+}
+""" + batch_c_lookup(vertex, issubclass(Hash, FastRange), prefilter))
+
+
+def batch_c_lookup(vertex, fast=False, prefilter=False):
+    # the get_index_batch() of c_template(), where 'vertex' is the
+    # expression reducing a salted sum to a vertex, and 'fast' is true for
+    # fastrange (whose sum of two vertex values is reduced by subtraction)
+    return """
+#if defined(__GNUC__)
+#define PREFETCH(p)  __builtin_prefetch(p)
+#else
+#define PREFETCH(p)
+#endif
+
+#ifndef BATCH
+#define BATCH  16     /* number of keys resolved together */
+#endif
+
+/* Store the index of each of the n keys (key[j] of len[j] bytes) in out[j],
+   like get_index().  Each group of BATCH keys is processed in stages:
+   first, all keys are hashed and the cache lines of their vertices in G
+   are prefetched.  Then, the vertex values are read, and the offsets of
+   the candidate keys prefetched, then the candidate keys themselves, which
+   are finally compared.  Thus, the cache misses of the keys of a group
+   overlap, instead of two dependent misses in G and two in KP and KD for
+   each key. */
+static inline void get_index_batch(const char *const key[],
+                                   const size_t len[], size_t n, int out[])
+{
+    size_t b, i, j, m, h, v1[BATCH], v2[BATCH];
+    uint64_t f1, f2;
+
+    for (b = 0; b < n; b += BATCH) {
+        m = n - b < BATCH ? n - b : BATCH;
+
+        for (j = 0; j < m; j++) {
+            const unsigned char *k = (const unsigned char *) key[b + j];
+
+            out[b + j] = -1;
+            if (len[b + j] > $NS""" + (
+        " || !maybe_key(k, len[b + j])" if prefilter else "") + """)
+                continue;
+            f1 = f2 = 0;
+            for (i = 0; i < len[b + j]; i++) {
+                f1 += (uint64_t) S1[i] * k[i];
+                f2 += (uint64_t) S2[i] * k[i];
+            }
+            v1[j] = """ + vertex % 'f1' + """;
+            v2[j] = """ + vertex % 'f2' + """;
+            PREFETCH(G + v1[j]);
+            PREFETCH(G + v2[j]);
+            out[b + j] = 0;
+        }
+        for (j = 0; j < m; j++) {
+            if (out[b + j] < 0)
+                continue;
+""" + ("""            h = (size_t) G[v1[j]] + G[v2[j]];
+            if (h >= $NG)
+                h -= $NG;
+""" if fast else """            h = ((size_t) G[v1[j]] + G[v2[j]]) % $NG;
+""") + """            if (h >= $NK) {
+                out[b + j] = -1;
+                continue;
+            }
+            PREFETCH(KP + h);
+            out[b + j] = (int) h;
+        }
+        for (j = 0; j < m; j++) {
+            if (out[b + j] >= 0)
+                PREFETCH(KD + KP[out[b + j]]);
+        }
+        for (j = 0; j < m; j++) {
+            if (out[b + j] < 0)
+                continue;
+            h = (size_t) out[b + j];
+            if (len[b + j] != (size_t) (KP[h + 1] - KP[h]) ||
+                    memcmp(key[b + j], KD + KP[h], len[b + j]) != 0)
+                out[b + j] = -1;
+        }
+    }
+}
+"""
+
+
+def unrolled_c_lookup(reduce, prefilter=False):
+    # the unrolled get_index() of c_template(), where 'reduce' is the code
+    # computing h from the salted sums f1 and f2
+    return """
+/* return the hash value of a key, given its salted sums f1 and f2 */
+static inline size_t hash_g(uint64_t f1, uint64_t f2)
+{
+    size_t h;
+
+""" + reduce + """    return h;
+}
+
+/* return the index of the key of len bytes at key, or -1 */
+static inline int get_index(const char *key, size_t len)
+{
+    const unsigned char *k = (const unsigned char *) key;
+    uint64_t f1, f2;
+    size_t h;
+
+""" + ("""    if (!maybe_key(k, len))
+        return -1;
+""" if prefilter else "") + """    switch (len) {
+$HU
+    }
+    return -1;
+}
+"""
+
+
+def composite_c_lookup(reduce):
+    # the get_index() of c_template() for composite keys, where 'reduce'
+    # is the code computing h from the salted sums f1 and f2
+    return """
+/* return the index of the key whose $NF fields are the len[j] bytes at
+   key[j], or -1 */
+static inline int get_index(const char *const key[], const size_t len[])
+{
+    uint64_t f1 = 0, f2 = 0;
+    size_t i, j, h;
+
+    for (j = 0; j < $NF; j++) {
+        const unsigned char *k = (const unsigned char *) key[j];
+
+        if (len[j] * $NF > $NS)
+            return -1;
+        for (i = 0; i < len[j]; i++) {
+            f1 += (uint64_t) S1[i * $NF + j] * k[i];
+            f2 += (uint64_t) S2[i * $NF + j] * k[i];
+        }
+    }
+""" + reduce + """    if (h >= $NK)
+        return -1;
+    for (j = 0; j < $NF; j++) {
+        /* field j of key h is KD[KP[i]:KP[i + 1]] */
+        i = h * $NF + j;
+        if (len[j] != (size_t) (KP[i + 1] - KP[i]) ||
+                memcmp(key[j], KD + KP[i], len[j]) != 0)
+            return -1;
+    }
+    return (int) h;
+}
 """
 
 
@@ -230,21 +1158,196 @@ class TooManyInterationsError(Exception):
     pass
 
 
-def generate_hash(keys, Hash=StrSaltHash, pow2=False):
+class UnsolvableError(TooManyInterationsError):
+    """
+    Raised when no perfect hash can be found for the keys, because the hash
+    functions cannot distinguish some of the keys.  'keys' is a list of
+    tuples of such keys.
+    """
+    def __init__(self, msg, keys):
+        TooManyInterationsError.__init__(self, msg)
+        self.keys = keys
+
+
+def expected_trials(NK, NG):
+    """
+    Return the expected number of trials for finding an acyclic random graph
+    with NG vertices and NK edges.  As shown by Czech, Havas and Majewski,
+    the probability of such a graph being acyclic is (asymptotically)
+    sqrt(1 - 2 NK / NG) for NG > 2 NK.  Otherwise, infinity is returned.
+    """
+    if NG <= 2 * NK:
+        return float('inf')
+    return 1.0 / (1.0 - 2.0 * NK / NG) ** 0.5
+
+
+def preflight(keys, Hash, samples=4, config=None):
+    """
+    Check that the hash functions created by 'Hash' can distinguish the
+    'keys' at all, before searching for acyclic graphs.  For 'samples'
+    pairs of random hash functions f1 and f2 (using the largest graph size
+    generate_hash() tries), the edges f1(key) -- f2(key) are calculated.
+    Keys whose edge is a loop in each sample, and keys whose edge is equal
+    to the edge of another key in each sample always form a cycle.
+    In this case, UnsolvableError is raised, naming these keys.
+    """
+    if config is None:
+        config = Config()
+    NK = len(keys)
+    N = 100 * (NK + 1)
+    edges = [[] for key in keys]
+    for unused in range(samples):
+        f1 = config.new_hash(Hash, N)
+        f2 = config.new_hash(Hash, N)
+        for key, edge in zip(keys, edges):
+            a, b = f1(key), f2(key)
+            edge.append((a, b) if a < b else (b, a))
+
+    bad = []
+    groups = defaultdict(list)
+    for key, edge in zip(keys, edges):
+        if all(a == b for a, b in edge):
+            bad.append((key,))
+        groups[tuple(edge)].append(key)
+    bad.extend(tuple(group) for group in groups.values() if len(group) > 1)
+
+    if bad:
+        raise UnsolvableError(
+            "%d keys cannot be distinguished by %s, e.g. %s" % (
+                len(set(key for group in bad for key in group)),
+                getattr(Hash, '__name__', repr(Hash)),
+                ', '.join(repr(group) for group in bad[:5])), bad)
+
+
+def hash_quality(keys, Hash, ratios=(2.05, 2.1, 2.25, 2.5, 3.0),
+                 samples=100, config=None):
+    """
+    Measure the quality of the random hash function generator 'Hash' for
+    the 'keys' empirically.  For each ratio NG / NK in 'ratios', 'samples'
+    pairs of random hash functions f1, f2 with NG values are drawn, and the
+    graph with an edge f1(key) -- f2(key) for each key is built.  As NG is
+    rounded, ratios giving the same NG (for few keys) are measured once.
+    Returns a dict (which may be written as JSON), whose item 'results' is
+    a list with one dict for each NG, containing:
+
+    ratio        the actual ratio NG / NK
+
+    uniformity   chi-square statistic of the NK values f1(key) in NG
+                 buckets, divided by its expected value NG - 1
+    collisions   fraction of pairs of keys with f1(key1) == f1(key2),
+                 times NG
+    edges        fraction of pairs of keys with equal edges (which form a
+                 cycle), times NG**2 / 2
+    loops        fraction of keys with f1(key) == f2(key), times NG
+    acyclic      fraction of acyclic graphs
+    trials       expected number of trials 1 / acyclic (None when no
+                 graph was acyclic)
+
+    The first four are averages over all samples, and are 1.0 for ideal
+    (truly random) hash functions.  'expected_acyclic' and
+    'expected_trials' are the values for ideal hash functions, see
+    expected_trials().  As these are asymptotic, and only apply for
+    NG > 2 NK, they are None otherwise.
+    """
+    if config is None:
+        config = Config()
+    NK = len(keys)
+    if NK < 2:
+        raise ValueError("at least 2 keys required")
+    results = []
+    sizes = set()
+    for ratio in ratios:
+        NG = max(NK + 1, int(round(ratio * NK)))
+        if NG in sizes:
+            continue
+        sizes.add(NG)
+        chi2 = collisions = edges = loops = acyclic = 0
+        pairs = NK * (NK - 1) / 2
+        for unused in range(samples):
+            f1 = config.new_hash(Hash, NG)
+            f2 = config.new_hash(Hash, NG)
+            if hasattr(f1, 'hash_many'):
+                h1, h2 = f1.hash_many(keys), f2.hash_many(keys)
+            else:
+                h1, h2 = [f1(key) for key in keys], [f2(key) for key in keys]
+
+            counts = defaultdict(int)
+            for v in h1:
+                counts[v] += 1
+            squares = sum(c * c for c in counts.values())
+            chi2 += (NG * squares / NK - NK) / (NG - 1)
+            collisions += (squares - NK) / 2 / pairs * NG
+
+            counts = defaultdict(int)
+            for v1, v2 in zip(h1, h2):
+                counts[(v1, v2) if v1 < v2 else (v2, v1)] += 1
+            edges += sum(c * (c - 1) // 2 for c in counts.values()
+                         ) / pairs * NG * NG / 2
+            loops += sum(v1 == v2 for v1, v2 in zip(h1, h2)) / NK * NG
+
+            G = Graph(NG)
+            for hashval, (v1, v2) in enumerate(zip(h1, h2)):
+                G.connect(v1, v2, hashval)
+            acyclic += G.assign_vertex_values()
+
+        expected = 1.0 / expected_trials(NK, NG) if NG > 2 * NK else None
+        results.append(dict(
+            ratio = NG / NK,
+            NG = NG,
+            uniformity = chi2 / samples,
+            collisions = collisions / samples,
+            edges = edges / samples,
+            loops = loops / samples,
+            acyclic = acyclic / samples,
+            expected_acyclic = expected,
+            trials = samples / acyclic if acyclic else None,
+            expected_trials = 1.0 / expected if expected else None))
+
+    return dict(hash = getattr(Hash, '__name__', repr(Hash)),
+                NK = NK, samples = samples, results = results)
+
+
+def quality_report(quality):
+    """
+    Return a text report of the result of hash_quality().  The ideal
+    values, which do not apply for NG <= 2 NK, are shown as n/a.
+    """
+    def trials(t):
+        return '%7.1f' % t if t is not None else '    inf'
+
+    def ideal(x, fmt):
+        return fmt % x if x is not None else '%*s' % (len(fmt % 0), 'n/a')
+
+    lines = ['%s: %d keys, %d samples' % (quality['hash'], quality['NK'],
+                                          quality['samples']),
+             'NG/NK       NG   uniform   collide     edges     loops  '
+             'acyclic (ideal)  trials  (ideal)']
+    for r in quality['results']:
+        lines.append('%5.2f %8d %9.3f %9.3f %9.2f %9.2f  %7.3f (%s) '
+                     '%s (%s)' % (r['ratio'], r['NG'], r['uniformity'],
+                                  r['collisions'], r['edges'], r['loops'],
+                                  r['acyclic'],
+                                  ideal(r['expected_acyclic'], '%5.3f'),
+                                  trials(r['trials']),
+                                  ideal(r['expected_trials'], '%7.1f')))
+    lines.append('(ideal: asymptotic values for truly random hash '
+                 'functions, n/a for NG <= 2 NK)')
+    return '\n'.join(lines) + '\n'
+
+
+def generate_hash(keys, Hash=StrSaltHash, pow2=False, config=None):
     """
     Return hash functions f1 and f2, and G for a perfect minimal hash.
     Input is an iterable of 'keys', whos indicies are the desired hash values.
-    'Hash' is a random hash function generator, that means Hash(N) returns a
-    returns a random hash function which returns hash values from 0..N-1.
+    'Hash' is a random hash function generator, that means Hash(N, rng=rng)
+    returns a random hash function which returns hash values from 0..N-1,
+    using the random.Random instance (or module) 'rng' for its salt.
+    'config' is the Config of the generation (a new one by default).
     """
-    if not isinstance(keys, (list, tuple)):
-        raise TypeError("list or tuple expected")
+    if config is None:
+        config = Config()
+    check_keys(keys, getattr(Hash, 'key_type', str))
     NK = len(keys)
-    if NK != len(set(keys)):
-        raise ValueError("duplicate keys")
-    for key in keys:
-        if not isinstance(key, str):
-            raise TypeError("key a not string: %r" % key)
     if NK > 10000 and Hash == StrSaltHash:
         print("""\
 WARNING: You have %d keys.
@@ -252,66 +1355,511 @@ WARNING: You have %d keys.
          Please use --hft=2 instead.
 """ % NK)
 
-    # the number of vertices in the graph G
-    if pow2:
-        NG = 1
-        while NG < NK + 1:
-            NG *= 2
-    else:
-        NG = NK + 1
+    f1, f2, G = find_graph(keys, range(NK), None, Hash, pow2, config)
+
+    # Sanity check the result by actually verifying that all the keys
+    # hash to the right value.
+    check_hash(keys, f1, f2, G)
+
+    if config.verbose:
+        print('OK')
+
+    return f1, f2, G
+
+
+def check_keys(keys, key_type=str):
+    if not isinstance(keys, (list, tuple)):
+        raise TypeError("list or tuple expected")
+    if len(keys) != len(set(keys)):
+        raise ValueError("duplicate keys")
+    for key in keys:
+        if not isinstance(key, key_type):
+            raise TypeError("key a not %s: %r" % (
+                'string' if key_type is str else key_type.__name__, key))
+        if key_type is int and not -2 ** 63 <= key < 2 ** 64:
+            raise ValueError("key out of 64-bit range: %r" % key)
+        if key_type is tuple and not (
+                len(key) == len(keys[0]) > 0 and
+                all(isinstance(field, str) for field in key)):
+            raise TypeError("key not a tuple of %d strings: %r" %
+                            (len(keys[0]), key))
+    if key_type is int:
+        # negative keys are the two's complement 64-bit words, which
+        # cannot be told apart from the equal unsigned keys (e.g. in C)
+        words = {}
+        for key in keys:
+            word = key & 0xffffffffffffffff
+            if word in words:
+                raise ValueError("duplicate keys (as 64-bit words): %r, %r" %
+                                 (words[word], key))
+            words[word] = key
+
+
+def graph_sizes(NK, pow2, config):
+    """
+    Yield the number of vertices NG of each trial graph for NK keys.
+    Starting with NK + 1 (or the next power of 2), NG is increased after
+    every 'config.trials' trials.  TooManyInterationsError is raised once
+    NG exceeds 100 (NK + 1).
+    """
+    # the number of vertices in the graph G
+    if pow2:
+        NG = 1
+        while NG < NK + 1:
+            NG *= 2
+    else:
+        NG = NK + 1
+
+    while True:
+        for unused in range(config.trials):
+            yield NG
+        # trials failures, increase NG
+        NG = 2 * NG if pow2 else config.grow(NG)
+        if NG > 100 * (NK + 1):
+            raise TooManyInterationsError("%d keys" % NK)
+
+
+def find_graph(keys, hashvals, M, Hash, pow2, config):
+    """
+    Find random hash functions f1 and f2, such that the graph with an edge
+    f1(key) -- f2(key) for each key is acyclic, and assign its vertex values
+    such that G[f1(key)] + G[f2(key)] equals the corresponding hash value
+    (mod M).  When M is None, it is the number of vertices NG.
+    Returns f1, f2 and the vertex values G.
+    """
+    NK = len(keys)
+    verbose = config.verbose
+
+    preflight(keys, Hash, config=config)
+
+    for trial, NG in enumerate(graph_sizes(NK, pow2, config)):
+        if verbose:
+            if trial % config.trials == 0:
+                sys.stdout.write('\nGenerating graphs NG = %d ' % NG)
+                # the (asymptotic) estimate only applies for NG > 2 NK
+                if NG > 2 * NK:
+                    sys.stdout.write('(expected trials: %.1f) ' %
+                                     expected_trials(NK, NG))
+            sys.stdout.write('.')
+            sys.stdout.flush()
+
+        res = try_graph(keys, hashvals, NG, M, Hash, config)
+        if res:
+            break
+
+    if verbose:
+        print('\nAcyclic graph found after %d trials.' % (trial + 1))
+        print('NG = %d' % NG)
+
+    return res
+
+
+def try_graph(keys, hashvals, NG, M, Hash, config):
+    """
+    Try a single random graph with NG vertices for the 'keys', see
+    find_graph().  Returns f1, f2 and G when the graph is acyclic,
+    and None otherwise.
+    """
+    G = Graph(NG, M)   # Create graph with NG vertices
+    f1 = config.new_hash(Hash, NG)  # Create 2 random hash functions
+    f2 = config.new_hash(Hash, NG)
+
+    # Connect vertices given by the values of the two hash functions
+    # for each key.  Associate the desired hash value with each edge.
+    if hasattr(f1, 'hash_many'):
+        edges = zip(f1.hash_many(keys), f2.hash_many(keys))
+    else:
+        edges = ((f1(key), f2(key)) for key in keys)
+    for hashval, (v1, v2) in zip(hashvals, edges):
+        G.connect(v1, v2, hashval)
+
+    # Try to assign the vertex values.  This will fail when the graph
+    # is cyclic.  But when the graph is acyclic it will succeed.
+    if G.assign_vertex_values():
+        return f1, f2, G.vertex_values
+    return None
+
+
+def block_vertices(z, seed):
+    """
+    Return the two (different) vertices, within a block of 15 vertices,
+    for a key whose block hash is 'z', where 'seed' is the seed of the block.
+    """
+    u = ((z ^ seed) * 0x9e3779b1) & 0xffffffff
+    v1 = (u >> 16) % 15
+    v2 = (v1 + 1 + (u & 0xffff) % 14) % 15
+    return v1, v2
+
+
+def generate_blocked_hash(keys, max_seeds=4096, config=None):
+    """
+    Return hash functions f1 and f2, and G for a perfect minimal hash, where
+    both vertices of each key are in the same block of 16 integers (one
+    64-byte cache line) in G.  f1 (an IntSaltHash) selects the block, and
+    the 32-bit hash value z of f2 (also an IntSaltHash) determines the two
+    vertices within the block, using block_vertices(z, seed).  The first
+    integer of each block is its seed, which is chosen for each block
+    independently (from 0 to 'max_seeds' - 1), such that the graph of the
+    block is acyclic.  If this fails for any block, new hash functions are
+    tried, and after 'trials' failures the number of blocks is increased.
+    The hash value of a key in block b (with offset o = 16 * b) is:
+
+        (G[o + 1 + v1] + G[o + 1 + v2]) % NK
+
+    Initially, there is one block for every 8 keys, i.e. G has 2 integers
+    per key, but as the number of blocks grows, G typically ends up with
+    2 to 4 integers per key.  Note that each trial rebuilds all blocks, as
+    the blocks of the keys change with f1.
+    """
+    if config is None:
+        config = Config()
+    verbose = config.verbose
+    check_keys(keys)
+    NK = len(keys)
+    NB = max(1, -(-NK // 8))  # number of blocks
+
+    trial = 0
+    while True:
+        if trial and trial % config.trials == 0:
+            NB = config.grow(NB)
+            if verbose:
+                sys.stdout.write('\nGenerating blocks NB = %d ' % NB)
+        trial += 1
+
+        if 16 * NB > 100 * (NK + 1):
+            raise TooManyInterationsError("%d keys" % NK)
+
+        if verbose:
+            sys.stdout.write('.')
+            sys.stdout.flush()
+
+        f1 = IntSaltHash(NB, config.random)
+        f2 = IntSaltHash(2 ** 32, config.random)
+        blocks = [[] for b in range(NB)]
+        for hashval, key in enumerate(keys):
+            blocks[f1(key)].append((f2(key), hashval))
+
+        G = []
+        for block in blocks:
+            for seed in range(max_seeds):
+                graph = Graph(15, NK)
+                for z, hashval in block:
+                    v1, v2 = block_vertices(z, seed)
+                    graph.connect(v1, v2, hashval)
+                if graph.assign_vertex_values():
+                    G.append(seed)
+                    G.extend(graph.vertex_values)
+                    break
+            else:  # no seed found for this block
+                break
+        else:
+            break
+
+    if verbose:
+        print('\nAll blocks acyclic after %d trials.' % trial)
+        print('NB = %d, NG = %d' % (NB, len(G)))
+
+    for hashval, key in enumerate(keys):
+        o = 16 * f1(key)
+        v1, v2 = block_vertices(f2(key), G[o])
+        assert hashval == (G[o + 1 + v1] + G[o + 1 + v2]) % NK
+
+    return f1, f2, G
+
+
+_minimize_keys = None
+
+def _minimize_init(keys):
+    global _minimize_keys
+    _minimize_keys = keys
+
+
+def _minimize_job(NG, Hash, deadline, config):
+    keys = _minimize_keys
+    for unused in range(config.trials):
+        if time.time() > deadline:
+            break
+        res = try_graph(keys, range(len(keys)), NG, None, Hash, config)
+        if res:
+            return res
+    return None
+
+
+def minimize_hash(keys, Hash=StrSaltHash, budget=10.0, jobs=None,
+                  pow2=False, config=None):
+    """
+    Like generate_hash(), but search for the smallest G within 'budget'
+    seconds.  Starting from the solution found by generate_hash(), smaller
+    graph sizes NG are tried (by bisection between the smallest NG found
+    so far and 2 NK + 1, below which acyclic graphs become unlikely, see
+    expected_trials(), or NK + 1 when a smaller NG is found first), using
+    up to 'trials' random graphs in each of 'jobs' worker processes for
+    each candidate size.  Once the bisection is done, the size just below
+    the smallest one found is tried until the budget is used up.  When
+    'pow2' is true, the candidates are powers of 2.  Each job uses its own
+    Config spawned from 'config'.  Returns f1, f2 and the smallest G found.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if config is None:
+        config = Config()
+    verbose = config.verbose
+    deadline = time.time() + budget
+    best = generate_hash(keys, Hash, pow2, config)
+    NK = len(keys)
+    # an acyclic graph with NK edges has more than NK vertices, and for
+    # large NK, it is unlikely to be found unless NG > 2 NK
+    lo = 2 * NK + 1 if len(best[2]) > 2 * NK + 1 else NK + 1
+
+    njobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(njobs, initializer=_minimize_init,
+                             initargs=(keys,)) as executor:
+        while time.time() < deadline:
+            hi = len(best[2])
+            if pow2:
+                NG = hi // 2
+            elif lo < hi:
+                NG = (lo + hi) // 2  # bisection
+            else:
+                NG = hi - 1  # bisection is done, keep trying below best
+            if NG <= NK:
+                break
+            if verbose:
+                print('Trying NG = %d ...' % NG)
+            futures = [executor.submit(_minimize_job, NG, Hash, deadline,
+                                       config.spawn())
+                       for unused in range(njobs)]
+            found = [res for res in (f.result() for f in futures) if res]
+            if found:
+                best = found[0]
+            elif not pow2 and lo < hi:
+                lo = NG + 1
+
+    f1, f2, G = best
+    check_hash(keys, f1, f2, G)
+
+    if verbose:
+        print('Smallest NG found: %d' % len(G))
+
+    return best
+
+
+def check_hash(keys, f1, f2, G):
+    """
+    Verify that all the 'keys' hash to their index.
+    """
+    for hashval, key in enumerate(keys):
+        assert hashval == (G[f1(key)] + G[f2(key)]) % len(G)
+
+
+async def generate_hash_async(keys, Hash=StrSaltHash, pow2=False,
+                              config=None, executor=None, progress=None,
+                              timeout=None):
+    """
+    Coroutine version of generate_hash(), which does not block the event
+    loop: each random graph is tried in 'executor' (the default executor
+    of the loop when None), one at a time.  Between trials, the task may be
+    cancelled (a trial which is already running is completed in the
+    executor, and its result discarded), and 'timeout' (in seconds) is
+    checked, raising asyncio.TimeoutError once exceeded.
+    'progress(trial, NG)' is called in the event loop before each trial.
+    Each trial uses its own Config spawned from 'config', such that the
+    result only depends on the seed of 'config', and a ProcessPoolExecutor
+    may be used as well.  Returns f1, f2 and G, just like generate_hash().
+    """
+    import asyncio
+
+    if config is None:
+        config = Config()
+    check_keys(keys, getattr(Hash, 'key_type', str))
+    NK = len(keys)
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+
+    await loop.run_in_executor(executor, preflight, keys, Hash, 4,
+                               config.spawn())
+
+    for trial, NG in enumerate(graph_sizes(NK, pow2, config)):
+        if deadline is not None and loop.time() >= deadline:
+            raise asyncio.TimeoutError(
+                "no perfect hash found for %d keys within %g seconds "
+                "(%d trials)" % (NK, timeout, trial))
+        if progress:
+            progress(trial, NG)
+        res = await loop.run_in_executor(executor, try_graph, keys,
+                                         range(NK), NG, None, Hash,
+                                         config.spawn())
+        if res:
+            break
+
+    await loop.run_in_executor(executor, check_hash, keys, *res)
+    return res
+
+
+def group_tables(keys, tables):
+    """
+    Group the 'keys' by the names of their 'tables' (one for each key),
+    such that a single perfect hash may be generated for all tables.
+    The tables are numbered in the order their names first appear.  The
+    keys of table t are tagged by prepending chr(t + 1) (a single byte),
+    such that equal keys in different tables are distinguished.
+    Returns the keys (in order of their tables), the tagged keys, the names
+    of the tables and their offsets TO, i.e. the keys of table t are
+    keys[TO[t]:TO[t + 1]].
+    """
+    if len(tables) != len(keys):
+        raise ValueError("%d keys but %d tables" % (len(keys), len(tables)))
+    names = list(dict.fromkeys(tables))
+    if len(names) > 127:
+        raise ValueError("at most 127 tables supported, got %d" % len(names))
+    index = {name: t for t, name in enumerate(names)}
+    order = sorted(range(len(keys)), key=lambda i: index[tables[i]])
+    keys = [keys[i] for i in order]
+    tagged = [chr(index[tables[i]] + 1) + keys[n]
+              for n, i in enumerate(order)]
+    TO = [0]
+    for name in names:
+        TO.append(TO[-1] + tables.count(name))
+    return keys, tagged, names, TO
+
+
+def order_by_frequency(keys, freqs):
+    """
+    Return the indices of the 'keys' sorted by decreasing access
+    frequencies 'freqs'.  Keys of equal frequency keep their order.
+    """
+    if len(freqs) != len(keys):
+        raise ValueError("%d keys but %d frequencies" % (len(keys),
+                                                          len(freqs)))
+    return sorted(range(len(keys)), key=lambda i: -freqs[i])
+
+
+def hot_footprint(f1, f2, keys, freqs, line_size=16):
+    """
+    Return the cost of the cache lines (of 'line_size' entries) of G,
+    which are accessed by lookups of the 'keys' (sorted by decreasing
+    frequencies 'freqs').  For each key, the lines which are not accessed
+    by a more frequent key already are counted, weighted by its frequency.
+    """
+    seen = set()
+    cost = 0
+    for key, freq in zip(keys, freqs):
+        lines = {f1(key) // line_size, f2(key) // line_size} - seen
+        cost += freq * len(lines)
+        seen |= lines
+    return cost
+
+
+def generate_hot_hash(keys, freqs, Hash=StrSaltHash, pow2=False,
+                      config=None, candidates=8):
+    """
+    Like generate_hash(), for 'keys' sorted by decreasing access frequencies
+    'freqs' (see order_by_frequency()), such that the hash values (and
+    records in K) of frequent keys are adjacent.  Once a solution is found,
+    further acyclic graphs of the same size are searched (using up to
+    'trials' random graphs for each), and of these 'candidates' solutions
+    the one with the smallest hot_footprint() is returned.
+    """
+    if config is None:
+        config = Config()
+    best = generate_hash(keys, Hash, pow2, config)
+    cost = first = hot_footprint(best[0], best[1], keys, freqs)
+    NG = len(best[2])
+    found = 1
+    for unused in range((candidates - 1) * config.trials):
+        if found == candidates:
+            break
+        res = try_graph(keys, range(len(keys)), NG, None, Hash, config)
+        if res:
+            found += 1
+            c = hot_footprint(res[0], res[1], keys, freqs)
+            if c < cost:
+                best, cost = res, c
+
+    if config.verbose:
+        print('Footprint of frequent keys in G: %g (first solution: %g, '
+              '%d solutions)' % (cost, first, found))
 
-    if verbose:
-        print('NG = %d' % NG)
+    return best
 
-    trial = 0  # Number of trial graphs so far
-    while True:
-        if (trial % trials) == 0:   # trials failures, increase NG slightly
-            if trial > 0:
-                if pow2:
-                    NG *= 2
-                else:
-                    NG = max(NG + 1, int(1.05 * NG))
-            if verbose:
-                sys.stdout.write('\nGenerating graphs NG = %d ' % NG)
-        trial += 1
 
-        if NG > 100 * (NK + 1):
-            raise TooManyInterationsError("%d keys" % NK)
+def pad_salt(f, NS):
+    """
+    Grow the salt of the hash function 'f' to (at least) length 'NS',
+    by hashing a dummy key of that length.
+    """
+    if len(f.salt) < NS:
+        key = NS * '\0'
+        f((key,) if isinstance(f, CompositeKey) else key)
 
-        if verbose:
-            sys.stdout.write('.')
-            sys.stdout.flush()
 
-        G = Graph(NG)   # Create graph with NG vertices
-        f1 = Hash(NG)   # Create 2 random hash functions
-        f2 = Hash(NG)
+def _shard_job(keys, hashvals, NK, Hash, config):
+    return find_graph(keys, hashvals, NK, Hash, False, config)
 
-        # Connect vertices given by the values of the two hash functions
-        # for each key.  Associate the desired hash value with each edge.
-        for hashval, key in enumerate(keys):
-            G.connect(f1(key), f2(key), hashval)
 
-        # Try to assign the vertex values.  This will fail when the graph
-        # is cyclic.  But when the graph is acyclic it will succeed and we
-        # break out, because we're done.
-        if G.assign_vertex_values():
-            break
+def generate_sharded_hash(keys, Hash=StrSaltHash, shard_size=2000,
+                          jobs=None, config=None):
+    """
+    Return a two-level perfect minimal hash.  A first level hash function
+    f0 splits the 'keys' into shards of about 'shard_size' keys, and for
+    each shard an independent graph is found, using a pool of 'jobs'
+    worker processes.  Returns f0 and a list of tuples (f1, f2, G), one
+    for each shard, such that the hash value of each key in shard s is:
+
+        (G_s[f1_s(key)] + G_s[f2_s(key)]) % NK
+
+    As the shards are stitched together in the generated code, the hash
+    functions need to have a salt sequence, like StrSaltHash and IntSaltHash.
+    Each shard uses its own Config spawned from 'config', such that the
+    result does not depend on the number of jobs.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if config is None:
+        config = Config()
+    verbose = config.verbose
+    check_keys(keys)
+    NK = len(keys)
+    NSH = max(1, -(-NK // shard_size))  # number of shards
+    f0 = config.new_hash(Hash, NSH)
+
+    shard_keys = [[] for s in range(NSH)]
+    shard_vals = [[] for s in range(NSH)]
+    for hashval, key in enumerate(keys):
+        s = f0(key)
+        shard_keys[s].append(key)
+        shard_vals[s].append(hashval)
 
     if verbose:
-        print('\nAcyclic graph found after %d trials.' % trial)
-        print('NG = %d' % NG)
+        print('NSH = %d, largest shard: %d keys' % (
+            NSH, max(len(sk) for sk in shard_keys)))
 
-    # Sanity check the result by actually verifying that all the keys
-    # hash to the right value.
+    configs = [config.spawn() for s in range(NSH)]
+    if NSH == 1 or jobs == 1:
+        shards = list(map(_shard_job, shard_keys, shard_vals, NSH * [NK],
+                          NSH * [Hash], configs))
+    else:
+        with ProcessPoolExecutor(jobs) as executor:
+            shards = list(executor.map(_shard_job, shard_keys, shard_vals,
+                                       NSH * [NK], NSH * [Hash], configs))
+
+    # Sanity check the result, as in generate_hash
     for hashval, key in enumerate(keys):
-        assert hashval == (
-            G.vertex_values[f1(key)] + G.vertex_values[f2(key)]
-        ) % NG
+        f1, f2, G = shards[f0(key)]
+        assert hashval == (G[f1(key)] + G[f2(key)]) % NK
+
+    # pad all salts to the same length, such that the generated code may
+    # use the same (maximal) key length for all shards
+    NS = max(len(key.encode()) for key in keys) if keys else 0
+    pad_salt(f0, NS)
+    for f1, f2, G in shards:
+        pad_salt(f1, NS)
+        pad_salt(f2, NS)
 
     if verbose:
         print('OK')
 
-    return f1, f2, G.vertex_values
+    return f0, shards
 
 
 class Format(object):
@@ -333,64 +1881,459 @@ class Format(object):
         if not isinstance(data, (list, tuple)):
             return data
 
-        lendel = len(self.delimiter)
         aux = StringIO()
+        self.write(aux, data, quote)
+        return aux.getvalue()
+
+    def write(self, fo, data, quote=False):
+        """
+        Write the items of the iterable 'data' to the file object 'fo'.
+        As 'data' is only iterated once, it may also be a generator.
+        """
+        lendel = len(self.delimiter)
         pos = 20
         for i, elt in enumerate(data):
-            last = bool(i == len(data) - 1)
+            if i:
+                fo.write(self.delimiter)
+                pos += lendel
 
             s = ('"%s"' if quote else '%s') % elt
 
             if pos + len(s) + lendel > self.width:
-                aux.write('\n' + (self.indent * ' '))
+                fo.write('\n' + (self.indent * ' '))
                 pos = self.indent
 
-            aux.write(s)
+            fo.write(s)
             pos += len(s)
-            if not last:
-                aux.write(self.delimiter)
-                pos += lendel
 
-        return aux.getvalue()
+    def bytes_literal(self, data):
+        """
+        Return the bytes 'data' as a Python bytes literal, which is split
+        into several lines (within parentheses) of the format width.
+        """
+        lines = []
+        line = []
+        pos = self.indent + 3
+        for c in data:
+            s = bytes_escapes[c]
+            if pos + len(s) > self.width - 1:
+                lines.append("b'%s'" % ''.join(line))
+                line = []
+                pos = self.indent + 3
+            line.append(s)
+            pos += len(s)
+        lines.append("b'%s'" % ''.join(line))
+        if len(lines) == 1:
+            return lines[0]
+        return '(' + ('\n' + self.indent * ' ').join(lines) + ')'
+
+    def c_strings(self, strings):
+        """
+        Return the concatenation of 'strings' (UTF-8 encoded) as adjacent
+        C string literals, which are split into lines of the format width.
+        """
+        lines = []
+        line = []
+        pos = self.indent + 2
+        for s in strings:
+            s = c_string(s)[1:-1]
+            if line and pos + len(s) > self.width:
+                lines.append('"%s"' % ''.join(line))
+                line = []
+                pos = self.indent + 2
+            line.append(s)
+            pos += len(s)
+        lines.append('"%s"' % ''.join(line))
+        return ('\n' + self.indent * ' ').join(lines)
+
+
+# escape sequences of all bytes within (single quoted) bytes literals
+bytes_escapes = [chr(c) if 32 <= c < 127 and chr(c) not in "\\'" else
+                 '\\x%02x' % c for c in range(256)]
+
+
+def typecode(values):
+    """
+    Return the typecode of the narrowest unsigned array type for the
+    (non-negative) integers 'values'.
+    """
+    m = max(values, default=0)
+    for tc in 'BHIQ':
+        if m < 256 ** array(tc).itemsize:
+            return tc
+    raise ValueError("integer too large: %d" % m)
+
+
+def key_blob_params(keys, fmt):
+    """
+    Return the template parameters for storing the (string) 'keys' as one
+    blob of bytes, instead of one string for each key:
+
+    KD   all UTF-8 encoded keys concatenated, as C string literal(s)
+    KP   offsets of the keys in KD (NK + 1 integers), i.e. key i is
+         KD[KP[i]:KP[i + 1]]
+    KPB  number of bits (8, 16, 32 or 64) of the narrowest unsigned
+         integer type which holds the offsets KP
+    """
+    KP = [0]
+    for key in keys:
+        KP.append(KP[-1] + len(key.encode()))
+    return dict(KD = fmt.c_strings(keys), KP = fmt(KP),
+                KPB = 8 * array(typecode(KP)).itemsize)
+
+
+def wrap_terms(prefix, terms, suffix='', width=79, parens=False,
+               sep=' + '):
+    """
+    Return the lines of the sum of 'terms' (strings), starting with
+    'prefix' and ending with 'suffix', wrapped at 'width' columns.
+    When 'parens' is true (for Python), a wrapped sum is enclosed in
+    parentheses.  Other lists are joined using another separator 'sep'.
+    """
+    terms = list(terms) or ['0']
+    if len(prefix + sep.join(terms) + suffix) <= width:
+        return [prefix + sep.join(terms) + suffix]
+    if parens:
+        prefix, suffix = prefix + '(', ')' + suffix
+    lines = [prefix + terms[0]]
+    for term in terms[1:]:
+        if len(lines[-1] + sep + term + suffix) <= width:
+            lines[-1] += sep + term
+        else:
+            lines[-1] += sep.rstrip()
+            lines.append(' ' * len(prefix) + term)
+    lines[-1] += suffix
+    return lines
+
+
+def unrolled_hash(f1, f2, NG, lengths, lang='python'):
+    """
+    Return the hash functions of the keys for each of their 'lengths' (the
+    lengths of the UTF-8 encoded keys, in the order of the keys), in
+    which the loop over the bytes of the key is unrolled, and the salts of
+    the hash functions 'f1' and 'f2' are constants, as code in 'lang':
+
+    python  a function for each length, and the dict _HASH mapping the
+            lengths to them (see unrolled_template)
+    c       a case of a switch statement on the length for each length,
+            in which the key is hashed and compared (see c_template())
+    """
+    def terms(salt, n, suffix=''):
+        # the terms of the salted sum of a key of length n
+        return ['k[%d]' % j if salt[j] == 1 else
+                '%d%s * k[%d]' % (salt[j], suffix, j)
+                for j in range(n) if salt[j]]
+
+    fast = isinstance(f1, FastRange)
+    res = []
+    for n in sorted(set(lengths)):
+        if lang == 'c':
+            sums = [wrap_terms('        f%d = ' % i,
+                               terms(f.salt, n, 'ull'), ';')
+                    for i, f in [(1, f1), (2, f2)]]
+            res.append('    case %d:' % n)
+            res.extend(sums[0] + sums[1])
+            res.append('        h = hash_g(f1, f2);')
+            res.append('        if (h < %d && KP[h + 1] - KP[h] == %d &&' %
+                       (len(lengths), n))
+            res.append('                memcmp(key, KD + KP[h], %d) == 0)'
+                       % n)
+            res.append('            return (int) h;')
+            res.append('        return -1;')
+        else:
+            sums = [wrap_terms('    f%d = ' % i, terms(f.salt, n),
+                               parens=True)
+                    for i, f in [(1, f1), (2, f2)]]
+            res.append('def _hash%d(k):' % n)
+            res.extend(sums[0] + sums[1])
+            if fast:
+                res.append('    h = (G[(f1 * 0x9e3779b1 & 0xffffffff) * %d'
+                           ' >> 32] +' % NG)
+                res.append('         G[(f2 * 0x9e3779b1 & 0xffffffff) * %d'
+                           ' >> 32])' % NG)
+                res.append('    return h - %d if h >= %d else h' % (NG, NG))
+            else:
+                res.append('    return (G[f1 %% %d] + G[f2 %% %d]) %% %d' %
+                           (NG, NG, NG))
+            res.append('')
+    if lang != 'c':
+        res.extend(wrap_terms('_HASH = {', ['%d: _hash%d' % (n, n) for n in
+                                            sorted(set(lengths))], '}',
+                              sep=', '))
+    return '\n'.join(res)
+
+
+def compact_arrays(arrays, fmt, sidecar=None):
+    """
+    Return the parameters for compact_template() for 'arrays', a list of
+    name, data pairs (where data is a list of integers or bytes).
+    The data is stored in little-endian byte order, within bytes literals,
+    or when a filename 'sidecar' is given, in this file (each array
+    aligned to 8 bytes).
+    """
+    params = {}
+    fo = open(sidecar, 'wb') if sidecar else None
+    try:
+        for name, data in arrays:
+            tc = 'B' if isinstance(data, bytes) else typecode(data)
+            a = array(tc, data)
+            if sys.byteorder == 'big':
+                a.byteswap()
+            raw = a.tobytes()
+            if fo is None:
+                params[name] = "_array('%s', %s)" % (tc,
+                                                     fmt.bytes_literal(raw))
+            else:
+                params[name] = "_array('%s', _mm, %d, %d)" % (
+                    tc, fo.tell(), len(raw))
+                fo.write(raw + bytes(-len(raw) % 8))
+    finally:
+        if fo is not None:
+            fo.close()
+    if sidecar:
+        params['BIN'] = os.path.basename(sidecar)
+    return params
+
+
+def concat(seqs):
+    """
+    Concatenate the sequences 'seqs' (of the same type), e.g. the salts of
+    several hash functions.
+    """
+    res = type(seqs[0])()
+    for seq in seqs:
+        res += seq
+    return res
 
 
 def generate_code(keys, Hash=StrSaltHash, template=None, options=None,
-                  pow2=False):
+                  pow2=False, shard_size=0, jobs=None, fingerprint=0,
+                  minimize=0, blocked=False, compact=False, sidecar=None,
+                  config=None, freqs=None, prefilter=0, tables=None,
+                  scanner=None, stats=False, lang='python', unroll=False):
     """
     Takes a list of key value pairs and inserts the generated parameter
     lists into the 'template' string.  'Hash' is the random hash function
     generator, and the optional keywords are formating options.
+    When 'shard_size' is given, a two-level hash is generated using
+    generate_sharded_hash().  When 'fingerprint' (the number of bits) is
+    given, an array of fingerprints of the keys is generated as well.
+    When 'minimize' (a time budget in seconds) is given, the smallest G
+    is searched using minimize_hash().  When 'blocked' is true, a cache
+    local hash is generated using generate_blocked_hash(), which requires
+    'Hash' to be IntSaltHash.  When 'compact' is true, a compact Python
+    module is generated (see compact_template()), whose arrays are written
+    to the file 'sidecar' if given.  'config' is the Config of the
+    generation (a new one by default).  When the access frequencies 'freqs'
+    of the keys are given, the keys are ordered by decreasing frequency
+    (so their hash values are the ranks of the frequencies), and the
+    solution is chosen using generate_hot_hash().  When 'prefilter' (a
+    size budget in bytes) is given, filters for rejecting non-member keys
+    are generated, see prefilter_params().  When the names of the 'tables'
+    of the keys (one for each key) are given, one perfect hash is generated
+    for all tables, see group_tables().  When the character class
+    'scanner' (see char_class()) is given, the parameter CC (the 256
+    entries of which are 1 for the bytes in the class, and 0 otherwise) is
+    generated, and the builtin template includes a keyword scanner.
+    When 'stats' is true, the builtin template is instrumented with
+    counters, see stats_template().  When 'lang' is 'c', the builtin
+    template is a C header, see c_template().  When 'unroll' is true, the
+    builtin template hashes the keys of each length using unrolled code
+    with constant salts, see unrolled_hash().  For string keys, templates
+    may also use the key blob parameters, see key_blob_params().
     The return value is the substituted code template.
     """
-    f1, f2, G = generate_hash(keys, Hash, pow2)
-
-    assert f1.N == f2.N == len(G)
-    try:
-        salt_len = len(f1.salt)
-        assert salt_len == len(f2.salt)
-    except TypeError:
-        salt_len = None
-
-    if template is None:
-        template = builtin_template(Hash)
-
+    if blocked and (Hash is not IntSaltHash or pow2 or shard_size or
+                    minimize):
+        raise ValueError("blocked hash requires IntSaltHash, and cannot be "
+                         "used with pow2, sharded hash or minimize")
+    if pow2 and shard_size:
+        raise ValueError("pow2 cannot be used for sharded hash")
+    if issubclass(Hash, FastRange) and shard_size:
+        raise ValueError("fastrange cannot be used for sharded hash")
+    if minimize and shard_size:
+        raise ValueError("minimize cannot be used for sharded hash")
+    if freqs is not None and (minimize or blocked or shard_size):
+        raise ValueError("frequencies cannot be used with minimize, "
+                         "blocked hash or sharded hash")
+    if fingerprint not in (0, 8, 16, 32):
+        raise ValueError("fingerprint has to be 8, 16 or 32 bits")
+    key_type = getattr(Hash, 'key_type', str)
+    if key_type is not str and (shard_size or fingerprint or compact or
+                                prefilter):
+        raise ValueError("sharded hash, fingerprints, compact modules and "
+                         "prefilters require string keys")
+    if compact and template is not None:
+        raise ValueError("compact module requires the builtin template")
+    if sidecar and not compact:
+        raise ValueError("sidecar file requires compact module")
+    if stats and template is not None:
+        raise ValueError("stats require the builtin template")
+    if lang not in ('python', 'c'):
+        raise ValueError("unknown language: %r" % lang)
+    if lang == 'c' and (template is not None or Hash not in (
+            StrSaltHash, IntSaltHash, StrSaltFastHash, IntSaltFastHash,
+            StrSaltCompositeHash, IntSaltCompositeHash) or
+            shard_size or blocked or compact or fingerprint or
+            tables is not None or scanner is not None or stats):
+        raise ValueError("builtin C template requires StrSaltHash or "
+                         "IntSaltHash (or their composite key variants), "
+                         "and cannot be used with templates, "
+                         "sharded or blocked hash, compact modules, "
+                         "fingerprints, multiple tables, scanners or stats")
+    if unroll and (template is not None or Hash not in (
+            StrSaltHash, IntSaltHash, StrSaltFastHash, IntSaltFastHash) or
+            shard_size or blocked or compact or tables is not None or stats):
+        raise ValueError("unrolled hash requires the builtin template and "
+                         "StrSaltHash or IntSaltHash, and cannot be used "
+                         "with sharded or blocked hash, compact modules, "
+                         "multiple tables or stats")
+    if tables is not None and (key_type is not str or shard_size or blocked
+                               or fingerprint or compact or freqs is not None
+                               or prefilter):
+        raise ValueError("multiple tables require string keys, and cannot "
+                         "be used with sharded hash, blocked hash, "
+                         "fingerprints, compact modules, frequencies or "
+                         "prefilters")
+
+    if scanner is not None:
+        if Hash not in (StrSaltHash, IntSaltHash):
+            raise ValueError("scanner requires StrSaltHash or IntSaltHash")
+        if shard_size or blocked or compact or tables is not None:
+            raise ValueError("scanner cannot be used with sharded hash, "
+                             "blocked hash, compact modules or multiple "
+                             "tables")
+        CC = char_class(scanner)
+        for key in keys:
+            if not key or not CC.issuperset(key.encode()):
+                raise ValueError("key %r is not an identifier of the "
+                                 "scanner character class %r" %
+                                 (key, scanner))
+
+    if config is None:
+        config = Config()
     if options is None:
         fmt = Format()
     else:
         fmt = Format(width=options.width, indent=options.indent,
                      delimiter=options.delimiter)
 
-    if verbose:
+    if config.verbose:
         fmt.print_format()
 
+    if freqs is not None:
+        order = order_by_frequency(keys, freqs)
+        keys = [keys[i] for i in order]
+        freqs = [freqs[i] for i in order]
+
+    hash_keys = keys
+    if tables is not None:
+        keys, hash_keys, names, TO = group_tables(keys, tables)
+
+    if blocked:
+        f1, f2, G = generate_blocked_hash(keys, config=config)
+        salt_len = max(len(key.encode()) for key in keys) if keys else 0
+        pad_salt(f1, max(1, salt_len))
+        pad_salt(f2, max(1, salt_len))
+        salt_len = len(f1.salt)
+        params = dict(NB = f1.N, S1 = fmt(f1.salt), S2 = fmt(f2.salt))
+    elif shard_size:
+        f0, shards = generate_sharded_hash(keys, Hash, shard_size, jobs,
+                                           config)
+        GO = [0]  # offsets of the shards in G
+        for f1, f2, G in shards:
+            GO.append(GO[-1] + len(G))
+        params = dict(
+            NSH = len(shards),
+            GO = fmt(GO),
+            S0 = fmt(f0.salt),
+            S1 = fmt(concat([shard[0].salt for shard in shards])),
+            S2 = fmt(concat([shard[1].salt for shard in shards])))
+        salt_len = len(f0.salt)
+        G = concat([shard[2] for shard in shards])
+    else:
+        if minimize:
+            f1, f2, G = minimize_hash(hash_keys, Hash, minimize, jobs, pow2,
+                                      config)
+        elif freqs is not None:
+            f1, f2, G = generate_hot_hash(keys, freqs, Hash, pow2, config)
+        else:
+            f1, f2, G = generate_hash(hash_keys, Hash, pow2, config)
+
+        assert f1.N == f2.N == len(G)
+        if lang == 'c':  # avoid empty arrays in C
+            pad_salt(f1, 1)
+            pad_salt(f2, 1)
+        try:
+            salt_len = len(f1.salt)
+            assert salt_len == len(f2.salt)
+        except TypeError:
+            salt_len = None
+        params = dict(S1 = fmt(f1.salt), S2 = fmt(f2.salt))
+        if unroll:
+            params['HU'] = unrolled_hash(f1, f2, len(G),
+                                         [len(key.encode()) for key in keys],
+                                         lang)
+
+    if tables is not None:
+        params.update(NT = len(names), TO = fmt(TO),
+                      TN = fmt(names, quote=True))
+
+    arrays = [('G', G)]
+    if fingerprint:
+        FS = config.random.getrandbits(32)
+        params.update(FB = fingerprint, FS = FS)
+        arrays.append(('FP', [key_fingerprint(key, FS, fingerprint)
+                              for key in keys]))
+
+    if prefilter:
+        params.update((name, fmt(value)) for name, value in
+                      prefilter_params(keys, prefilter, config.random).items())
+
+    if scanner is not None:
+        params['CC'] = fmt([int(c in CC) for c in range(256)])
+
+    if compact:
+        KO = [0]  # offsets of the keys in KB
+        for key in keys:
+            KO.append(KO[-1] + len(key.encode()))
+        arrays.append(('KB', ''.join(keys).encode()))
+        arrays.append(('KO', KO))
+        params.update(compact_arrays(arrays, fmt, sidecar))
+    else:
+        params.update((name, fmt(data)) for name, data in arrays)
+        if key_type is tuple:
+            params['NF'] = len(keys[0]) if keys else 1
+            params['K'] = fmt([repr(key) for key in keys])
+        else:
+            params['K'] = fmt(list(keys), quote=key_type is str)
+
+    if lang == 'c':
+        params['GB'] = 8 * array(typecode(G)).itemsize
+        template = c_template(Hash, bool(prefilter), bool(prefilter and
+                                                          params['BM']),
+                              unroll)
+    elif template is None:
+        template = builtin_template(Hash, bool(shard_size), bool(fingerprint),
+                                    blocked, compact, bool(sidecar),
+                                    bool(prefilter), bool(prefilter and
+                                                          params['BM']),
+                                    tables is not None, scanner is not None,
+                                    stats, unroll)
+
+    # the key blob is only created when the template may use it
+    if key_type is str and ('KD' in template or 'KP' in template):
+        params.update(key_blob_params(keys, fmt))
+    elif key_type is tuple and ('KD' in template or 'KP' in template):
+        # the fields of all keys, field j of key i is field i * NF + j
+        params.update(key_blob_params([field for key in keys
+                                       for field in key], fmt))
+
     res = string.Template(template).substitute(
         NS = salt_len,
-        S1 = fmt(f1.salt),
-        S2 = fmt(f2.salt),
         NG = len(G),
-        G  = fmt(G),
         NK = len(keys),
-        K  = fmt(list(keys), quote=True))
+        **params)
 
     if pow2:
         res = res.replace("%% %d" % len(G), "& %d" % (len(G) - 1))
@@ -398,12 +2341,680 @@ def generate_code(keys, Hash=StrSaltHash, template=None, options=None,
     return res
 
 
-def read_table(filename, options):
+extension_template = r'''/* CPython extension module `$NAME',
+   generated by perfect-hash */
+#define PY_SSIZE_T_CLEAN
+#include "Python.h"
+
+#if PY_VERSION_HEX < 0x03070000
+#error "requires Python 3.7 or later (METH_FASTCALL)"
+#endif
+
+#define NK  $NK       /* number of keys */
+#define NG  $NG       /* number of vertices */
+#define NS  $NS       /* length of salt arrays */
+#define HAS_VALUES  $HV
+#define STATS  $ST       /* count outcomes of lookups */
+
+static const long long S1[] = {$S1};
+static const long long S2[] = {$S2};
+static const int G[] = {$G};
+
+static const char *K[] = {$K};
+static const Py_ssize_t KL[] = {$KL};    /* lengths of keys in bytes */
+#if HAS_VALUES
+static const char *V[] = {$V};
+#endif
+
+#if STATS
+/* counts of lookups, keys rejected by the length check, keys which
+   failed the key comparison, and hits */
+enum {LOOKUPS, TOO_LONG, MISMATCH, HITS, NCOUNTS};
+static Py_ssize_t counts[NCOUNTS];
+#if defined(__GNUC__)
+#define COUNT(i)  __atomic_fetch_add(&counts[i], 1, __ATOMIC_RELAXED)
+#else
+#define COUNT(i)  (counts[i]++)     /* protected by the GIL */
+#endif
+#else
+#define COUNT(i)
+#endif
+
+/* return index of key in K if key is found, -1 otherwise */
+static Py_ssize_t get_index(const unsigned char *key, Py_ssize_t len)
+{
+    long long f1 = 0, f2 = 0;
+    Py_ssize_t i;
+
+    COUNT(LOOKUPS);
+    if (len > NS) {
+        COUNT(TOO_LONG);
+        return -1;
+    }
+
+    for (i = 0; i < len; i++) {
+        f1 += S1[i] * key[i];
+        f2 += S2[i] * key[i];
+    }
+    i = (G[f1 % NG] + G[f2 % NG]) % NG;
+    if (i < NK && KL[i] == len && memcmp(key, K[i], len) == 0) {
+        COUNT(HITS);
+        return i;
+    }
+
+    COUNT(MISMATCH);
+    return -1;
+}
+
+/* Return index of the key `obj` (str or bytes-like object), -1 if not
+   found, and -2 on error.  The key is never copied: for str objects the
+   (cached) UTF-8 representation is used, other objects are accessed
+   using the buffer protocol. */
+static Py_ssize_t find(PyObject *obj)
+{
+    Py_buffer view;
+    Py_ssize_t len, i;
+    const char *s;
+
+    if (PyUnicode_Check(obj)) {
+        if ((s = PyUnicode_AsUTF8AndSize(obj, &len)) == NULL)
+            return -2;
+        return get_index((const unsigned char *) s, len);
+    }
+    if (PyObject_GetBuffer(obj, &view, PyBUF_SIMPLE) < 0)
+        return -2;
+    i = get_index((const unsigned char *) view.buf, view.len);
+    PyBuffer_Release(&view);
+    return i;
+}
+
+#if HAS_VALUES
+static PyObject *values;        /* tuple of str objects created from V */
+#endif
+
+static PyObject *value(Py_ssize_t i)
+{
+#if HAS_VALUES
+    PyObject *v = PyTuple_GET_ITEM(values, i);
+
+    Py_INCREF(v);
+    return v;
+#else
+    return PyLong_FromSsize_t(i);
+#endif
+}
+
+static PyObject *find_value(PyObject *key, PyObject *deflt)
+{
+    Py_ssize_t i;
+
+    if ((i = find(key)) == -2)
+        return NULL;
+    if (i >= 0)
+        return value(i);
+    if (deflt == NULL) {
+        PyErr_SetObject(PyExc_KeyError, key);
+        return NULL;
+    }
+    Py_INCREF(deflt);
+    return deflt;
+}
+
+/* lookup() and lookup_many() are METH_FASTCALL functions, such that no
+   argument tuple is created, and parse their (positional) arguments
+   without PyArg_ParseTuple() */
+static PyObject *module_lookup(PyObject *module, PyObject *const *args,
+                               Py_ssize_t nargs)
+{
+    if (nargs < 1 || nargs > 2) {
+        PyErr_Format(PyExc_TypeError,
+                     "lookup expected 1 or 2 arguments, got %zd", nargs);
+        return NULL;
+    }
+    return find_value(args[0], nargs == 2 ? args[1] : NULL);
+}
+
+static PyObject *module_contains(PyObject *module, PyObject *key)
+{
+    Py_ssize_t i;
+
+    if ((i = find(key)) == -2)
+        return NULL;
+    return PyBool_FromLong(i >= 0);
+}
+
+/* lookup keys separated by `sep` in a buffer, without copying any key */
+static PyObject *lookup_buffer(PyObject *obj, char sep, PyObject *deflt)
+{
+    PyObject *res, *v;
+    Py_buffer view;
+    const unsigned char *p, *end, *q;
+    Py_ssize_t i;
+
+    if (PyObject_GetBuffer(obj, &view, PyBUF_SIMPLE) < 0)
+        return NULL;
+    if ((res = PyList_New(0)) == NULL)
+        goto done;
+
+    p = (const unsigned char *) view.buf;
+    end = p + view.len;
+    while (p < end) {
+        q = memchr(p, sep, end - p);
+        if (q == NULL)
+            q = end;
+        i = get_index(p, q - p);
+        if (i >= 0) {
+            v = value(i);
+        }
+        else {
+            v = deflt;
+            Py_INCREF(v);
+        }
+        if (v == NULL || PyList_Append(res, v) < 0) {
+            Py_XDECREF(v);
+            Py_CLEAR(res);
+            goto done;
+        }
+        Py_DECREF(v);
+        p = q + 1;
+    }
+ done:
+    PyBuffer_Release(&view);
+    return res;
+}
+
+static PyObject *module_lookup_many(PyObject *module, PyObject *const *args,
+                                    Py_ssize_t nargs)
+{
+    PyObject *keys, *deflt = Py_None, *seq, *res, *v;
+    char sep = '\n';
+    Py_ssize_t n, i;
+
+    if (nargs < 1 || nargs > 3) {
+        PyErr_Format(PyExc_TypeError,
+                     "lookup_many expected 1 to 3 arguments, got %zd", nargs);
+        return NULL;
+    }
+    keys = args[0];
+    if (nargs > 1)
+        deflt = args[1];
+    if (nargs > 2) {
+        if (PyBytes_Check(args[2]) && PyBytes_GET_SIZE(args[2]) == 1)
+            sep = PyBytes_AS_STRING(args[2])[0];
+        else if (PyByteArray_Check(args[2]) &&
+                 PyByteArray_GET_SIZE(args[2]) == 1)
+            sep = PyByteArray_AS_STRING(args[2])[0];
+        else {
+            PyErr_SetString(PyExc_TypeError, "lookup_many() argument 3 "
+                            "must be a byte string of length 1");
+            return NULL;
+        }
+    }
+
+    if (!PyUnicode_Check(keys) && PyObject_CheckBuffer(keys))
+        return lookup_buffer(keys, sep, deflt);
+
+    if ((seq = PySequence_Fast(keys, "iterable or buffer expected")) == NULL)
+        return NULL;
+    n = PySequence_Fast_GET_SIZE(seq);
+    if ((res = PyList_New(n)) == NULL)
+        goto done;
+    for (i = 0; i < n; i++) {
+        v = find_value(PySequence_Fast_GET_ITEM(seq, i), deflt);
+        if (v == NULL) {
+            Py_CLEAR(res);
+            goto done;
+        }
+        PyList_SET_ITEM(res, i, v);
+    }
+ done:
+    Py_DECREF(seq);
+    return res;
+}
+
+#if STATS
+static PyObject *module_stats(PyObject *module, PyObject *args,
+                              PyObject *kwds)
+{
+    static char *kwlist[] = {"reset", NULL};
+    static const char *names[NCOUNTS] = {"lookups", "too_long",
+                                         "mismatch", "hits"};
+    PyObject *res, *v;
+    int reset = 0, j;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|p:stats", kwlist, &reset))
+        return NULL;
+    if ((res = PyDict_New()) == NULL)
+        return NULL;
+    for (j = 0; j < NCOUNTS; j++) {
+        v = PyLong_FromSsize_t(counts[j]);
+        if (v == NULL || PyDict_SetItemString(res, names[j], v) < 0) {
+            Py_XDECREF(v);
+            Py_DECREF(res);
+            return NULL;
+        }
+        Py_DECREF(v);
+        if (reset)
+            counts[j] = 0;
+    }
+    return res;
+}
+#endif
+
+/* ------------------------- frozen table object -------------------------- */
+
+typedef struct {
+    PyObject_HEAD
+} TableObject;
+
+static Py_ssize_t table_length(PyObject *self)
+{
+    return NK;
+}
+
+static PyObject *table_subscript(PyObject *self, PyObject *key)
+{
+    return find_value(key, NULL);
+}
+
+static int table_contains(PyObject *self, PyObject *key)
+{
+    Py_ssize_t i;
+
+    if ((i = find(key)) == -2)
+        return -1;
+    return i >= 0;
+}
+
+static PyMappingMethods table_as_mapping = {
+    table_length,               /* mp_length */
+    table_subscript,            /* mp_subscript */
+    0,                          /* mp_ass_subscript */
+};
+
+static PySequenceMethods table_as_sequence = {
+    table_length,               /* sq_length */
+    0, 0, 0, 0, 0, 0,
+    table_contains,             /* sq_contains */
+};
+
+static PyTypeObject TableType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "$NAME.Table",                  /* tp_name */
+    sizeof(TableObject),            /* tp_basicsize */
+    0,                              /* tp_itemsize */
+    0,                              /* tp_dealloc */
+    0,                              /* tp_vectorcall_offset */
+    0,                              /* tp_getattr */
+    0,                              /* tp_setattr */
+    0,                              /* tp_as_async */
+    0,                              /* tp_repr */
+    0,                              /* tp_as_number */
+    &table_as_sequence,             /* tp_as_sequence */
+    &table_as_mapping,              /* tp_as_mapping */
+    0,                              /* tp_hash */
+    0,                              /* tp_call */
+    0,                              /* tp_str */
+    0,                              /* tp_getattro */
+    0,                              /* tp_setattro */
+    0,                              /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,             /* tp_flags */
+    "frozen perfect hash table",    /* tp_doc */
+};
+
+static PyMethodDef module_functions[] = {
+    {"lookup", (PyCFunction) (void (*)(void)) module_lookup, METH_FASTCALL,
+     PyDoc_STR("lookup(key[, default]) -> value of key, "
+               "raises KeyError if key is not found and no default given")},
+    {"lookup_many", (PyCFunction) (void (*)(void)) module_lookup_many,
+     METH_FASTCALL,
+     PyDoc_STR("lookup_many(keys, default=None, sep=b'\\n') -> list\n\n"
+               "Values of keys, which is an iterable or a buffer of "
+               "keys separated by sep")},
+    {"contains", (PyCFunction) module_contains, METH_O,
+     PyDoc_STR("contains(key) -> whether key is a member of the table")},
+#if STATS
+    {"stats", (PyCFunction) (void (*)(void)) module_stats,
+     METH_VARARGS | METH_KEYWORDS,
+     PyDoc_STR("stats(reset=False) -> dict\n\n"
+               "Counts of the outcomes of lookups since the last reset")},
+#endif
+    {NULL, NULL}        /* Sentinel */
+};
+
+static PyModuleDef moduledef = {
+    PyModuleDef_HEAD_INIT, "$NAME", 0, -1, module_functions,
+};
+
+PyMODINIT_FUNC
+PyInit_$NAME(void)
+{
+    PyObject *m, *table;
+
+    if (PyType_Ready(&TableType) < 0)
+        return NULL;
+#if HAS_VALUES
+    if (values == NULL) {
+        Py_ssize_t i;
+        PyObject *v;
+
+        if ((values = PyTuple_New(NK)) == NULL)
+            return NULL;
+        for (i = 0; i < NK; i++) {
+            if ((v = PyUnicode_FromString(V[i])) == NULL) {
+                Py_CLEAR(values);
+                return NULL;
+            }
+            PyTuple_SET_ITEM(values, i, v);
+        }
+    }
+#endif
+    if ((m = PyModule_Create(&moduledef)) == NULL)
+        return NULL;
+    table = (PyObject *) PyObject_New(TableObject, &TableType);
+    if (table == NULL || PyModule_AddObject(m, "table", table) < 0) {
+        Py_XDECREF(table);
+        Py_DECREF(m);
+        return NULL;
+    }
+    return m;
+}
+'''
+
+extension_setup_template = """\
+try:
+    from setuptools import setup, Extension
+except ImportError:
+    from distutils.core import setup, Extension
+
+setup(
+    name = "$NAME",
+    ext_modules = [
+        Extension(name = "$NAME",
+                  sources = ["$SOURCE"])
+    ]
+)
+"""
+
+
+def c_string(s):
     """
-    Reads keys and desired hash value pairs from a file.  If no column
-    for the hash value is specified, a sequence of hash values is generated,
-    from 0 to N-1, where N is the number of rows found in the file.
+    Return the UTF-8 encoding of the string 's' as a C string literal.
+    """
+    res = ['"']
+    for c in s.encode():
+        if 32 <= c < 127 and c not in b'"\\?':
+            res.append(chr(c))
+        else:
+            res.append('\\%03o' % c)
+    res.append('"')
+    return ''.join(res)
+
+
+def generate_extension(keys, name, values=None, options=None, config=None,
+                       freqs=None, stats=False, Hash=IntSaltHash):
+    """
+    Return the source code of a CPython extension module 'name', which maps
+    the 'keys' to the 'values' (strings), or to their index when no values
+    are given.  The module provides the functions lookup(), lookup_many()
+    and contains(), as well as the object 'table', which supports the
+    mapping protocol and membership tests.  When the access frequencies
+    'freqs' of the keys are given, the keys and values are ordered by
+    decreasing frequency, see generate_hot_hash().  When 'stats' is true,
+    the outcomes of lookups are counted, and returned by the function
+    stats() of the module.  'Hash' is StrSaltHash or IntSaltHash.
+    """
+    if not name.isidentifier():
+        raise ValueError("invalid module name: %r" % name)
+    if Hash not in (StrSaltHash, IntSaltHash):
+        raise ValueError("extension module requires StrSaltHash or "
+                         "IntSaltHash")
+    if values is not None and len(values) != len(keys):
+        raise ValueError("%d keys but %d values" % (len(keys), len(values)))
+
+    if freqs is None:
+        f1, f2, G = generate_hash(keys, Hash, config=config)
+    else:
+        order = order_by_frequency(keys, freqs)
+        keys = [keys[i] for i in order]
+        if values is not None:
+            values = [values[i] for i in order]
+        f1, f2, G = generate_hot_hash(keys, [freqs[i] for i in order],
+                                      Hash, config=config)
+    NS = max(1, len(f1.salt))  # avoid empty arrays in C
+    pad_salt(f1, NS)
+    pad_salt(f2, NS)
+
+    if options is None:
+        fmt = Format()
+    else:
+        fmt = Format(width=options.width, indent=options.indent,
+                     delimiter=options.delimiter)
+
+    return string.Template(extension_template).substitute(
+        NAME = name,
+        NS = NS,
+        S1 = fmt(list(f1.salt)),
+        S2 = fmt(list(f2.salt)),
+        NG = len(G),
+        G  = fmt(G),
+        NK = len(keys),
+        K  = fmt([c_string(key) for key in keys]),
+        KL = fmt([len(key.encode()) for key in keys]),
+        HV = int(values is not None),
+        ST = int(bool(stats)),
+        V  = fmt([c_string(v) for v in values]) if values else 0)
+
+
+def extension_setup(name, source):
+    """
+    Return a setup script for building the extension module 'name' from
+    the C file 'source' (as returned by generate_extension()).
+    """
+    return string.Template(extension_setup_template).substitute(
+        NAME = name, SOURCE = source)
+
+
+def substitute(fo, template, params):
+    """
+    Like string.Template(template).substitute(params), but the result
+    is written to the file object 'fo'.  Values in 'params' which are
+    callable are called with 'fo' as their argument, such that large
+    values can be written piece by piece.
+    """
+    pos = 0
+    for m in string.Template.pattern.finditer(template):
+        fo.write(template[pos:m.start()])
+        pos = m.end()
+        name = m.group('named') or m.group('braced')
+        if name is not None:
+            value = params[name]
+            if callable(value):
+                value(fo)
+            else:
+                fo.write('%s' % value)
+        elif m.group('escaped') is not None:
+            fo.write('$')
+        else:
+            raise ValueError("Invalid placeholder in template: %r" %
+                             template[m.start():m.start() + 10])
+    fo.write(template[pos:])
+
+
+def parse_size(s):
+    """
+    Return the number of bytes given by the string 's', e.g. '512M'.
+    """
+    units = {'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}
+    s = s.strip().upper().rstrip('B')
+    if s and s[-1] in units:
+        return int(float(s[:-1]) * units[s[-1]])
+    return int(s)
+
+
+# estimated memory used by find_graph() per key (excluding the key itself)
+BYTES_PER_KEY = 500
+
+def generate_external(keys_file, options, fo, Hash=IntSaltHash,
+                      template=None, memory_limit=2 ** 30, fingerprint=0,
+                      config=None):
+    """
+    Generate a sharded hash (see generate_sharded_hash()) for the keys in
+    'keys_file' without ever holding all keys in memory, and write the
+    substituted 'template' to the file object 'fo'.  The keys are read
+    from disk in a stream and partitioned into temporary files by the first
+    level hash.  The partitions, whose size is chosen such that building
+    their graph stays below 'memory_limit' bytes, are then built one by one.
+    ValueError is raised when 'memory_limit' is below the cost of the
+    longest key (BYTES_PER_KEY plus its length).
     """
+    if config is None:
+        config = Config()
+    verbose = config.verbose
+    if fingerprint not in (0, 8, 16, 32):
+        raise ValueError("fingerprint has to be 8, 16 or 32 bits")
+    fmt = Format(width=options.width, indent=options.indent,
+                 delimiter=options.delimiter)
+
+    # first pass: count keys and find maximal key length
+    NK = NS = total = 0
+    for key in iter_table(keys_file, options):
+        n = len(key.encode())
+        NK += 1
+        NS = max(NS, n)
+        total += n
+    if not NK:
+        sys.exit("Error: no keys found in file `%s'." % keys_file)
+    if memory_limit < BYTES_PER_KEY + NS:
+        raise ValueError("memory limit of %d bytes is below the cost of a "
+                         "single key (%d bytes)" % (memory_limit,
+                                                     BYTES_PER_KEY + NS))
+
+    shard_size = max(1, memory_limit // (BYTES_PER_KEY + total // NK))
+    NSH = -(-NK // shard_size)  # number of shards
+    if verbose:
+        print("NK = %d, shard size = %d, NSH = %d" % (NK, shard_size, NSH))
+    if shard_size > 10000 and Hash == StrSaltHash:
+        print("WARNING: Using --hft=1 is likely to fail for %d keys "
+              "per shard." % shard_size)
+
+    f0 = config.new_hash(Hash, NSH)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        # second pass: partition keys (with their hash value) into files
+        paths = [join(tmpdir, '%d.keys' % s) for s in range(NSH)]
+        for path in paths:
+            open(path, 'w').close()
+        bufs = [[] for s in range(NSH)]
+        dirty = set()  # shards with buffered keys
+        buffered = 0
+        for hashval, key in enumerate(iter_table(keys_file, options)):
+            s = f0(key)
+            bufs[s].append('%d\t%s\n' % (hashval, key))
+            dirty.add(s)
+            buffered += 1
+            if buffered > shard_size // 4 or hashval == NK - 1:
+                # only the shards written to are visited, such that
+                # partitioning takes O(NK) time, independent of NSH
+                for s in dirty:
+                    with open(paths[s], 'a', encoding='utf-8') as f:
+                        f.writelines(bufs[s])
+                    del bufs[s][:]
+                dirty.clear()
+                buffered = 0
+        pad_salt(f0, NS)
+
+        # build graph for each partition, and store its vertex values
+        GO = [0]  # offsets of the shards in G
+        S1, S2 = [], []
+        for s, path in enumerate(paths):
+            keys, hashvals = [], []
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    hashval, key = line.rstrip('\n').split('\t', 1)
+                    keys.append(key)
+                    hashvals.append(int(hashval))
+            if len(keys) != len(set(keys)):
+                raise ValueError("duplicate keys")
+            if verbose:
+                print("shard %d: %d keys" % (s, len(keys)))
+
+            f1, f2, G = find_graph(keys, hashvals, NK, Hash, False, config)
+            for hashval, key in zip(hashvals, keys):
+                assert hashval == (G[f1(key)] + G[f2(key)]) % NK
+            pad_salt(f1, NS)
+            pad_salt(f2, NS)
+            S1.append(f1.salt)
+            S2.append(f2.salt)
+            GO.append(GO[-1] + len(G))
+            with open(path + '.G', 'w') as f:
+                f.write(' '.join(str(v) for v in G))
+            del keys, hashvals, G
+
+        def iter_G():
+            for path in paths:
+                with open(path + '.G') as f:
+                    for v in f.read().split():
+                        yield int(v)
+
+        params = {}
+        if fingerprint:
+            FS = config.random.getrandbits(32)
+
+            def write_FP(fo):
+                fmt.write(fo, (key_fingerprint(key, FS, fingerprint)
+                               for key in iter_table(keys_file, options)))
+
+            params.update(FB = fingerprint, FS = FS, FP = write_FP)
+
+        if template is None:
+            template = builtin_template(Hash, True, bool(fingerprint))
+
+        substitute(fo, template, dict(params,
+            NS = NS,
+            NSH = NSH,
+            GO = fmt(GO),
+            S0 = fmt(f0.salt),
+            S1 = fmt(concat(S1)),
+            S2 = fmt(concat(S2)),
+            NG = GO[-1],
+            G = lambda fo: fmt.write(fo, iter_G()),
+            NK = NK,
+            K = lambda fo: fmt.write(fo, iter_table(keys_file, options),
+                                     quote=True)))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    if verbose:
+        print('OK')
+
+
+def parse_columns(s):
+    """
+    Return the column number given by the string 's', e.g. '2', or for a
+    comma separated list of columns (of composite keys), e.g. '1,3', the
+    tuple of column numbers.  As this is the type of --keycol, invalid
+    columns raise argparse.ArgumentTypeError, whose message argparse shows.
+    """
+    from argparse import ArgumentTypeError
+
+    try:
+        cols = [int(c) for c in s.split(',')]
+    except ValueError:
+        raise ArgumentTypeError("column numbers have to be integers: %r" % s)
+    if any(c < 1 for c in cols):
+        raise ArgumentTypeError("column numbers start at 1: %r" % s)
+    return cols[0] if len(cols) == 1 else tuple(cols)
+
+
+def iter_table(filename, options, col=None):
+    """
+    Iterate over the keys in a file, see read_table().  As the keys are
+    never all held in memory, this can be used for very large files.
+    When 'col' is given, the items in this column are returned instead
+    of the keys.
+    """
+    verbose = getattr(options, 'verbose', False)
     if verbose:
         print("Reading table from file `%s' to extract keys." % filename)
     try:
@@ -411,32 +3022,43 @@ def read_table(filename, options):
     except IOError:
         sys.exit("Error: Could not open `%s' for reading." % filename)
 
-    keys = []
-
     if verbose:
         print("Reader options:")
         for name in 'comment', 'splitby', 'keycol':
             print('  %s: %r' % (name, getattr(options, name)))
 
-    for n, line in enumerate(fi):
-        line = line.strip()
-        if not line or line.startswith(options.comment):
-            continue
+    with fi:
+        for n, line in enumerate(fi):
+            line = line.strip()
+            if not line or line.startswith(options.comment):
+                continue
 
-        if line.count(options.comment): # strip content after comment
-            line = line.split(options.comment)[0].strip()
+            if line.count(options.comment): # strip content after comment
+                line = line.split(options.comment)[0].strip()
 
-        row = [col.strip() for col in line.split(options.splitby)]
+            row = [col.strip() for col in line.split(options.splitby)]
 
-        try:
-            key = row[options.keycol - 1]
-        except IndexError:
-            sys.exit("%s:%d: Error: Cannot read key, not enough columns." %
-                     (filename, n + 1))
+            try:
+                if col is None and isinstance(options.keycol, tuple):
+                    key = tuple(row[c - 1] for c in options.keycol)
+                else:
+                    key = row[(col or options.keycol) - 1]
+            except IndexError:
+                sys.exit("%s:%d: Error: Cannot read %s, not enough columns."
+                         % (filename, n + 1, 'value' if col else 'key'))
+
+            yield key
 
-        keys.append(key)
 
-    fi.close()
+def read_table(filename, options):
+    """
+    Reads keys and desired hash value pairs from a file.  If no column
+    for the hash value is specified, a sequence of hash values is generated,
+    from 0 to N-1, where N is the number of rows found in the file.
+    When 'options.keycol' is a tuple of columns, the keys are tuples of
+    the fields in these columns (composite keys).
+    """
+    keys = list(iter_table(filename, options))
 
     if not keys:
         exit("Error: no keys found in file `%s'." % filename)
@@ -445,18 +3067,17 @@ def read_table(filename, options):
 
 
 def read_template(path):
-    if verbose:
-        print("Reading template from path: %r" % path)
-
     with open(path, 'r') as fi:
         return fi.read()
 
 
-def run_code(code):
+def run_code(code, sidecar=None):
     tmpdir = tempfile.mkdtemp()
     path = join(tmpdir, 't.py')
     with open(path, 'w') as fo:
         fo.write(code)
+    if sidecar:
+        shutil.copy(sidecar, tmpdir)
     try:
         subprocess.check_call([sys.executable, path])
     except subprocess.CalledProcessError as e:
@@ -465,7 +3086,30 @@ def run_code(code):
         shutil.rmtree(tmpdir)
 
 
-def main():
+def read_manifest(filename):
+    """
+    Reads a batch manifest.  Each non-empty line of the manifest (which is
+    not a comment) contains the command line arguments for one table, e.g.
+    `keys.dat keys.tmpl.h -o keys.code.h --hft=2`.  Returns a list of
+    tuples (line number, argument list).
+    """
+    import shlex
+
+    try:
+        fi = open(filename)
+    except IOError:
+        sys.exit("Error: Could not open `%s' for reading." % filename)
+
+    res = []
+    with fi:
+        for n, line in enumerate(fi):
+            argv = shlex.split(line, comments=True)
+            if argv:
+                res.append((n + 1, argv))
+    return res
+
+
+def build_parser(prog=None):
     import argparse
 
     description = """\
@@ -476,10 +3120,11 @@ is processed and the output code is written to stdout.
 """
 
     p = argparse.ArgumentParser(
+        prog=prog,
         description=description,
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
-    p.add_argument('KEYS_FILE', nargs=1,
+    p.add_argument('KEYS_FILE', nargs="?",
                    help="file containing keys for perfect hash function")
 
     p.add_argument('TMPL_FILE', nargs="?",
@@ -509,9 +3154,14 @@ is processed and the output code is written to stdout.
                         "in the input KEYS_FILE are split.",
                    metavar="STR")
 
-    p.add_argument("--keycol", action="store", default=1, type=int,
+    p.add_argument("--keycol", action="store", default=1,
+                   type=parse_columns,
                    help="Specifies the column INT in the input "
-                        "KEYS_FILE which contains the keys.",
+                        "KEYS_FILE which contains the keys.  For composite "
+                        "keys, several comma separated columns (e.g. 1,3) "
+                        "are given, whose fields are hashed and compared "
+                        "separately, without joining them.  Composite keys "
+                        "require --hft=1 or --hft=2.",
                    metavar="INT")
 
     p.add_argument("--trials", action="store", default=50, type=int,
@@ -523,12 +3173,160 @@ is processed and the output code is written to stdout.
 
     p.add_argument("--hft", action="store", default=1, type=int,
                    help="Hash function type INT.  Possible values "
-                        "are 1 (StrSaltHash) and 2 (IntSaltHash).",
+                        "are 1 (StrSaltHash), 2 (IntSaltHash) and "
+                        "3 (IntKeyHash, for integer keys).",
                    metavar="INT")
 
     p.add_argument("--pow2", action="store_true",
                    help="Only use powers of 2 for graph size NG.")
 
+    p.add_argument("--compact", action="store_true",
+                   help="Generate a Python module which stores G and the "
+                        "keys as binary data, such that import time does "
+                        "not depend on the number of keys.  The sanity "
+                        "check only runs when the module is executed.")
+
+    p.add_argument("--sidecar", action="store_true",
+                   help="Together with --compact, store the binary data in "
+                        "a separate file (the output filename with the "
+                        "extension '.bin'), which is memory mapped on "
+                        "import.  Requires -o.")
+
+    p.add_argument("--seed", action="store", type=int,
+                   help="Seed of the random number generator, such that "
+                        "the output is reproducible.")
+
+    p.add_argument("--fastrange", action="store_true",
+                   help="Reduce hash values to range(NG) using "
+                        "multiply-high instead of modulo NG, such that "
+                        "lookups need no division, for any NG.  "
+                        "Requires --hft=1 or --hft=2.")
+
+    p.add_argument("--shard-size", action="store", default=0, type=int,
+                   help="Generate a two-level hash, where the keys are "
+                        "split into shards of about INT keys, whose graphs "
+                        "are built in parallel.  0 means no sharding.",
+                   metavar="INT")
+
+    p.add_argument("--memory-limit", action="store",
+                   help="Generate a sharded hash for a key file which is "
+                        "too large to be processed in memory.  The keys "
+                        "are partitioned into temporary files, whose size "
+                        "is chosen such that building each partition "
+                        "uses less than SIZE bytes, e.g. `512M` or `4G`.",
+                   metavar="SIZE")
+
+    p.add_argument("--fingerprint", action="store", default=0, type=int,
+                   choices=[0, 8, 16, 32],
+                   help="Also generate an array FP of INT bit fingerprints "
+                        "of the keys, which templates may use to reject "
+                        "non-member keys, instead of comparing them with "
+                        "the keys K.  The probability of accepting a "
+                        "non-member key is 2**-INT.  0 means no "
+                        "fingerprints.",
+                   metavar="INT")
+
+    p.add_argument("--extension", action="store",
+                   help="Instead of filling a template, generate a CPython "
+                        "extension module NAME (in NAME.c, unless -o is "
+                        "given) for looking up keys, and a setup script "
+                        "setup_NAME.py for building it.",
+                   metavar="NAME")
+
+    p.add_argument("--valcol", action="store", type=int,
+                   help="Specifies the column INT in the input KEYS_FILE "
+                        "which contains the values of the keys, which are "
+                        "returned by lookups in the extension module.  "
+                        "By default, lookups return the index of keys.",
+                   metavar="INT")
+
+    p.add_argument("--prefilter", action="store", default=0, type=int,
+                   help="Generate filters for rejecting most non-member "
+                        "keys before hashing, within a size budget of INT "
+                        "bytes: bitmaps of the key lengths, and of the "
+                        "first and last bytes of the keys (at least 65 "
+                        "bytes), and with the remaining bytes, a Bloom "
+                        "filter.",
+                   metavar="INT")
+
+    p.add_argument("--tablecol", action="store", type=int,
+                   help="Specifies the column INT in the input KEYS_FILE "
+                        "which contains the name of the table of each key.  "
+                        "One perfect hash is generated for the keys of all "
+                        "tables (which may contain equal keys), where the "
+                        "keys are tagged by their table.",
+                   metavar="INT")
+
+    p.add_argument("--freqcol", action="store", type=int,
+                   help="Specifies the column INT in the input KEYS_FILE "
+                        "which contains the access frequency of the keys.  "
+                        "Keys are then ordered by decreasing frequency "
+                        "(i.e. hash values are the ranks of the "
+                        "frequencies), such that frequent keys are "
+                        "adjacent in K, and of several solutions, the one "
+                        "in which frequent keys access the fewest cache "
+                        "lines of G is chosen.  Cannot be used with "
+                        "--minimize, --blocked or sharded hashes.",
+                   metavar="INT")
+
+    p.add_argument("--stats", action="store_true",
+                   help="Instrument the builtin template (or the extension "
+                        "module) with counters of the outcomes of lookups, "
+                        "i.e. hits, and keys rejected by the prefilter, the "
+                        "length check or the final comparison, which are "
+                        "returned by the function stats().  The C header "
+                        "(--lang=c) is not instrumented, so --stats cannot "
+                        "be used together with --lang=c.")
+
+    p.add_argument("--scanner", action="store",
+                   help="Generate the parameter CC for a keyword scanner, "
+                        "which finds the identifiers (maximal runs of "
+                        "characters in the character class CLASS, e.g. "
+                        "'A-Za-z0-9_') in a buffer, and looks them up in "
+                        "the same pass.  The builtin template includes "
+                        "such a scanner.  Requires --hft=1 or --hft=2.",
+                   metavar="CLASS")
+
+    p.add_argument("--lang", action="store", default="python",
+                   choices=["python", "c"],
+                   help="Language of the builtin template (default: "
+                        "python).  The builtin C template is a header "
+                        "defining get_index(key, len), which looks up the "
+                        "len bytes at key (not necessarily NUL "
+                        "terminated), e.g. a slice of a buffer.  "
+                        "C requires --hft=1 or --hft=2.")
+
+    p.add_argument("--unroll", action="store_true",
+                   help="Generate unrolled hash functions in the builtin "
+                        "template: for each length of the keys, the bytes "
+                        "are hashed without a loop, using the salts as "
+                        "constants, and in C, only keys of that length are "
+                        "compared.  Meant for small tables of short keys.  "
+                        "Requires --hft=1 or --hft=2.")
+
+    p.add_argument("--quality", action="store", default=0, type=int,
+                   help="Instead of generating code, measure the quality of "
+                        "the hash functions (selected by --hft and "
+                        "--fastrange) for the keys, using INT random graphs "
+                        "for each ratio NG/NK: uniformity, collisions and "
+                        "the fraction of acyclic graphs.  A report is "
+                        "printed, and written as JSON to the output file, "
+                        "if given.  0 means no measurement.",
+                   metavar="INT")
+
+    p.add_argument("--minimize", action="store", default=0, type=float,
+                   help="Search for the smallest array G, using at most "
+                        "SECONDS.  Starting from the first solution found, "
+                        "smaller sizes NG are tried using --jobs worker "
+                        "processes.  0 means no search.",
+                   metavar="SECONDS")
+
+    p.add_argument("--blocked", action="store_true",
+                   help="Generate a cache local hash, where G consists "
+                        "of blocks of 16 integers (64 bytes), and both "
+                        "vertices of each key are within one block.  "
+                        "Requires --hft=2.")
+
     p.add_argument("-e", "--execute", action="store_true",
                    help="execute generated code within Python interpreter")
 
@@ -541,58 +3339,338 @@ is processed and the output code is written to stdout.
                         "substituting `tmpl` with `code`.",
                    metavar="FILE")
 
+    p.add_argument("--batch", action="store",
+                   help="Generate all tables listed in the manifest FILE, "
+                        "instead of a single KEYS_FILE.  Each line of the "
+                        "manifest contains the command line arguments "
+                        "for one table.  Tables whose inputs did not change "
+                        "since the last batch run are skipped.",
+                   metavar="FILE")
+
+    p.add_argument("-j", "--jobs", action="store", type=int,
+                   help="Number of worker processes used in batch mode, "
+                        "and for building shards.  "
+                        "By default, the number of CPUs is used.",
+                   metavar="INT")
+
     p.add_argument("-v", "--verbose", action="store_true")
     p.add_argument("-V", "--version", action="version",
                    version="perfect-hash version: %s" % __version__)
 
-    args = p.parse_args()
+    return p
+
 
+def check_args(p, args):
+    """
+    Check the parsed arguments 'args', and report errors using the
+    parser 'p'.  Returns the hash function generator selected by --hft.
+    """
     if args.trials <= 0:
         p.error("trials before increasing N has to be larger than zero")
 
-    global trials, verbose
-    trials = args.trials
-    verbose = args.verbose
-
     if args.TMPL_FILE and 'tmpl' not in args.TMPL_FILE:
         p.error("template filename does not contain 'tmpl'")
 
+    if args.shard_size < 0:
+        p.error("shard size cannot be negative")
+
+    if args.minimize < 0:
+        p.error("time for --minimize cannot be negative")
+
+    if args.minimize and args.shard_size:
+        p.error("--minimize cannot be used together with --shard-size")
+
+    if args.pow2 and args.shard_size:
+        p.error("--pow2 cannot be used together with --shard-size")
+
+    if args.memory_limit:
+        try:
+            args.memory_limit = parse_size(args.memory_limit)
+        except ValueError:
+            p.error("invalid memory limit: %r" % args.memory_limit)
+        if args.memory_limit < BYTES_PER_KEY:
+            p.error("memory limit has to be at least %d bytes (per key)" %
+                    BYTES_PER_KEY)
+        for opt in 'pow2', 'shard_size', 'minimize', 'execute':
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with --memory-limit" %
+                        opt.replace('_', '-'))
+
+    if args.extension:
+        if not args.extension.isidentifier():
+            p.error("invalid extension module name: %r" % args.extension)
+        if args.TMPL_FILE:
+            p.error("TMPL_FILE cannot be used together with --extension")
+        if args.hft not in (1, 2):
+            p.error("--extension requires --hft=1 or --hft=2")
+        for opt in ('pow2', 'shard_size', 'memory_limit', 'fingerprint',
+                    'minimize', 'execute'):
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with --extension" %
+                        opt.replace('_', '-'))
+    elif args.valcol:
+        p.error("--valcol can only be used together with --extension")
+
+    if args.freqcol:
+        for opt in ('memory_limit', 'shard_size', 'minimize', 'blocked'):
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with --freqcol" %
+                        opt.replace('_', '-'))
+
+    if args.tablecol:
+        for opt in ('shard_size', 'memory_limit', 'fingerprint', 'extension',
+                    'freqcol', 'prefilter', 'blocked', 'compact'):
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with --tablecol" %
+                        opt.replace('_', '-'))
+        if args.hft == 3:
+            p.error("--tablecol cannot be used together with --hft=3")
+
+    if args.prefilter < 0:
+        p.error("size of --prefilter cannot be negative")
+    if args.prefilter:
+        for opt in 'memory_limit', 'extension':
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with --prefilter" %
+                        opt.replace('_', '-'))
+        if args.hft == 3:
+            p.error("--prefilter cannot be used together with --hft=3")
+        if args.prefilter < 65:
+            p.error("--prefilter has to be at least 65 bytes (the size of "
+                    "the bitmaps)")
+
+    if args.scanner is not None:
+        try:
+            char_class(args.scanner)
+        except ValueError as e:
+            p.error(str(e))
+        if args.hft not in (1, 2) or args.fastrange:
+            p.error("--scanner requires --hft=1 or --hft=2")
+        for opt in ('shard_size', 'memory_limit', 'extension', 'blocked',
+                    'compact', 'tablecol'):
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with --scanner" %
+                        opt.replace('_', '-'))
+
+    if args.lang == 'c':
+        if args.TMPL_FILE:
+            p.error("TMPL_FILE cannot be used together with --lang=c")
+        if args.hft not in (1, 2):
+            p.error("--lang=c requires --hft=1 or --hft=2")
+        for opt in ('shard_size', 'memory_limit', 'extension', 'blocked',
+                    'compact', 'tablecol', 'fingerprint', 'scanner',
+                    'stats', 'execute'):
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with --lang=c" %
+                        opt.replace('_', '-'))
+
+    if args.unroll:
+        if args.TMPL_FILE:
+            p.error("TMPL_FILE cannot be used together with --unroll")
+        if args.hft not in (1, 2):
+            p.error("--unroll requires --hft=1 or --hft=2")
+        for opt in ('shard_size', 'memory_limit', 'extension', 'blocked',
+                    'compact', 'tablecol', 'stats'):
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with --unroll" %
+                        opt.replace('_', '-'))
+
+    if args.quality < 0:
+        p.error("number of samples of --quality cannot be negative")
+    if args.quality:
+        if args.TMPL_FILE:
+            p.error("TMPL_FILE cannot be used together with --quality")
+        for opt in ('memory_limit', 'extension', 'execute', 'shard_size',
+                    'blocked', 'tablecol'):
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with --quality" %
+                        opt.replace('_', '-'))
+
+    if args.stats:
+        if args.TMPL_FILE:
+            p.error("TMPL_FILE cannot be used together with --stats")
+        if args.memory_limit:
+            p.error("--memory-limit cannot be used together with --stats")
+
+    if args.compact:
+        if args.TMPL_FILE:
+            p.error("TMPL_FILE cannot be used together with --compact")
+        for opt in 'memory_limit', 'extension':
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with --compact" %
+                        opt.replace('_', '-'))
+        if args.hft == 3:
+            p.error("--compact cannot be used together with --hft=3")
+    if args.sidecar:
+        if not args.compact:
+            p.error("--sidecar can only be used together with --compact")
+        if args.output in (None, 'std', 'no'):
+            p.error("--sidecar requires an output file (-o)")
+
+    if args.blocked:
+        if args.hft != 2:
+            p.error("--blocked requires --hft=2")
+        for opt in ('pow2', 'shard_size', 'memory_limit', 'minimize',
+                    'extension'):
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with --blocked" %
+                        opt.replace('_', '-'))
+
+    if isinstance(args.keycol, tuple):
+        if args.hft not in (1, 2) or args.fastrange:
+            p.error("composite keys require --hft=1 or --hft=2")
+        for opt in ('shard_size', 'memory_limit', 'extension', 'blocked',
+                    'compact', 'tablecol', 'fingerprint', 'prefilter',
+                    'scanner', 'unroll'):
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with composite keys" %
+                        opt.replace('_', '-'))
+        return StrSaltCompositeHash if args.hft == 1 else IntSaltCompositeHash
+
+    if args.fastrange:
+        if args.hft not in (1, 2):
+            p.error("--fastrange requires --hft=1 or --hft=2")
+        for opt in ('pow2', 'shard_size', 'memory_limit', 'blocked',
+                    'extension'):
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with --fastrange" %
+                        opt.replace('_', '-'))
+        return StrSaltFastHash if args.hft == 1 else IntSaltFastHash
+
     if args.hft == 1:
-        Hash = StrSaltHash
+        return StrSaltHash
     elif args.hft == 2:
-        Hash = IntSaltHash
+        return IntSaltHash
+    elif args.hft == 3:
+        for opt in 'shard_size', 'memory_limit', 'fingerprint', 'extension':
+            if getattr(args, opt):
+                p.error("--%s cannot be used together with --hft=3" %
+                        opt.replace('_', '-'))
+        return IntKeyHash
     else:
         p.error("Hash function %s not implemented." % args.hft)
 
-    # --------------------- end parsing and checking --------------
 
-    keys_file = args.KEYS_FILE[0]
-    if verbose:
-        print("keys_file = %r" % keys_file)
+def output_name(args):
+    if args.output:
+        return args.output
+    elif args.extension:
+        return args.extension + '.c'
+    elif args.TMPL_FILE:
+        return args.TMPL_FILE.replace('tmpl', 'code')
+    else:
+        return 'std'
 
-    keys = read_table(keys_file, args)
+
+def generate_output(args, Hash):
+    """
+    Reads the keys and template given by 'args', and writes the generated
+    code to the output file.
+    """
+    config = Config(args.trials, args.verbose, args.seed)
+    verbose = config.verbose
+
+    keys_file = args.KEYS_FILE
     if verbose:
-        print("Number of keys: %d" % len(keys))
+        print("keys_file = %r" % keys_file)
 
     tmpl_file = args.TMPL_FILE
     if verbose:
         print("tmpl_file = %r" % tmpl_file)
 
-    template = read_template(tmpl_file) if tmpl_file else None
-
-    if args.output:
-        outname = args.output
-    elif tmpl_file:
-        if 'tmpl' not in tmpl_file:
-            sys.exit("Hmm, template filename does not contain 'tmpl'")
-        outname = tmpl_file.replace('tmpl', 'code')
-    else:
-        outname = 'std'
+    template = None
+    if tmpl_file:
+        if verbose:
+            print("Reading template from path: %r" % tmpl_file)
+        template = read_template(tmpl_file)
 
+    outname = output_name(args)
     if verbose:
         print("outname = %r\n" % outname)
 
-    code = generate_code(keys, Hash, template, args, args.pow2)
+    if args.memory_limit:
+        try:
+            if outname == 'std':
+                generate_external(keys_file, args, sys.stdout, Hash,
+                                  template, args.memory_limit,
+                                  args.fingerprint, config)
+            else:
+                with open(os.devnull if outname == 'no' else outname,
+                          'w') as fo:
+                    generate_external(keys_file, args, fo, Hash, template,
+                                      args.memory_limit, args.fingerprint,
+                                      config)
+        except ValueError as e:
+            sys.exit("Error: %s" % e)
+        return
+
+    keys = read_table(keys_file, args)
+    if verbose:
+        print("Number of keys: %d" % len(keys))
+
+    if getattr(Hash, 'key_type', str) is int:
+        try:
+            keys = [int(key, 0) for key in keys]
+        except ValueError as e:
+            sys.exit("Error: %s" % e)
+
+    if args.quality:
+        import json
+
+        quality = hash_quality(keys, Hash, samples=args.quality,
+                               config=config)
+        sys.stdout.write(quality_report(quality))
+        if outname not in ('std', 'no'):
+            with open(outname, 'w') as fo:
+                json.dump(quality, fo, indent=2)
+                fo.write('\n')
+        return
+
+    tables = None
+    if args.tablecol:
+        tables = list(iter_table(keys_file, args, args.tablecol))
+
+    freqs = None
+    if args.freqcol:
+        try:
+            freqs = [float(f) for f in iter_table(keys_file, args,
+                                                  args.freqcol)]
+        except ValueError as e:
+            sys.exit("Error: invalid frequency: %s" % e)
+
+    if args.extension:
+        values = None
+        if args.valcol:
+            values = list(iter_table(keys_file, args, args.valcol))
+        code = generate_extension(keys, args.extension, values,
+                                  options=args, config=config, freqs=freqs,
+                                  stats=args.stats, Hash=Hash)
+        if outname == 'std':
+            sys.stdout.write(code)
+        elif outname != 'no':
+            with open(outname, 'w') as fo:
+                fo.write(code)
+            setup_path = join(os.path.dirname(outname),
+                              'setup_%s.py' % args.extension)
+            with open(setup_path, 'w') as fo:
+                fo.write(extension_setup(args.extension,
+                                         os.path.basename(outname)))
+        return
+
+    sidecar = None
+    if args.sidecar:
+        sidecar = os.path.splitext(outname)[0] + '.bin'
+    try:
+        code = generate_code(
+            keys, Hash, template, options=args, pow2=args.pow2,
+            shard_size=args.shard_size, jobs=args.jobs,
+            fingerprint=args.fingerprint, minimize=args.minimize,
+            blocked=args.blocked, compact=args.compact, sidecar=sidecar,
+            config=config, freqs=freqs, prefilter=args.prefilter,
+            tables=tables, scanner=args.scanner, stats=args.stats,
+            lang=args.lang, unroll=args.unroll)
+    except ValueError as e:
+        sys.exit("Error: %s" % e)
 
     if outname == 'std':
         sys.stdout.write(code)
@@ -603,8 +3681,137 @@ is processed and the output code is written to stdout.
     if args.execute:
         if verbose:
             print('Executing code...\n')
-        run_code(code)
+        run_code(code, sidecar)
+
+
+def input_digest(args, argv):
+    """
+    Return a digest of everything the output of a batch table depends on:
+    the command line arguments, the keys file and the template file.
+    None is returned when an input file cannot be read.
+    """
+    import hashlib
+
+    h = hashlib.sha256()
+    h.update(('%s\0%r\0' % (__version__, argv)).encode())
+    for path in args.KEYS_FILE, args.TMPL_FILE:
+        if path:
+            try:
+                with open(path, 'rb') as fi:
+                    h.update(fi.read())
+            except IOError:
+                return None
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def _batch_job(args, Hash):
+    t0 = time.time()
+    generate_output(args, Hash)
+    return time.time() - t0
+
+
+def run_batch(manifest, jobs=None):
+    """
+    Generate all tables listed in the file 'manifest' concurrently, using a
+    pool of 'jobs' processes.  Tables whose inputs are unchanged since the
+    last run (as recorded in the file 'manifest'.cache) are skipped.
+    Returns a list of tuples (output name, time in seconds or None when
+    skipped, error message or None).
+    """
+    import json
+    from concurrent.futures import ProcessPoolExecutor
+
+    tables = []
+    for n, argv in read_manifest(manifest):
+        p = build_parser(prog='%s:%d' % (manifest, n))
+        args = p.parse_args(argv)
+        if args.batch:
+            p.error("nested --batch not allowed")
+        if not args.KEYS_FILE:
+            p.error("KEYS_FILE missing")
+        Hash = check_args(p, args)
+        if output_name(args) == 'std':
+            p.error("output file (or template file) required in batch mode")
+        tables.append((args, Hash, input_digest(args, argv)))
+
+    cache_path = manifest + '.cache'
+    try:
+        with open(cache_path) as fi:
+            cache = json.load(fi)
+    except (IOError, ValueError):
+        cache = {}
+
+    results = []
+    t0 = time.time()
+    with ProcessPoolExecutor(jobs) as executor:
+        futures = []
+        for args, Hash, digest in tables:
+            outname = output_name(args)
+            if (digest and outname != 'no' and cache.get(outname) == digest
+                                              and os.path.exists(outname)):
+                futures.append(None)
+            else:
+                futures.append(executor.submit(_batch_job, args, Hash))
+
+        for (args, Hash, digest), future in zip(tables, futures):
+            outname = output_name(args)
+            if future is None:
+                results.append((outname, None, None))
+                continue
+            try:
+                results.append((outname, future.result(), None))
+            except (Exception, SystemExit) as e:
+                cache.pop(outname, None)
+                results.append((outname, None, str(e) or repr(e)))
+            else:
+                cache[outname] = digest
+
+    with open(cache_path, 'w') as fo:
+        json.dump(cache, fo, indent=2, sort_keys=True)
+
+    for outname, seconds, error in results:
+        if error:
+            print('  FAILED  %s: %s' % (outname, error))
+        elif seconds is None:
+            print(' skipped  %s' % outname)
+        else:
+            print('%7.3fs  %s' % (seconds, outname))
+    print('total: %.3fs (%d tables, %d skipped, %d failed)' % (
+        time.time() - t0, len(results),
+        sum(s is None and e is None for o, s, e in results),
+        sum(e is not None for o, s, e in results)))
+
+    return results
+
+
+def main():
+    p = build_parser()
+    args = p.parse_args()
+
+    if args.jobs is not None and args.jobs <= 0:
+        p.error("number of jobs has to be larger than zero")
+
+    if args.batch:
+        if args.KEYS_FILE:
+            p.error("KEYS_FILE cannot be used together with --batch")
+        results = run_batch(args.batch, args.jobs)
+        if any(error for outname, seconds, error in results):
+            return 1
+        return
+
+    if not args.KEYS_FILE:
+        p.error("the following arguments are required: KEYS_FILE")
+
+    Hash = check_args(p, args)
+
+    # --------------------- end parsing and checking --------------
+
+    try:
+        generate_output(args, Hash)
+    except TooManyInterationsError as e:
+        sys.exit("Error: %s" % e)
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -1,6 +1,11 @@
+import os
 import sys
+import contextlib
 import random
+import shutil
 import string
+import tempfile
+import subprocess
 import unittest
 
 
@@ -8,7 +13,20 @@ from perfect_hash import (
     anum_chars,
     generate_hash, Graph, Format, StrSaltHash, IntSaltHash,
     generate_code, run_code, builtin_template, TooManyInterationsError,
+    read_manifest, run_batch, generate_sharded_hash, generate_external,
+    build_parser, substitute, parse_size, key_fingerprint,
+    c_string, generate_extension, extension_setup,
+    UnsolvableError, preflight, expected_trials, IntKeyHash,
+    minimize_hash, generate_blocked_hash, block_vertices,
+    StrSaltFastHash, IntSaltFastHash, typecode, compact_arrays,
+    Config, order_by_frequency, hot_footprint, generate_hot_hash,
+    prefilter_params, group_tables, key_blob_params,
+    generate_hash_async, graph_sizes, char_class, hash_quality,
+    quality_report, wrap_terms, StrSaltCompositeHash, IntSaltCompositeHash,
+    parse_columns, check_args, read_table, BYTES_PER_KEY,
 )
+from argparse import ArgumentTypeError
+from io import StringIO
 
 
 Hashes = StrSaltHash, IntSaltHash
@@ -68,6 +86,27 @@ class TestsFormat(unittest.TestCase):
         self.assertEqual(x(42), 42)
         self.assertEqual(x('Hello'), 'Hello')
 
+    def test_bytes_literal(self):
+        fmt = Format(width=20)
+        for data in b'', b"A'\\", bytes(range(256)):
+            lit = fmt.bytes_literal(data)
+            self.assertEqual(eval(lit), data)
+            for line in lit.splitlines():
+                self.assertTrue(len(line) <= 20)
+
+    def test_c_strings(self):
+        fmt = Format(width=20)
+        self.assertEqual(fmt.c_strings([]), '""')
+        self.assertEqual(fmt.c_strings(["ab", "c?", "defghijk"]),
+                         '"abc\\077"\n    "defghijk"')
+
+    def test_write(self):
+        x = Format(width=30)
+        data = list(range(100, 130))
+        aux = StringIO()
+        x.write(aux, iter(data))
+        self.assertEqual(aux.getvalue(), x(data))
+
 
 class TestsGenerateHash(unittest.TestCase):
 
@@ -111,7 +150,7 @@ class TestsGenerateHash(unittest.TestCase):
 
     def test_too_many_iterations(self):
 
-        def Hash(N):
+        def Hash(N, rng=None):
             # the returned hash function has no random salt
             return lambda key: hash(key) % N
 
@@ -120,6 +159,466 @@ class TestsGenerateHash(unittest.TestCase):
                           generate_hash, keys, Hash)
 
 
+class TestsConfig(unittest.TestCase):
+
+    def test_defaults(self):
+        config = Config()
+        self.assertEqual(config.trials, 50)
+        self.assertFalse(config.verbose)
+        self.assertEqual(config.grow(100), 105)
+        self.assertEqual(config.grow(10), 11)
+        self.assertEqual(Config(growth=2.0).grow(10), 20)
+
+    def test_new_hash(self):
+        config = Config(seed=1)
+        f = config.new_hash(IntSaltHash, 10)
+        self.assertTrue(f.rng is config.random)
+        self.assertTrue(IntSaltHash(10).rng is random)
+        self.assertTrue(isinstance(config.new_hash(PrefixHash, 10),
+                                   PrefixHash))
+
+    def test_reproducible(self):
+        keys = random_keys(200)
+        for Hash in Hashes + (StrSaltFastHash,):
+            codes = set(generate_code(keys, Hash, fingerprint=8,
+                                      config=Config(seed=123))
+                        for unused in range(2))
+            self.assertEqual(len(codes), 1)
+        keys = list(range(0, 2000, 10))
+        gen = lambda: generate_code(keys, IntKeyHash, config=Config(seed=5))
+        self.assertEqual(gen(), gen())
+
+    def test_global_seed(self):
+        # without a seed, the module random is used
+        self.assertTrue(Config().random is random)
+        keys = random_keys(100)
+        codes = set()
+        for unused in range(2):
+            random.seed(1)
+            codes.add(generate_code(keys))
+        self.assertEqual(len(codes), 1)
+
+    def test_sharded_jobs(self):
+        keys = random_keys(300)
+        codes = set(generate_code(keys, IntSaltHash, shard_size=50, jobs=j,
+                                  config=Config(seed=7)) for j in (1, 2))
+        self.assertEqual(len(codes), 1)
+
+    def test_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        keys = random_keys(100)
+        seeds = list(range(6))
+        gen = lambda seed: generate_code(keys, IntSaltHash,
+                                         config=Config(seed=seed))
+        with ThreadPoolExecutor(4) as executor:
+            concurrent = list(executor.map(gen, seeds))
+        self.assertEqual(concurrent, [gen(seed) for seed in seeds])
+
+
+class PrefixHash(object):
+    """
+    Hash function generator which only hashes the first 3 bytes of the key,
+    such that keys with the same prefix cannot be distinguished.
+    """
+    def __init__(self, N, rng=random):
+        self.N = N
+        self.salt = [rng.randrange(1, N) for i in range(3)]
+
+    def __call__(self, key):
+        return sum(s * c for s, c in zip(self.salt, key.encode())) % self.N
+
+
+class TestsPreflight(unittest.TestCase):
+
+    def test_expected_trials(self):
+        self.assertEqual(expected_trials(10, 20), float('inf'))
+        self.assertAlmostEqual(expected_trials(10, 40), 2 ** 0.5)
+        self.assertTrue(expected_trials(10, 1000) < 1.02)
+
+    def test_ok(self):
+        for Hash in Hashes + (PrefixHash,):
+            preflight(['Ilan', 'Arvin', 'A', 'B'], Hash)
+            preflight(random_keys(100), Hash)
+
+    def test_indistinguishable(self):
+        keys = ['Monday', 'Tuesday', 'Monkey', 'Mon', 'Tue', 'Wednesday']
+        with self.assertRaises(UnsolvableError) as cm:
+            preflight(keys, PrefixHash)
+        self.assertEqual(sorted(cm.exception.keys),
+                         [('Monday', 'Monkey', 'Mon'), ('Tuesday', 'Tue')])
+        self.assertTrue('5 keys' in str(cm.exception))
+
+        # generate_hash fails immediately, instead of increasing NG
+        self.assertRaises(TooManyInterationsError,
+                          generate_hash, keys, PrefixHash)
+
+    def test_loops(self):
+        def Hash(N, rng=None):
+            # f1 and f2 are the same function
+            return lambda key: len(key) % N
+
+        with self.assertRaises(UnsolvableError) as cm:
+            preflight(['A', 'BC'], Hash)
+        self.assertEqual(cm.exception.keys, [('A',), ('BC',)])
+
+
+class ConstHash(object):
+    """
+    The worst hash function generator.
+    """
+    def __init__(self, N, rng=None):
+        self.N = N
+
+    def __call__(self, key):
+        return 0
+
+
+class TestsQuality(unittest.TestCase):
+
+    def test_random(self):
+        rnd = random.Random(5)
+        keys = list(set(''.join(rnd.choices(anum_chars, k=rnd.randint(8, 12)))
+                        for unused in range(300)))
+        for Hash in Hashes + (StrSaltFastHash,):
+            quality = hash_quality(keys, Hash, samples=10,
+                                   config=Config(seed=2))
+            self.assertEqual(quality['NK'], 300)
+            self.assertEqual(len(quality['results']), 5)
+            for r in quality['results']:
+                self.assertTrue(0.8 < r['uniformity'] < 1.2)
+                self.assertTrue(0.7 < r['collisions'] < 1.3)
+                self.assertTrue(0.0 <= r['acyclic'] <= 1.0)
+            self.assertTrue(quality['results'][-1]['acyclic'] > 0)
+            self.assertEqual(quality, hash_quality(keys, Hash, samples=10,
+                                                   config=Config(seed=2)))
+
+    def test_const(self):
+        quality = hash_quality(['a', 'b', 'c'], ConstHash, ratios=(3.0,),
+                               samples=2)
+        r, = quality['results']
+        self.assertEqual(r['NG'], 9)
+        self.assertEqual(r['uniformity'], 3.0)  # (81 / 3 - 3) / 8
+        self.assertEqual(r['collisions'], 9.0)
+        self.assertEqual(r['loops'], 9.0)
+        self.assertEqual(r['acyclic'], 0.0)
+        self.assertEqual(r['trials'], None)
+        report = quality_report(quality)
+        self.assertTrue(report.startswith('ConstHash: 3 keys, 2 samples'))
+        self.assertTrue('inf' in report)
+
+    def test_few_keys(self):
+        quality = hash_quality(['a', 'b'], StrSaltHash, samples=2)
+        # the ratios 2.05, 2.1 and 2.25 all give NG = 4
+        self.assertEqual([(r['NG'], r['ratio']) for r in quality['results']],
+                         [(4, 2.0), (5, 2.5), (6, 3.0)])
+        r = quality['results'][0]
+        self.assertEqual((r['expected_acyclic'], r['expected_trials']),
+                         (None, None))
+        report = quality_report(quality)
+        self.assertTrue(' 2.00        4 ' in report)
+        self.assertTrue('(  n/a)' in report and '(    n/a)' in report)
+
+    def test_int_keys(self):
+        quality = hash_quality(list(range(0, 5000, 7)), IntKeyHash,
+                               ratios=(2.5,), samples=5,
+                               config=Config(seed=1))
+        self.assertTrue(0.5 < quality['results'][0]['uniformity'] < 2.0)
+        self.assertRaises(ValueError, hash_quality, ['a'], StrSaltHash)
+
+
+class TestsIntKeyHash(unittest.TestCase):
+
+    def random_keys(self, N):
+        keys = set()
+        while len(keys) < N:
+            keys.add(random.choice([random.randint(-1000, 1000),
+                                    random.getrandbits(32),
+                                    random.getrandbits(64)]))
+        return list(keys)
+
+    def test_hash_many(self):
+        keys = self.random_keys(100) + [-2 ** 63, 2 ** 64 - 1]
+        f = IntKeyHash(1000)
+        self.assertEqual(f.hash_many(keys), [f(k) for k in keys])
+        self.assertTrue(all(0 <= h < 1000 for h in f.hash_many(keys)))
+
+    def test_args(self):
+        self.assertRaises(TypeError, generate_hash, ["A"], IntKeyHash)
+        self.assertRaises(TypeError, generate_hash, [1], StrSaltHash)
+        self.assertRaises(ValueError, generate_hash, [2 ** 64], IntKeyHash)
+        # -1 and 2**64 - 1 are the same 64-bit word
+        with self.assertRaises(ValueError) as cm:
+            generate_hash([-1, 5, 2 ** 64 - 1], IntKeyHash)
+        self.assertTrue('duplicate keys' in str(cm.exception))
+        self.assertRaises(ValueError, generate_code, [1, 2], IntKeyHash,
+                          fingerprint=8)
+
+    def test_random(self):
+        for N in range(0, 100, 7):
+            keys = self.random_keys(N)
+            f1, f2, G = generate_hash(keys, IntKeyHash)
+            for i, k in enumerate(keys):
+                self.assertEqual(i, (G[f1(k)] + G[f2(k)]) % len(G))
+        flush_dot()
+
+    def test_code(self):
+        run_code(generate_code(self.random_keys(100), IntKeyHash))
+        run_code(generate_code(self.random_keys(100), IntKeyHash, pow2=True))
+
+
+class TestsFastRange(unittest.TestCase):
+
+    def test_range(self):
+        for Hash in StrSaltFastHash, IntSaltFastHash:
+            for N in 1, 7, 1000, 2 ** 31 + 11:
+                f = Hash(N)
+                self.assertTrue(all(0 <= f(k) < N for k in random_keys(100)))
+
+    def test_random(self):
+        for Hash in StrSaltFastHash, IntSaltFastHash:
+            for N in range(0, 100, 7):
+                keys = random_keys(N)
+                f1, f2, G = generate_hash(keys, Hash)
+                for i, k in enumerate(keys):
+                    self.assertEqual(i, (G[f1(k)] + G[f2(k)]) % len(G))
+        flush_dot()
+
+    def test_code(self):
+        for Hash in StrSaltFastHash, IntSaltFastHash:
+            run_code(generate_code(random_keys(100), Hash))
+            run_code(generate_code(random_keys(100), Hash, fingerprint=8))
+            run_code(generate_code(random_keys(50), Hash, minimize=0.2,
+                                   jobs=1))
+            self.assertRaises(ValueError, generate_code, ["A"], Hash,
+                              shard_size=10)
+            # rejected before generating, also for user templates
+            with self.assertRaises(ValueError) as cm:
+                generate_code(random_keys(10000), Hash, "$G",
+                              shard_size=10)
+            self.assertTrue('fastrange' in str(cm.exception))
+
+
+class TestsHotKeys(unittest.TestCase):
+
+    def test_order(self):
+        self.assertEqual(order_by_frequency("ABCD", [1, 5, 1, 7]),
+                         [3, 1, 0, 2])
+        self.assertRaises(ValueError, order_by_frequency, "AB", [1])
+
+    def test_footprint(self):
+        f = lambda key: key
+        self.assertEqual(hot_footprint(f, f, [0, 1, 17], [4, 2, 1]), 5)
+        self.assertEqual(hot_footprint(f, f, [0, 1, 17], [4, 2, 1],
+                                       line_size=1), 7)
+        g = lambda key: key + 16
+        self.assertEqual(hot_footprint(f, g, [0, 17], [4, 2]), 10)
+
+    def test_random(self):
+        for N in range(0, 100, 7):
+            keys = random_keys(N)
+            freqs = sorted((random.random() for key in keys), reverse=True)
+            f1, f2, G = generate_hot_hash(keys, freqs, IntSaltHash)
+            for i, k in enumerate(keys):
+                self.assertEqual(i, (G[f1(k)] + G[f2(k)]) % len(G))
+        flush_dot()
+
+    def test_code(self):
+        keys = ["cold", "hot", "warm"]
+        code = generate_code(keys, freqs=[1, 100, 10])
+        self.assertTrue('K = ["hot", "warm", "cold"]' in code)
+        run_code(code)
+        run_code(generate_code(random_keys(100), IntSaltHash, compact=True,
+                               freqs=list(range(100))))
+        for kwds in (dict(minimize=0.1), dict(blocked=True),
+                     dict(shard_size=10)):
+            self.assertRaises(ValueError, generate_code, keys, IntSaltHash,
+                              freqs=[1, 100, 10], **kwds)
+        code = generate_extension(keys, 'temp', ["c", "h", "w"],
+                                  freqs=[1, 100, 10])
+        self.assertTrue('V[] = {"h", "w", "c"}' in code)
+
+
+class TestsMinimizeHash(unittest.TestCase):
+
+    def test_minimize(self):
+        keys = random_keys(100)
+        for Hash in Hashes + (IntKeyHash,):
+            if Hash is IntKeyHash:
+                keys = list(range(0, 1000, 10))
+            f1, f2, G = minimize_hash(keys, Hash, budget=0.5, jobs=2)
+            self.assertTrue(len(keys) <= len(G))
+            for i, k in enumerate(keys):
+                self.assertEqual(i, (G[f1(k)] + G[f2(k)]) % len(G))
+            flush_dot()
+
+    def test_bisection(self):
+        # the bisection starts between the first solution and 2 NK + 1
+        # (or NK + 1), and no NG <= NK is tried
+        NK = 100
+        for trials in 5, 50:
+            out = StringIO()
+            with contextlib.redirect_stdout(out):
+                minimize_hash(random_keys(NK), IntSaltHash, budget=0.3,
+                              jobs=1, config=Config(trials, True, 1))
+            lines = out.getvalue().split('\n')
+            hi = [int(line.split()[-1]) for line in lines
+                  if line.startswith('NG = ')][0]
+            tried = [int(line.split()[-2]) for line in lines
+                     if line.startswith('Trying NG = ')]
+            lo = 2 * NK + 1 if hi > 2 * NK + 1 else NK + 1
+            self.assertEqual(tried[0], (lo + hi) // 2 if lo < hi else hi - 1)
+            self.assertTrue(min(tried) > NK)
+
+    def test_pow2(self):
+        keys = random_keys(50)
+        f1, f2, G = minimize_hash(keys, budget=0.5, jobs=1, pow2=True)
+        self.assertTrue(len(G) in (64, 128))
+
+    def test_code(self):
+        run_code(generate_code(random_keys(50), minimize=0.2, jobs=1))
+        self.assertRaises(ValueError, generate_code, ["A"], minimize=1,
+                          shard_size=10)
+
+
+class TestsAsync(unittest.TestCase):
+
+    def run_async(self, keys, **kwds):
+        import asyncio
+        return asyncio.run(generate_hash_async(keys, **kwds))
+
+    def test_graph_sizes(self):
+        sizes = graph_sizes(10, False, Config(trials=2))
+        self.assertEqual([next(sizes) for i in range(6)],
+                         [11, 11, 12, 12, 13, 13])
+        sizes = graph_sizes(10, True, Config(trials=1))
+        self.assertEqual([next(sizes) for i in range(3)], [16, 32, 64])
+
+    def test_keys(self):
+        keys = random_keys(200)
+        trials = []
+        for Hash in Hashes:
+            f1, f2, G = self.run_async(keys, Hash=Hash, progress=lambda
+                                       trial, NG: trials.append(trial))
+            for hashval, key in enumerate(keys):
+                self.assertEqual(hashval, (G[f1(key)] + G[f2(key)]) % len(G))
+        self.assertTrue(0 in trials)
+
+    def test_reproducible(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        keys = random_keys(100)
+        G1 = self.run_async(keys, config=Config(seed=3))[2]
+        with ThreadPoolExecutor(2) as executor:
+            G2 = self.run_async(keys, config=Config(seed=3),
+                                executor=executor)[2]
+        self.assertEqual(G1, G2)
+
+    def test_timeout(self):
+        import asyncio
+        self.assertRaises(asyncio.TimeoutError, self.run_async,
+                          random_keys(100), timeout=0)
+
+    def test_cancel(self):
+        import asyncio
+
+        async def rebuild():
+            task = asyncio.current_task()
+            await generate_hash_async(random_keys(100), progress=lambda
+                                      trial, NG: task.cancel())
+
+        self.assertRaises(asyncio.CancelledError, asyncio.run, rebuild())
+
+    def test_unsolvable(self):
+        self.assertRaises(UnsolvableError, self.run_async, ['', 'a'],
+                          Hash=IntSaltHash)
+
+
+class TestsBlockedHash(unittest.TestCase):
+
+    def test_block_vertices(self):
+        for seed in range(100):
+            v1, v2 = block_vertices(random.getrandbits(32), seed)
+            self.assertTrue(0 <= v1 < 15 and 0 <= v2 < 15)
+            self.assertNotEqual(v1, v2)
+
+    def test_random(self):
+        for N in 0, 1, 2, 10, 100, 500:
+            keys = random_keys(N)
+            f1, f2, G = generate_blocked_hash(keys)
+            self.assertEqual(len(G), 16 * f1.N)
+            for i, k in enumerate(keys):
+                o = 16 * f1(k)
+                v1, v2 = block_vertices(f2(k), G[o])
+                self.assertEqual(i, (G[o + 1 + v1] + G[o + 1 + v2]) % N)
+            flush_dot()
+
+    def test_code(self):
+        run_code(generate_code(random_keys(200), IntSaltHash, blocked=True))
+        run_code(generate_code(random_keys(200), IntSaltHash, blocked=True,
+                               fingerprint=16))
+        self.assertRaises(ValueError, generate_code, ["A"], blocked=True)
+
+
+class TestsGenerateShardedHash(unittest.TestCase):
+
+    def create_and_verify(self, keys, Hash, shard_size, jobs=None):
+        f0, shards = generate_sharded_hash(keys, Hash, shard_size, jobs)
+        self.assertEqual(f0.N, len(shards))
+        self.assertEqual(len(shards), max(1, -(-len(keys) // shard_size)))
+        NS = len(f0.salt)
+        for f1, f2, G in shards:
+            self.assertTrue(f1.N == f2.N == len(G))
+            self.assertTrue(len(f1.salt) == len(f2.salt) == NS)
+
+        def f(k):
+            f1, f2, G = shards[f0(k)]
+            return (G[f1(k)] + G[f2(k)]) % len(keys)
+
+        for i, k in enumerate(keys):
+            self.assertEqual(i, f(k))
+        flush_dot()
+
+    def test_simple(self):
+        for Hash in Hashes:
+            self.create_and_verify(["Ilan", "Arvin"], Hash, 1)
+            self.create_and_verify([], Hash, 10)
+
+    def test_random(self):
+        for Hash in Hashes:
+            self.create_and_verify(random_keys(300), Hash, 50, jobs=1)
+            self.create_and_verify(random_keys(300), Hash, 100, jobs=2)
+
+    def test_code(self):
+        for Hash in Hashes:
+            run_code(generate_code(random_keys(200), Hash, shard_size=30))
+        self.assertRaises(ValueError, generate_code, ["A", "B"],
+                          pow2=True, shard_size=1)
+
+
+class TestsFingerprint(unittest.TestCase):
+
+    def test_fnv1a(self):
+        # FNV-1a test vectors, using the standard offset basis
+        self.assertEqual(key_fingerprint("", 2166136261, 32), 0x811c9dc5)
+        self.assertEqual(key_fingerprint("a", 2166136261, 32), 0xe40c292c)
+        self.assertEqual(key_fingerprint("foobar", 2166136261, 32),
+                         0xbf9cf968)
+        self.assertEqual(key_fingerprint("foobar", 2166136261, 16), 0xbf9c)
+        self.assertEqual(key_fingerprint("foobar", 2166136261, 8), 0xbf)
+
+    def test_code(self):
+        for Hash in Hashes:
+            for bits in 8, 16, 32:
+                code = generate_code(random_keys(50), Hash,
+                                     fingerprint=bits)
+                self.assertTrue('FP = [' in code)
+                run_code(code)
+            run_code(generate_code(random_keys(50), Hash, shard_size=10,
+                                   fingerprint=8))
+        self.assertRaises(ValueError, generate_code, ["A"], fingerprint=7)
+
+
 class TestsGenerateCode(unittest.TestCase):
 
     def test_args(self):
@@ -141,6 +640,658 @@ class TestsGenerateCode(unittest.TestCase):
             self.run_keys(random_keys(50), Hash)
 
 
+class TestsKeyBlob(unittest.TestCase):
+
+    def test_params(self):
+        p = key_blob_params(["a", "\u00a2", ""], Format())
+        self.assertEqual(p, dict(KD = r'"a\302\242"', KP = '0, 1, 3, 3',
+                                 KPB = 8))
+        self.assertEqual(key_blob_params(["a" * 300], Format())['KPB'], 16)
+        self.assertEqual(key_blob_params([], Format())['KP'], '0')
+
+    def test_template(self):
+        template = "KD = b$KD\nKP = [$KP]\nKPB = $KPB\n"
+        keys = random_keys(100)
+        options = build_parser().parse_args(['--width', '100000'])
+        code = generate_code(keys, template=template, options=options)
+        d = {}
+        exec(code, d)
+        self.assertEqual(d['KPB'], 8 if len(''.join(keys)) < 256 else 16)
+        self.assertEqual([d['KD'][d['KP'][i]:d['KP'][i + 1]].decode()
+                          for i in range(100)], keys)
+        d = {}
+        exec(generate_code(keys), d)
+        self.assertFalse('KD' in d)
+
+
+class TestsScanner(unittest.TestCase):
+
+    def test_char_class(self):
+        self.assertEqual(char_class('a-c_'), set(b'abc_'))
+        self.assertEqual(char_class('-a-b'), set(b'-ab'))
+        self.assertEqual(char_class('0-'), set(b'0-'))
+        for spec in '', 'z-a', '\u00e4':
+            self.assertRaises(ValueError, char_class, spec)
+
+    def test_scan(self):
+        import re
+
+        keys = random_keys(100)
+        words = keys + random_keys(100)
+        text = ' '.join(random.choice(words) + random.choice(' +(\n')
+                        for unused in range(1000)).encode()
+        for Hash in Hashes:
+            for pow2 in False, True:
+                code = generate_code(keys, Hash, pow2=pow2,
+                                     scanner='A-Za-z0-9')
+                d = {}
+                exec(code, d)
+                for buf in text, memoryview(text):
+                    self.assertEqual(
+                        list(d['scan'](buf)),
+                        [(m.start(), m.end(),
+                          keys.index(m.group()) if m.group() in keys else -1)
+                         for m in re.finditer('[A-Za-z0-9]+', text.decode())])
+
+    def test_errors(self):
+        for keys, Hash in ((['a', 'b-c'], StrSaltHash),
+                           (['a', ''], IntSaltHash),
+                           (['a', 'b'], StrSaltFastHash),
+                           ([1, 2], IntKeyHash)):
+            self.assertRaises(ValueError, generate_code, keys, Hash,
+                              scanner='a-z')
+
+
+class TestsStats(unittest.TestCase):
+
+    def run_lookups(self, **kwds):
+        d = {}
+        exec(generate_code(['if', 'else', 'while'], stats=True, **kwds), d)
+        for key in 'if', 'while', 'x', 'iff', 'ifelsewhile', 'while':
+            d['get_index'](key)
+        return d['stats']
+
+    def test_counts(self):
+        for kwds in ({}, dict(Hash=IntSaltHash), dict(fingerprint=32),
+                     dict(Hash=IntSaltHash, blocked=True),
+                     dict(shard_size=2), dict(compact=True)):
+            stats = self.run_lookups(**kwds)
+            self.assertEqual(stats(), dict(lookups=6, prefiltered=0,
+                                           too_long=1, mismatch=2, hits=3))
+        stats = self.run_lookups(prefilter=65)
+        self.assertEqual(stats(reset=True)['prefiltered'], 3)
+        self.assertEqual(stats()['lookups'], 0)
+
+    def test_multi(self):
+        d = {}
+        exec(generate_code(['a', 'b', 'a'], tables=['x', 'x', 'y'],
+                           stats=True), d)
+        self.assertEqual([d['lookup'](t, k) for t, k in
+                          [('x', 'b'), ('y', 'b'), ('y', 'aaaa')]],
+                         [1, -1, -1])
+        self.assertEqual(d['stats'](), dict(lookups=3, prefiltered=0,
+                                            too_long=1, mismatch=1, hits=1))
+
+    def test_off(self):
+        code = generate_code(['if', 'else'])
+        self.assertFalse('stats' in code or 'get_index' in code)
+        self.assertRaises(ValueError, generate_code, ['a'], template='$G',
+                          stats=True)
+
+    def test_extension(self):
+        code = generate_extension(['a', 'b'], 'ab', stats=True)
+        self.assertTrue('#define STATS  1' in code)
+        code = generate_extension(['a', 'b'], 'ab')
+        self.assertTrue('#define STATS  0' in code)
+
+
+C_MAIN = r"""
+#include <stdio.h>
+#include "keys.h"
+
+int main(void)
+{
+    static const char *queries[] = {%s};
+    size_t i;
+
+    for (i = 0; i < sizeof(queries) / sizeof(char *); i++)
+        printf("%%d\n", get_index(queries[i] + 1, queries[i][0]));
+    return 0;
+}
+"""
+
+
+C_BATCH_MAIN = r"""
+#include <assert.h>
+#include <stdio.h>
+#define BATCH  3
+#include "keys.h"
+
+int main(void)
+{
+    static const char *queries[] = {%s};
+    const char *key[sizeof(queries) / sizeof(char *)];
+    size_t i, len[sizeof(queries) / sizeof(char *)];
+    int out[sizeof(queries) / sizeof(char *)];
+
+    for (i = 0; i < sizeof(queries) / sizeof(char *); i++) {
+        key[i] = queries[i] + 1;
+        len[i] = queries[i][0];
+    }
+    get_index_batch(key, len, i, out);
+    for (i = 0; i < sizeof(queries) / sizeof(char *); i++) {
+        assert(out[i] == get_index(key[i], len[i]));
+        printf("%%d\n", out[i]);
+    }
+    return 0;
+}
+"""
+
+
+class TestsLangC(unittest.TestCase):
+
+    keys = ['Host', 'Accept', 'Accept-Encoding', 'X', 'Content-Length']
+
+    def test_args(self):
+        for kwds in (dict(template='$G'), dict(Hash=IntKeyHash),
+                     dict(shard_size=2), dict(fingerprint=8),
+                     dict(compact=True), dict(stats=True),
+                     dict(scanner='A-Za-z')):
+            self.assertRaises(ValueError, generate_code, ['a'], lang='c',
+                              **kwds)
+        self.assertRaises(ValueError, generate_code, ['a'], lang='rust')
+
+    def test_code(self):
+        code = generate_code(self.keys, lang='c')
+        self.assertTrue('get_index(const char *key, size_t len)' in code)
+        self.assertTrue('memcmp' in code and 'strlen' not in code)
+        self.assertFalse('maybe_key' in code)
+        code = generate_code(self.keys, lang='c', prefilter=80)
+        self.assertTrue('maybe_key(k, len)' in code)
+        # salts are never empty arrays
+        code = generate_code([], Hash=IntSaltHash, lang='c')
+        self.assertFalse('{}' in code)
+        # the products of (32-bit) salts and bytes do not wrap for NG > 2**24
+        code = generate_code(self.keys, Hash=IntSaltHash, lang='c')
+        self.assertEqual(code.count('+= (uint64_t) S'), 4)
+        self.assertFalse('+= S' in code)
+        code = generate_code([('a', 'b')], Hash=IntSaltCompositeHash,
+                             lang='c')
+        self.assertEqual(code.count('+= (uint64_t) S'), 2)
+
+    @unittest.skipUnless(shutil.which('cc'), "requires a C compiler")
+    def test_compile(self):
+        queries = self.keys + ['Hos', 'Hostname', 'accept', '', 'Y' * 20]
+        # the length is the first byte of each query, such that the slices
+        # are not NUL terminated (except for the last)
+        c_queries = ', '.join('"\\%03o%s%s"' % (len(q), q, queries[-1])
+                              for q in queries)
+        expected = [str(i) for i in range(len(self.keys))]
+        expected += ['-1'] * (len(queries) - len(self.keys))
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(tmpdir, 'main.c'), 'w') as fo:
+                fo.write(C_MAIN % c_queries)
+            with open(os.path.join(tmpdir, 'batch.c'), 'w') as fo:
+                fo.write(C_BATCH_MAIN % c_queries)
+            for kwds in ({}, dict(Hash=IntSaltHash), dict(pow2=True),
+                         dict(Hash=StrSaltFastHash), dict(prefilter=80),
+                         dict(prefilter=66), dict(freqs=[1, 5, 2, 3, 4]),
+                         dict(unroll=True), dict(unroll=True, pow2=True),
+                         dict(unroll=True, Hash=IntSaltFastHash,
+                              prefilter=66)):
+                with open(os.path.join(tmpdir, 'keys.h'), 'w') as fo:
+                    fo.write(generate_code(self.keys, lang='c', **kwds))
+                names = ['main']
+                if 'unroll' not in kwds:  # has no get_index_batch()
+                    names.append('batch')
+                for name in names:
+                    subprocess.check_call(['cc', '-Wall', '-o', name,
+                                           name + '.c'], cwd=tmpdir)
+                    out = subprocess.check_output(['./' + name], cwd=tmpdir)
+                    result = out.decode().split()
+                    if 'freqs' in kwds:  # keys are ordered by frequency
+                        order = [1, 4, 3, 2, 0]
+                        result[:5] = [str(order[int(i)])
+                                      for i in result[:5]]
+                    self.assertEqual(result, expected)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestsUnroll(unittest.TestCase):
+
+    keys = ['if', 'else', 'while', 'for', 'in', 'return', 'a' * 40]
+
+    def test_wrap_terms(self):
+        self.assertEqual(wrap_terms('x = ', []), ['x = 0'])
+        self.assertEqual(wrap_terms('x = ', ['a', 'b'], ';'), ['x = a + b;'])
+        self.assertEqual(wrap_terms('x = ', ['a', 'b', 'c'], width=9,
+                                    parens=True), ['x = (a +', '     b +',
+                                                   '     c)'])
+
+    def test_hash(self):
+        for Hash in (StrSaltHash, IntSaltHash, StrSaltFastHash,
+                     IntSaltFastHash):
+            for pow2 in False, True:
+                if pow2 and Hash in (StrSaltFastHash, IntSaltFastHash):
+                    continue
+                code = generate_code(self.keys, Hash, pow2=pow2, unroll=True)
+                self.assertFalse('sum(' in code)
+                d = {}
+                exec(code, d)
+                for h, key in enumerate(self.keys):
+                    self.assertEqual(d['perfect_hash'](key), h)
+                # lengths of no key
+                for key in 'x', 'abcdefg', '':
+                    self.assertEqual(d['perfect_hash'](key), -1)
+
+    def test_c(self):
+        code = generate_code(self.keys, lang='c', unroll=True)
+        self.assertEqual(code.count('    case '), 6)
+        self.assertTrue('memcmp(key, KD + KP[h], 40)' in code)
+        self.assertFalse('S1[i]' in code)
+
+    def test_args(self):
+        for kwds in (dict(template='$G'), dict(Hash=IntKeyHash),
+                     dict(shard_size=2), dict(compact=True),
+                     dict(stats=True), dict(tables=['x', 'y'])):
+            self.assertRaises(ValueError, generate_code, ['a', 'b'],
+                              unroll=True, **kwds)
+
+
+C_COMPOSITE_MAIN = r"""
+#include <stdio.h>
+#include <string.h>
+#include "keys.h"
+
+int main(void)
+{
+    static const char *queries[][2] = {%s};
+    const char *key[2];
+    size_t i, len[2];
+
+    for (i = 0; i < sizeof(queries) / sizeof(queries[0]); i++) {
+        key[0] = queries[i][0];
+        key[1] = queries[i][1];
+        len[0] = strlen(key[0]);
+        len[1] = strlen(key[1]);
+        printf("%%d\n", get_index(key, len));
+    }
+    return 0;
+}
+"""
+
+
+class TestsCompositeKeys(unittest.TestCase):
+
+    keys = [('GET', '/'), ('GET', '/login'), ('POST', '/login'),
+            ('ab', 'c'), ('a', 'bc'), ('abc', ''), ('', 'abc')]
+    non_keys = [('GET', '/x'), ('POST', '/'), ('abc', 'abc'), ('', ''),
+                ('GET/', 'login')]
+
+    def test_salted_sum(self):
+        f = IntSaltCompositeHash(1000)
+        f.salt = [1, 2, 3, 4, 5, 6]
+        # byte i of field j is multiplied by salt[2 * i + j]
+        self.assertEqual(f.salted_sum(('ab', 'c')),
+                         1 * 97 + 3 * 98 + 2 * 99)
+        self.assertEqual(f.salted_sum(('', '')), 0)
+        f(('abcd', ''))
+        self.assertEqual(len(f.salt), 8)
+
+    def test_check_keys(self):
+        for keys in ([('a', 'b'), ('c',)], [('a', 1)], [()],
+                     [('a', 'b'), 'c']):
+            self.assertRaises(TypeError, generate_hash, keys,
+                              StrSaltCompositeHash)
+        self.assertRaises(ValueError, generate_hash, [('a', 'b')] * 2,
+                          StrSaltCompositeHash)
+
+    def test_generate_code(self):
+        for Hash in StrSaltCompositeHash, IntSaltCompositeHash:
+            for kwds in ({}, dict(pow2=True), dict(stats=True)):
+                d = {}
+                exec(generate_code(self.keys, Hash, **kwds), d)
+                self.assertEqual(d['K'], self.keys)
+                for h, key in enumerate(self.keys):
+                    self.assertEqual(d['perfect_hash'](key), h)
+                for key in self.non_keys:
+                    h = d['perfect_hash'](key)
+                    self.assertTrue(h < 0 or h >= len(self.keys) or
+                                    d['K'][h] != key)
+        for kwds in (dict(prefilter=64), dict(fingerprint=8),
+                     dict(shard_size=2), dict(unroll=True)):
+            self.assertRaises(ValueError, generate_code, self.keys,
+                              IntSaltCompositeHash, **kwds)
+
+    @unittest.skipUnless(shutil.which('cc'), "requires a C compiler")
+    def test_compile(self):
+        queries = self.keys + self.non_keys
+        expected = [str(i) for i in range(len(self.keys))]
+        expected += ['-1'] * len(self.non_keys)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(tmpdir, 'main.c'), 'w') as fo:
+                fo.write(C_COMPOSITE_MAIN % ', '.join(
+                    '{"%s", "%s"}' % key for key in queries))
+            for Hash in StrSaltCompositeHash, IntSaltCompositeHash:
+                with open(os.path.join(tmpdir, 'keys.h'), 'w') as fo:
+                    fo.write(generate_code(self.keys, Hash, lang='c'))
+                subprocess.check_call(['cc', '-Wall', '-o', 'main', 'main.c'],
+                                      cwd=tmpdir)
+                out = subprocess.check_output(['./main'], cwd=tmpdir)
+                self.assertEqual(out.decode().split(), expected)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_keycol(self):
+        self.assertEqual(parse_columns('2'), 2)
+        self.assertEqual(parse_columns('1,3'), (1, 3))
+        self.assertRaises(ArgumentTypeError, parse_columns, '1,0')
+        self.assertRaises(ArgumentTypeError, parse_columns, '1,x')
+        # argparse shows the message of the error
+        err = StringIO()
+        with contextlib.redirect_stderr(err):
+            self.assertRaises(SystemExit, build_parser().parse_args,
+                              ['--keycol', '0,2'])
+        self.assertTrue("column numbers start at 1: '0,2'" in err.getvalue())
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'routes.csv')
+            with open(path, 'w') as fo:
+                fo.write('GET, 200, /\nPOST, 201, /login\n')
+            p = build_parser()
+            args = p.parse_args(['--keycol', '1,3', '--hft', '2', path])
+            self.assertEqual(check_args(p, args), IntSaltCompositeHash)
+            self.assertEqual(read_table(path, args),
+                             [('GET', '/'), ('POST', '/login')])
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestsCompact(unittest.TestCase):
+
+    def test_typecode(self):
+        self.assertEqual(typecode([]), 'B')
+        self.assertEqual(typecode([0, 255]), 'B')
+        self.assertEqual(typecode([256]), 'H')
+        self.assertEqual(typecode([2 ** 16]), 'I')
+        self.assertEqual(typecode([2 ** 32]), 'Q')
+        self.assertRaises(ValueError, typecode, [2 ** 64])
+
+    def test_arrays(self):
+        params = compact_arrays([('G', [1, 2, 300]), ('KB', b'AB')], Format())
+        self.assertEqual(params, {
+            'G': "_array('H', b'\\x01\\x00\\x02\\x00,\\x01')",
+            'KB': "_array('B', b'AB')"})
+
+    def test_args(self):
+        self.assertRaises(ValueError, generate_code, ["A"], compact=True,
+                          template="$G")
+        self.assertRaises(ValueError, generate_code, ["A"], sidecar="t.bin")
+        self.assertRaises(ValueError, generate_code, [1], IntKeyHash,
+                          compact=True)
+
+    def test_code(self):
+        keys = random_keys(100) + [u"\ud55c", u"\u00a2"]
+        for Hash in Hashes + (StrSaltFastHash,):
+            run_code(generate_code(keys, Hash, compact=True))
+        run_code(generate_code(keys, compact=True, fingerprint=16))
+        run_code(generate_code(keys, compact=True, shard_size=30))
+        run_code(generate_code(keys, IntSaltHash, compact=True,
+                               blocked=True))
+        run_code(generate_code([], compact=True))
+
+    def test_sidecar(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            sidecar = os.path.join(tmpdir, 'keys.bin')
+            code = generate_code(random_keys(100), compact=True,
+                                 fingerprint=8, sidecar=sidecar)
+            self.assertIn("'keys.bin'", code)
+            self.assertEqual(os.path.getsize(sidecar) % 8, 0)
+            run_code(code, sidecar)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestsMultiTable(unittest.TestCase):
+
+    def test_group(self):
+        keys, tagged, names, TO = group_tables(
+            ["GET", "HELO", "POST", "GET"], ["http", "smtp", "http", "ftp"])
+        self.assertEqual(keys, ["GET", "POST", "HELO", "GET"])
+        self.assertEqual(tagged, ["\x01GET", "\x01POST", "\x02HELO",
+                                  "\x03GET"])
+        self.assertEqual(names, ["http", "smtp", "ftp"])
+        self.assertEqual(TO, [0, 2, 3, 4])
+        self.assertRaises(ValueError, group_tables, ["A"], [])
+        self.assertRaises(ValueError, group_tables, 128 * ["A"],
+                          list(range(128)))
+
+    def test_code(self):
+        keys, tables = [], []
+        for t in range(10):
+            for key in random_keys(20):
+                keys.append(key)
+                tables.append('t%d' % t)
+        for Hash in Hashes + (StrSaltFastHash,):
+            run_code(generate_code(keys, Hash, tables=tables) + '''
+for k in K[TO[1]:]:  # keys of other tables
+    t0 = K[TO[0]:TO[1]]
+    assert lookup("t0", k) == (t0.index(k) if k in t0 else -1)
+''')
+        run_code(generate_code(keys, IntSaltHash, tables=tables, pow2=True))
+        self.assertRaises(ValueError, generate_code, keys, tables=tables,
+                          shard_size=10)
+        self.assertRaises(ValueError, generate_code, ["A", "A"],
+                          tables=["a", "a"])
+
+
+class TestsPrefilter(unittest.TestCase):
+
+    def test_bitmaps(self):
+        p = prefilter_params(["", "ab", "xyzzy"], 65)
+        self.assertEqual(p['LB'], [1 | 4 | 32])
+        self.assertEqual(p['B0'][ord('a') >> 3], 1 << (ord('a') & 7))
+        self.assertEqual(''.join(map(bin, p['B0'])).count('1'), 2)
+        self.assertEqual(p['B1'][ord('y') >> 3], 1 << (ord('y') & 7))
+        self.assertEqual(p['B1'][ord('b') >> 3], 1 << (ord('b') & 7))
+        self.assertEqual((p['BM'], p['BK'], p['BF']), (0, 0, [0]))
+        # the bitmaps do not fit into the budget
+        self.assertRaises(ValueError, prefilter_params, ["", "ab"], 64)
+        self.assertRaises(ValueError, prefilter_params, ["x" * 8], 65)
+
+    def test_bloom(self):
+        keys = random_keys(100)
+        for budget, nbytes in (72, 0), (73, 8), (200, 128), (1000, 512):
+            p = prefilter_params(keys, budget)
+            self.assertEqual(p['BM'], 8 * nbytes)
+            self.assertEqual(len(p['BF']), max(1, nbytes))
+            if nbytes:
+                self.assertTrue(1 <= p['BK'] <= 8)
+
+    def test_code(self):
+        keys = random_keys(100)
+        for budget in 65, 200:
+            code = generate_code(keys, prefilter=budget)
+            run_code(code + '''
+assert not maybe_key("too long to be a key")
+rejected = [k + "+" for k in K if not maybe_key(k + "+")]
+assert len(rejected) > 50, len(rejected)
+assert all(perfect_hash(k) == -1 for k in rejected)
+''')
+        self.assertRaises(ValueError, generate_code, keys, prefilter=64)
+        run_code(generate_code(keys, IntSaltHash, compact=True, shard_size=30,
+                               prefilter=100))
+        self.assertRaises(ValueError, generate_code, [1], IntKeyHash,
+                          prefilter=100)
+
+
+class TestsExternal(unittest.TestCase):
+
+    def test_substitute(self):
+        aux = StringIO()
+        substitute(aux, "$A + ${B} = $$$C;", dict(
+            A=1, B='two', C=lambda fo: fo.write('3')))
+        self.assertEqual(aux.getvalue(), "1 + two = $3;")
+        self.assertRaises(KeyError, substitute, aux, "$D", {})
+        self.assertRaises(ValueError, substitute, aux, "$ D", {})
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size('1234'), 1234)
+        self.assertEqual(parse_size('2K'), 2048)
+        self.assertEqual(parse_size('1.5 MB'), 3 * 2 ** 19)
+        self.assertEqual(parse_size('4g'), 2 ** 32)
+        self.assertRaises(ValueError, parse_size, 'many')
+
+    def test_generate(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'keys.txt')
+            with open(path, 'w') as fo:
+                fo.write('\n'.join(random_keys(500)))
+            options = build_parser().parse_args([path])
+            for Hash in Hashes:
+                aux = StringIO()
+                generate_external(path, options, aux, Hash,
+                                  memory_limit=50000)
+                code = aux.getvalue()
+                self.assertTrue('S0 = ' in code)
+                run_code(code)
+            # below the cost of a single key
+            self.assertRaises(ValueError, generate_external, path, options,
+                              StringIO(), memory_limit=BYTES_PER_KEY)
+            for limit in '0', '-5', '1':
+                p = build_parser()
+                args = p.parse_args(['--memory-limit', limit, path])
+                with self.assertRaises(SystemExit):
+                    with contextlib.redirect_stderr(StringIO()):
+                        check_args(p, args)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestsExtension(unittest.TestCase):
+
+    def test_c_string(self):
+        self.assertEqual(c_string('abc'), '"abc"')
+        self.assertEqual(c_string('a"b\\c?'), r'"a\042b\134c\077"')
+        self.assertEqual(c_string('\u00a2\n'), r'"\302\242\012"')
+
+    def test_generate(self):
+        keys = random_keys(20)
+        code = generate_extension(keys, 'animals',
+                                  [k.lower() for k in keys])
+        self.assertTrue('PyInit_animals(void)' in code)
+        self.assertTrue('#define HAS_VALUES  1' in code)
+        code = generate_extension(keys, 'animals')
+        self.assertTrue('#define HAS_VALUES  0' in code)
+        self.assertTrue('"%s"' % keys[0] in code)
+
+        self.assertRaises(ValueError, generate_extension, keys, 'a-b')
+        self.assertRaises(ValueError, generate_extension, keys, 'ab', [])
+        self.assertRaises(ValueError, generate_extension, keys, 'ab',
+                          Hash=IntKeyHash)
+
+    @unittest.skipUnless(shutil.which('cc'), "requires a C compiler")
+    def test_compile(self):
+        import importlib.util
+        import sysconfig
+
+        keys = random_keys(20)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            for Hash in StrSaltHash, IntSaltHash:
+                # a module can only be loaded once, hence different names
+                name = 'animals_' + Hash.__name__.lower()
+                src = os.path.join(tmpdir, name + '.c')
+                lib = os.path.join(tmpdir, name +
+                                   sysconfig.get_config_var('EXT_SUFFIX'))
+                with open(src, 'w') as fo:
+                    fo.write(generate_extension(keys, name,
+                                               [k.lower() for k in keys],
+                                               Hash=Hash))
+                subprocess.check_call(['cc', '-shared', '-fPIC', '-Wall',
+                                       '-I', sysconfig.get_paths()['include'],
+                                       '-o', lib, src])
+                spec = importlib.util.spec_from_file_location(name, lib)
+                m = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(m)
+                for key in keys:
+                    self.assertEqual(m.lookup(key), key.lower())
+                    self.assertTrue(m.contains(key))
+                self.assertFalse(m.contains(keys[0] + '!'))
+                self.assertEqual(m.lookup('', None), None)
+                self.assertRaises(KeyError, m.lookup, keys[0][:-1] + '!')
+                # arguments of the METH_FASTCALL functions
+                self.assertRaises(TypeError, m.lookup)
+                self.assertRaises(TypeError, m.lookup, keys[0], None, None)
+                res = m.lookup_many((keys[0] + ',x').encode(), '?',
+                                    bytearray(b','))
+                self.assertEqual(res, [keys[0].lower(), '?'])
+                self.assertRaises(TypeError, m.lookup_many, b'', None, b'')
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_setup(self):
+        code = extension_setup('animals', 'animals.c')
+        self.assertTrue('Extension(name = "animals"' in code)
+        self.assertTrue('sources = ["animals.c"]' in code)
+
+
+class TestsBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, path, data):
+        with open(path, 'w') as fo:
+            fo.write(data)
+
+    def test_read_manifest(self):
+        self.write('tables.txt', '''\
+# comment
+a.txt -o 'a b.py'
+
+b.txt b-tmpl.c --hft=2  # trailing comment
+''')
+        self.assertEqual(read_manifest('tables.txt'), [
+            (2, ['a.txt', '-o', 'a b.py']),
+            (4, ['b.txt', 'b-tmpl.c', '--hft=2']),
+        ])
+
+    def test_run(self):
+        self.write('a.txt', '\n'.join(random_keys(20)))
+        self.write('b.txt', '\n'.join(random_keys(30)))
+        self.write('tables.txt', '''\
+a.txt -o a.py
+b.txt -o b.py --hft=2
+missing.txt -o c.py
+''')
+        res = run_batch('tables.txt', jobs=2)
+        self.assertEqual([r[0] for r in res], ['a.py', 'b.py', 'c.py'])
+        self.assertTrue(res[0][1] >= 0 and res[1][1] >= 0)
+        self.assertEqual([r[2] is None for r in res], [True, True, False])
+        for path in 'a.py', 'b.py':
+            with open(path) as fi:
+                run_code(fi.read())
+
+        # unchanged inputs are skipped, changed ones regenerated
+        self.write('b.txt', '\n'.join(random_keys(40)))
+        res = run_batch('tables.txt', jobs=2)
+        self.assertEqual(res[0], ('a.py', None, None))
+        self.assertTrue(res[1][1] >= 0)
+        self.assertTrue(res[2][2])
+
+
 if __name__ == '__main__':
     import perfect_hash
 